@@ -7,6 +7,10 @@ from datetime import datetime
 import whisper_timestamped as whisper
 import argparse
 
+import utils.whisper_decoding as whisperdec
+import utils.cascade as cascade
+from utils.decode_cache import DecodeCache
+
 import torch
 torch.cuda.empty_cache()
 
@@ -27,70 +31,227 @@ print('Number CUDA Devices:', torch.cuda.device_count())
 print ('Current cuda device: ', torch.cuda.current_device(), ' **May not correspond to nvidia-smi ID above, check visibility parameter')
 print("Device name: ", torch.cuda.get_device_name(torch.cuda.current_device()))
 
+"""
+List for each audio file the asrSettings of which the .json ASR result does not exist yet.
+If multiple asrSettings are given, the results are written to <asrDir>/<asrSettings>/json-asr-results.
+Existing results are skipped, also if a decode cache is used: the cache is only looked up for the missing results.
+"""
+def listJobs(audioFileList, audioExtension, asrSettingsList, outputDirs):
+
+    jobs = []
+    for audioFile in audioFileList:
+
+        jobSettings = []
+        jobOutputFiles = []
+        for asrSettings in asrSettingsList:
+
+            output_json_file = os.path.join(outputDirs[asrSettings], os.path.basename(audioFile).replace(audioExtension, '.json'))
+            print(output_json_file)
+
+            if not os.path.exists(output_json_file):
+                jobSettings.append(asrSettings)
+                jobOutputFiles.append(output_json_file)
+
+        if len(jobSettings) > 0:
+            jobs.append({'audioFile': audioFile, 'asrSettings': jobSettings, 'outputFile': jobOutputFiles})
+
+    return jobs
+
 def run(args):
 
     audioDir = args.audioDir
     audioExtension = args.audioExtension
     spkTaskSep = args.spkTaskSep # "-" or "_"
     promptsDir = args.promptsDir
-    asrSettings = args.asrSettings
-    outputDir = args.asrResultDir
+    asrSettingsList = args.asrSettings.split(',')
+    decoderSocket = args.decoderSocket
+    backendOptions = {'draftModel': args.draftModel, 'draftLength': args.draftLength, 'draftPromptBias': args.draftPromptBias}
+
+    # One output dir per asrSettings
+    if len(asrSettingsList) == 1:
+        outputDirs = {asrSettingsList[0]: args.asrResultDir}
+    else:
+        assert args.asrDir is not None, "--asrDir is required when multiple asrSettings are given"
+        outputDirs = {asrSettings: os.path.join(args.asrDir, asrSettings, 'json-asr-results') for asrSettings in asrSettingsList}
 
     audioFileList = glob.glob(os.path.join(audioDir, '*'+ audioExtension))
                               
-    if not os.path.exists(outputDir):
-        os.makedirs(outputDir)
+    for outputDir in outputDirs.values():
+        if not os.path.exists(outputDir):
+            os.makedirs(outputDir)
 
     startTime = datetime.now()
 
-    for audioFile in audioFileList:
+    jobs = listJobs(audioFileList, audioExtension, asrSettingsList, outputDirs)
 
-        output_json_file = os.path.join(outputDir, os.path.basename(audioFile).replace(audioExtension, '.json'))
-        print(output_json_file)
+    # Only decode the reading region of each recording (+ margin), as annotated in recordingsDF.tsv
+    regions = {}
+    if args.recordingsDF is not None:
+        regions = whisperdec.readReadingRegions(args.recordingsDF, args.regionMarginSec)
 
-        if not os.path.exists(output_json_file):
-            print('Create: ', os.path.basename(audioFile).replace(audioExtension, '.json'))
-            
-            # Read corresponding prompt
-            taskID = os.path.basename(audioFile).split(spkTaskSep)[1].replace(audioExtension, '')
-            taskFile = os.path.join(promptsDir, taskID + '.prompt')
+    if args.stopAtPromptEnd and args.chunkSec <= 0:
+        print('--stopAtPromptEnd is only used with --chunkSec > 0')
 
-            with open(taskFile, 'r') as f:
-                taskPrompt = f.readlines()[0]
+    for job in jobs:
+        audioID = os.path.basename(job['audioFile']).replace(audioExtension, '')
+        if audioID in regions:
+            job['region'] = regions[audioID]
 
-            audio = whisper.load_audio(audioFile)
+        # Chunked decoding with checkpoints
+        if args.chunkSec > 0:
+            job['chunkSec'] = args.chunkSec
+            job['chunkOverlapSec'] = args.chunkOverlapSec
+            if args.stopAtPromptEnd:
+                job['finalSentence'] = whisperdec.readFinalPromptSentence(job['audioFile'], audioExtension, spkTaskSep, promptsDir)
 
-            model = whisper.load_model(name="large-v2")
+    # Read corresponding prompt
+    for job in jobs:
+        job['prompt'] = whisperdec.readTaskPrompt(job['audioFile'], audioExtension, spkTaskSep, promptsDir)
 
-            # Parse ASR settings
-            det_dis=False
-            if 'dis' in asrSettings:
-                det_dis=True
-                
-            if 'prompt' not in asrSettings:
-                taskPrompt = None
-            
-            vad_boolean = False
-            if 'vad' in asrSettings:
-                vad_boolean = True
+    # Model cascade: decode with a cheap model first, only files that do not pass the gate are decoded with large-v2
+    if args.cascadeModel is not None and len(jobs) > 0:
+        assert decoderSocket is None, "--cascadeModel cannot be combined with --decoderSocket"
+        jobs = runCascadeTier1(jobs, args, backendOptions)
 
-            result = whisper.transcribe(model, audio, language="nl", detect_disfluencies=det_dis, vad=vad_boolean, initial_prompt=taskPrompt)
-            with open(output_json_file, 'w') as f:
-                f.write(json.dumps(result, indent = 2, ensure_ascii = False))
+    decodeJobs(jobs, whisperdec.MODEL_NAME, args, backendOptions)
 
 
     endTime = datetime.now()
 
     print("Done: processed", len(audioFileList), "audio files from " ,startTime,  "till", endTime)
 
+"""
+Decode the jobs with modelName: serially with one model, with a running whispert_server.py, or with a pool of workers.
+"""
+def decodeJobs(jobs, modelName, args, backendOptions):
+
+    decoderSocket = args.decoderSocket
+    workers = args.workers
+    cacheDir = args.cacheDir
+    cacheMaxBytes = int(args.cacheMaxGB * 1024**3)
+
+    # Load the model once, unless the jobs are sent to a running whispert_server.py or decoded by a pool of workers
+    model = None
+    cache = None
+    if decoderSocket is None and workers == 1 and len(jobs) > 0:
+        model = whisperdec.loadModel(modelName, backend = args.backend, backendOptions = backendOptions)
+        if cacheDir is not None:
+            cache = DecodeCache(cacheDir, cacheMaxBytes)
+
+    poolJobs = []
+    for job in jobs:
+
+        audioFile = job['audioFile']
+        print('Create: ', os.path.basename(audioFile).replace(args.audioExtension, '.json'), job['asrSettings'])
+
+        # A single asrSettings is decoded as before, multiple asrSettings share the audio, mel and encoder features
+        if len(job['asrSettings']) == 1:
+            job = {**job, 'asrSettings': job['asrSettings'][0], 'outputFile': job['outputFile'][0]}
+
+        if decoderSocket is not None:
+            whisperdec.submitJob(decoderSocket, {**job, 'audioFile': os.path.abspath(audioFile), 'outputFile': abspaths(job['outputFile'])})
+        elif workers > 1:
+            poolJobs.append(job)
+        else:
+            whisperdec.runJob(model, job, cache)
+
+    # Decode with a pool of worker processes, each with its own model. As in the serial path, a failed job is an error,
+    # but it is raised after the other jobs are finished
+    if len(poolJobs) > 0:
+        errors = whisperdec.runJobsInPool(poolJobs, workers, args.threadsPerWorker, modelName, cacheDir = cacheDir, cacheMaxBytes = cacheMaxBytes, backend = args.backend, backendOptions = backendOptions)
+        if len(errors) > 0:
+            raise RuntimeError('Decoding failed for ' + str(len(errors)) + ' audio files: ' + ', '.join(audioFile + ' (' + error + ')' for audioFile, error in errors))
+
+"""
+Tier 1 of the cascade (see utils/cascade.py): decode all jobs with args.cascadeModel into json-asr-results-<cascadeModel>,
+and use the results that pass the gate. Returns the jobs (with only the asrSettings that did not pass) for large-v2.
+"""
+def runCascadeTier1(jobs, args, backendOptions):
+
+    tier1Jobs = []
+    for job in jobs:
+        tier1Files = [cascade.tier1OutputFile(outputFile, args.cascadeModel) for outputFile in job['outputFile']]
+        todo = [(asrSettings, tier1File) for asrSettings, tier1File in zip(job['asrSettings'], tier1Files) if not os.path.exists(tier1File)]
+        if len(todo) > 0:
+            tier1Jobs.append({**job, 'asrSettings': [x[0] for x in todo], 'outputFile': [x[1] for x in todo], 'skipExisting': True})
+
+    for tier1File in set(cascade.tier1OutputFile(outputFile, args.cascadeModel) for job in jobs for outputFile in job['outputFile']):
+        os.makedirs(os.path.dirname(tier1File), exist_ok=True)
+
+    decodeJobs(tier1Jobs, args.cascadeModel, args, backendOptions)
+
+    # Gate: keep the tier 1 results with a high confidence and proportion of correct words
+    tier2Jobs = []
+    tierRows = {}
+    for job in jobs:
+        audioID = os.path.basename(job['audioFile']).replace(args.audioExtension, '')
+
+        todoSettings = []
+        todoOutputFiles = []
+        for asrSettings, outputFile in zip(job['asrSettings'], job['outputFile']):
+
+            tier1File = cascade.tier1OutputFile(outputFile, args.cascadeModel)
+            row = {'audioID': audioID, 'tier': 2, 'model': whisperdec.MODEL_NAME, 'meanConfidence': '', 'propCorrect': ''}
+
+            if os.path.exists(tier1File):
+                with open(tier1File, 'r') as f:
+                    tier1Result = json.load(f)
+                quality = cascade.resultQuality(tier1Result, job['prompt'])
+                row.update(quality)
+
+                if cascade.passesGate(quality, args.cascadeMinConfidence, args.cascadeMinCorrect):
+                    whisperdec.writeAsrResult(tier1Result, outputFile)
+                    row.update({'tier': 1, 'model': args.cascadeModel})
+
+            if row['tier'] == 2:
+                todoSettings.append(asrSettings)
+                todoOutputFiles.append(outputFile)
+
+            tierRows.setdefault(cascade.cascadeTiersFile(outputFile), []).append(row)
+
+        if len(todoSettings) > 0:
+            tier2Jobs.append({**job, 'asrSettings': todoSettings, 'outputFile': todoOutputFiles})
+
+    for tiersFile, rows in tierRows.items():
+        cascade.updateCascadeTiers(tiersFile, rows)
+
+    print('Cascade:', sum(len(rows) for rows in tierRows.values()) - sum(len(job['asrSettings']) for job in tier2Jobs), 'results from', args.cascadeModel + ',',
+          sum(len(job['asrSettings']) for job in tier2Jobs), 'to decode with', whisperdec.MODEL_NAME)
+
+    return tier2Jobs
+
+def abspaths(paths):
+    if isinstance(paths, list):
+        return [os.path.abspath(path) for path in paths]
+    return os.path.abspath(paths)
+
 def main():
     parser = argparse.ArgumentParser("Message")
-    parser.add_argument("--asrSettings", type=str, help = "choose from: whispert, whispert_dis, whispert_prompt or whispert_dis_prompt")
+    parser.add_argument("--asrSettings", type=str, help = "choose from: whispert, whispert_dis, whispert_prompt or whispert_dis_prompt. Multiple comma-separated settings (e.g. whispert,whispert_dis) are decoded in one pass over each audio file.")
     parser.add_argument("--audioDir", type=str, help = "Path to preprocessed audio directory.")
     parser.add_argument("--audioExtension", type=str, help = "Extension of audio files in audio dir (i.e., .wav or .mp3)")
     parser.add_argument("--spkTaskSep", type=str, help = "Speaker task separator. The audio files are named according to the following convention: <spk>-<task>-<attempt>.wav. The - is the spkTaskSep.")
     parser.add_argument("--promptsDir", type=str, help = "Path to prompts directory. Contains for each task a file <task>.prompt")
     parser.add_argument("--asrResultDir", type=str, help = "Path to json-asr-results directory. This is the output directory.")
+    parser.add_argument("--asrDir", type=str, default = None, help = "Path to /04_asr dir. Required when multiple asrSettings are given: results are saved in <asrDir>/<asrSettings>/json-asr-results.")
+    parser.add_argument("--decoderSocket", type=str, default = None, help = "Optional: Unix socket of a running whispert_server.py. If given, the jobs are decoded by this server, which keeps the model loaded.")
+
+    parser.add_argument("--workers", type=int, default = 1, help = "Number of worker processes that decode in parallel, each with its own model (default: 1).")
+    parser.add_argument("--threads-per-worker", dest = "threadsPerWorker", type=int, default = 1, help = "Number of PyTorch threads per worker process (default: 1). Only used if --workers > 1.")
+    parser.add_argument("--cacheDir", type=str, default = None, help = "Optional: directory of the decode cache. Results are reused when the same audio is decoded with the same model and options.")
+    parser.add_argument("--cacheMaxGB", type=float, default = 10, help = "Maximum size of the decode cache in GB, least recently used results are removed (default: 10).")
+    parser.add_argument("--backend", type=str, default = whisperdec.BACKEND, help = "Decoder backend: fp32 (default, reference), int8 (dynamically quantized model, CPU only) or speculative (greedy decoding verified from a draft model). Only fp32 gives the reference results, the other backends are for benchmarks. See utils/asr_backends.py.")
+    parser.add_argument("--draftModel", type=str, default = "base", help = "Draft model of the speculative backend, e.g. tiny or base (default: base). Statistics are written to <asrDir>/<asrSettings>/decoding-stats.tsv.")
+    parser.add_argument("--draftLength", type=int, default = 8, help = "Number of draft tokens that large-v2 verifies in one forward pass (default: 8).")
+    parser.add_argument("--draftPromptBias", type=float, default = 0, help = "Bias of the draft model toward the next word of the story prompt (default: 0, no bias).")
+    parser.add_argument("--cascadeModel", type=str, default = None, help = "Optional: cheap Whisper model (e.g. tiny or base) that decodes all files first. Only files that do not pass the gate are decoded with large-v2 (see utils/cascade.py).")
+    parser.add_argument("--cascadeMinConfidence", type=float, default = 0.8, help = "Gate of the cascade: minimum mean word confidence of the cheap model (default: 0.8).")
+    parser.add_argument("--cascadeMinCorrect", type=float, default = 0.9, help = "Gate of the cascade: minimum proportion of correctly read prompt words according to the cheap model (default: 0.9).")
+    parser.add_argument("--chunkSec", type=float, default = 0, help = "Optional: decode in chunks of chunkSec seconds, with a checkpoint after each chunk, so an interrupted run resumes from the last completed chunk (default: 0, decode the complete file at once).")
+    parser.add_argument("--recordingsDF", type=str, default = None, help = "Optional: path to 03_metadata/recordingsDF.tsv. Only the reading region (startTimeFirstSent - endTimeLastSent) of each audio file is decoded, timestamps stay in the timebase of the audio file.")
+    parser.add_argument("--regionMarginSec", type=float, default = 2, help = "Margin in seconds before and after the reading region (default: 2). Only used with --recordingsDF.")
+    parser.add_argument("--stopAtPromptEnd", action = "store_true", help = "Stop decoding after the chunk in which the last sentence of the prompt (<task>-wordIDX.csv) is recognized. Only used with --chunkSec > 0.")
+    parser.add_argument("--chunkOverlapSec", type=float, default = 5, help = "Overlap between chunks in seconds (default: 5). Only used if --chunkSec > 0.")
 
     parser.set_defaults(func=run)
     args = parser.parse_args()
@@ -0,0 +1,130 @@
+"""
+Benchmark the decoder backends (utils/asr_backends.py) against the fp32 reference.
+
+Each audio file is decoded with every backend. For each file and backend we report:
+- rtf             real-time factor: decoding time / audio duration (without loading the model)
+- nWords          number of words in the ASR result
+- wordMatch       proportion of the reference words that are also recognized by the backend (difflib word alignment)
+- startDrift      mean absolute difference of the start time of the matched words with the reference (s)
+- endDrift        mean absolute difference of the end time of the matched words with the reference (s)
+- maxDrift        maximum absolute start or end time difference of the matched words (s)
+
+The reference backend is the first backend in --backends (default: fp32), the drift of the reference is 0 by definition.
+
+Example:
+python3 ./asr_decoders/whispert_benchmark.py --backends fp32,int8 --asrSettings whispert_dis --audioDir $audioDir --audioExtension .wav --spkTaskSep - --promptsDir $promptsDir --maxFiles 20 --outputFile ./benchmark-backends.tsv
+"""
+
+import os
+import glob
+import difflib
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import whisper_timestamped as whisper
+
+import utils.whisper_decoding as whisperdec
+from utils.chunked_decoding import SAMPLE_RATE
+
+"""
+List of (text, start, end) of all words in a whisper-timestamped result.
+"""
+def getWordTable(result):
+    return [(word['text'], word['start'], word['end']) for segment in result['segments'] for word in segment.get('words', [])]
+
+"""
+Compare the word timestamps of hypWords with refWords.
+The words are matched with difflib on the lowercased text.
+"""
+def compareWordTimestamps(refWords, hypWords):
+
+    refTexts = [word[0].lower() for word in refWords]
+    hypTexts = [word[0].lower() for word in hypWords]
+
+    startDiffs = []
+    endDiffs = []
+    matcher = difflib.SequenceMatcher(None, refTexts, hypTexts, autojunk=False)
+    for block in matcher.get_matching_blocks():
+        for i in range(block.size):
+            refWord = refWords[block.a + i]
+            hypWord = hypWords[block.b + i]
+            startDiffs.append(abs(refWord[1] - hypWord[1]))
+            endDiffs.append(abs(refWord[2] - hypWord[2]))
+
+    nMatched = len(startDiffs)
+    return {
+        'wordMatch': nMatched / len(refWords) if len(refWords) > 0 else np.nan,
+        'startDrift': np.mean(startDiffs) if nMatched > 0 else np.nan,
+        'endDrift': np.mean(endDiffs) if nMatched > 0 else np.nan,
+        'maxDrift': max(startDiffs + endDiffs) if nMatched > 0 else np.nan,
+    }
+
+def run(args):
+
+    backends = args.backends.split(',')
+    asrSettings = args.asrSettings
+
+    audioFileList = sorted(glob.glob(os.path.join(args.audioDir, '*' + args.audioExtension)))
+    if args.maxFiles > 0:
+        audioFileList = audioFileList[:args.maxFiles]
+
+    # Load the audio and prompts once, so that reading the audio is not part of the decoding time
+    audios = {audioFile: whisper.load_audio(audioFile) for audioFile in audioFileList}
+    prompts = {audioFile: whisperdec.readTaskPrompt(audioFile, args.audioExtension, args.spkTaskSep, args.promptsDir) for audioFile in audioFileList}
+
+    # One backend at a time, so that only one model is in memory
+    wordTables = {}
+    rows = []
+    for backend in backends:
+
+        model = whisperdec.loadModel(args.modelName, backend, {'draftModel': args.draftModel})
+
+        for audioFile in audioFileList:
+            audio = audios[audioFile]
+
+            startTime = datetime.now()
+            result = whisperdec.decodeAudio(model, audio, asrSettings, prompts[audioFile])
+            decodingTime = (datetime.now() - startTime).total_seconds()
+
+            duration = len(audio) / SAMPLE_RATE
+            fileName = os.path.basename(audioFile)
+            wordTables[(backend, fileName)] = getWordTable(result)
+
+            rows.append({'file': fileName, 'backend': backend, 'asrSettings': asrSettings, 'duration': duration, 'decodingTime': decodingTime,
+                         'rtf': decodingTime / duration, 'nWords': len(wordTables[(backend, fileName)])})
+            print(datetime.now(), backend, fileName, 'RTF:', round(decodingTime / duration, 3))
+
+        del model
+
+    # Word timestamp drift against the reference backend
+    for row in rows:
+        row.update(compareWordTimestamps(wordTables[(backends[0], row['file'])], wordTables[(row['backend'], row['file'])]))
+
+    benchmarkDF = pd.DataFrame(rows)
+    benchmarkDF.to_csv(args.outputFile, sep='\t', index=False)
+
+    summaryDF = benchmarkDF.groupby('backend', sort=False)[['rtf', 'wordMatch', 'startDrift', 'endDrift', 'maxDrift']].mean()
+    summaryDF['totalRtf'] = benchmarkDF.groupby('backend', sort=False)['decodingTime'].sum() / benchmarkDF.groupby('backend', sort=False)['duration'].sum()
+    print(summaryDF.round(3).to_string())
+    print('Saved:', args.outputFile)
+
+def main():
+    parser = argparse.ArgumentParser("Message")
+    parser.add_argument("--backends", type=str, default = "fp32,int8", help = "Comma-separated decoder backends. The first backend is the reference for the timestamp drift (default: fp32,int8).")
+    parser.add_argument("--modelName", type=str, default = whisperdec.MODEL_NAME, help = "Whisper model (default: large-v2).")
+    parser.add_argument("--draftModel", type=str, default = "base", help = "Draft model of the speculative backend (default: base).")
+    parser.add_argument("--asrSettings", type=str, default = "whispert_dis", help = "One asrSettings, e.g. whispert or whispert_dis (default: whispert_dis).")
+    parser.add_argument("--audioDir", type=str, help = "Path to preprocessed audio directory.")
+    parser.add_argument("--audioExtension", type=str, help = "Extension of audio files in audio dir (i.e., .wav or .mp3)")
+    parser.add_argument("--spkTaskSep", type=str, help = "Speaker task separator. The audio files are named according to the following convention: <spk>-<task>-<attempt>.wav. The - is the spkTaskSep.")
+    parser.add_argument("--promptsDir", type=str, help = "Path to prompts directory. Contains for each task a file <task>.prompt")
+    parser.add_argument("--maxFiles", type=int, default = 0, help = "Only benchmark the first maxFiles audio files (default: 0, all files).")
+    parser.add_argument("--outputFile", type=str, help = "Path to the output .tsv file with the results per file and backend.")
+
+    parser.set_defaults(func=run)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Long-lived whisper-timestamped decoding worker.
+
+Loading large-v2 takes a large part of the decoding time of a short AVI story.
+This script loads the model once and keeps it in memory. It listens on a Unix socket for jobs sent by
+asr_decoders/whispert.py (option --decoderSocket) and writes the same .json ASR results as whispert.py.
+
+Jobs are handled one at a time, in the order in which they arrive. One job is one line of JSON:
+{"audioFile": "<path>.wav", "asrSettings": "whispert_dis", "prompt": "<story prompt>", "outputFile": "<path>.json"}
+asrSettings and outputFile can also be lists, to decode several settings in one pass over the audio.
+
+The server is stopped by sending {"command": "shutdown"}.
+
+Example:
+python3 ./asr_decoders/whispert_server.py --socket /tmp/whispert.sock &
+python3 ./asr_decoders/whispert.py --decoderSocket /tmp/whispert.sock --asrSettings whispert ...
+"""
+
+import os
+import json
+import argparse
+import socketserver
+from datetime import datetime
+
+import utils.whisper_decoding as whisperdec
+from utils.decode_cache import DecodeCache
+
+class DecoderRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+
+        line = self.rfile.readline().decode('utf-8')
+        if line.strip() == '':
+            return
+
+        job = json.loads(line)
+
+        if job.get('command') == 'shutdown':
+            self.respond({'status': 'ok'})
+            self.server.stopRequested = True
+            return
+
+        try:
+            startTime = datetime.now()
+            whisperdec.runJob(self.server.model, job, self.server.cache)
+            print(datetime.now(), 'Created:', job['outputFile'], '(', datetime.now() - startTime, ')')
+            self.respond({'status': 'ok', 'outputFile': job['outputFile']})
+
+        except Exception as error:
+            print('Decoding not possible:', job.get('audioFile'), error)
+            self.respond({'status': 'error', 'message': str(error)})
+
+    def respond(self, response):
+        self.wfile.write((json.dumps(response, ensure_ascii = False) + '\n').encode('utf-8'))
+
+
+class DecoderServer(socketserver.UnixStreamServer):
+
+    def __init__(self, socketPath, model, cache = None):
+        self.model = model
+        self.cache = cache
+        self.stopRequested = False
+        super().__init__(socketPath, DecoderRequestHandler)
+
+
+def run(args):
+
+    socketPath = args.socket
+
+    # Remove socket file of a previous server that was not stopped properly
+    if os.path.exists(socketPath):
+        os.remove(socketPath)
+
+    model = whisperdec.loadModel(args.modelName, args.backend, {'draftModel': args.draftModel, 'draftLength': args.draftLength, 'draftPromptBias': args.draftPromptBias})
+
+    cache = None
+    if args.cacheDir is not None:
+        cache = DecodeCache(args.cacheDir, int(args.cacheMaxGB * 1024**3))
+
+    with DecoderServer(socketPath, model, cache) as server:
+        print(datetime.now(), 'Decoder server listening on', socketPath)
+        try:
+            while not server.stopRequested:
+                server.handle_request()
+        finally:
+            os.remove(socketPath)
+
+    print(datetime.now(), 'Decoder server stopped.')
+
+def main():
+    parser = argparse.ArgumentParser("Message")
+    parser.add_argument("--socket", type=str, help = "Path to the Unix socket on which the server listens for decoding jobs.")
+    parser.add_argument("--modelName", type=str, default = whisperdec.MODEL_NAME, help = "Whisper model that is kept in memory (default: large-v2).")
+    parser.add_argument("--backend", type=str, default = whisperdec.BACKEND, help = "Decoder backend: fp32 (default), int8 or speculative; only fp32 gives the reference results (see utils/asr_backends.py).")
+    parser.add_argument("--draftModel", type=str, default = "base", help = "Draft model of the speculative backend (default: base).")
+    parser.add_argument("--draftLength", type=int, default = 8, help = "Number of draft tokens per forward pass of the large model (default: 8).")
+    parser.add_argument("--draftPromptBias", type=float, default = 0, help = "Bias of the draft model toward the story prompt (default: 0).")
+    parser.add_argument("--cacheDir", type=str, default = None, help = "Optional: directory of the decode cache (see utils/decode_cache.py).")
+    parser.add_argument("--cacheMaxGB", type=float, default = 10, help = "Maximum size of the decode cache in GB (default: 10).")
+
+    parser.set_defaults(func=run)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
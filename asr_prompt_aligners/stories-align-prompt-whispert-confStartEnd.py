@@ -19,9 +19,13 @@ promptID    aligned_asrTrans    reversed_aligned_asrTrans   correct confidence
 import pandas as pd
 import glob
 import os
+import sys
 import json
 import re
 import argparse
+import functools
+import math
+import multiprocessing
 from datetime import datetime
 from warnings import simplefilter
 simplefilter(action="ignore", category=pd.errors.PerformanceWarning) # Blocks pandas loc/iloc errors
@@ -35,27 +39,11 @@ import numpy as np
 # import alignment_adagt.string_manipulations as strman
 import utils.sclite_string_normalizer as sclite_norm
 import utils.alignment_modern as alignmod
+import utils.prompt_index as promptidx
+from utils.alignment_cache import AlignmentCache, alignBatchCached
 
 # nohup time python ./02-stories-align-prompt-whispert.py &
 
-"""
-This function reads one .prompt file and normalizes the text (trim spaces, remove accents, remove punctuation, remove digits)
-"""
-def readPromptFile(path_to_prompt_file):
-
-    with open(path_to_prompt_file, 'r') as f:
-        promptRaw = f.read().replace('\n', ' ')
-
-    # prompt = sclite_norm.normalize_string(promptRaw, annTags=False)
-    prompt = sclite_norm.normalize_string(promptRaw, annTags=False, names_as_prompt=False)
-    return prompt
-
-def getPromptIdxs(promptIdxFile):
-
-    promptDF = pd.read_csv(promptIdxFile)
-
-    return list(promptDF['prompt_id'])
-
 """
 This function reads one json file with an WhisperT AsrResult.
 The asrTranscription is normalized (trim spaces, remove accents, remove punctuation, remove digits)
@@ -72,90 +60,28 @@ def readAsrResult(asrResultFile):
     asrTranscription = sclite_norm.normalize_string(asrTranscriptionRaw, names_as_prompt=False)
 
     # Get 'segments' property
-    recWordsList = []
-    for segment in asrResult['segments']:
-        words = segment['words']
-        for word in words:
+    words = [word for segment in asrResult['segments'] for word in segment['words']]
+
+    # label = sclite_norm.normalize_string(word['text'])
+    labels = sclite_norm.normalize_tokens([word['text'] for word in words], names_as_prompt=False)
 
-            # label = sclite_norm.normalize_string(word['text'])
-            label = sclite_norm.normalize_string(word['text'], names_as_prompt=False)
+    recWordsList = []
+    for word, label in zip(words, labels):
 
-            # If no disfluency
-            if (label != '[*]' and label != ''):
+        # If no disfluency
+        if (label != '[*]' and label != ''):
 
-                start = word['start']
-                end = word['end']
-                confidence = word['confidence']
+            start = word['start']
+            end = word['end']
+            confidence = word['confidence']
 
-                recWordsList.append([label, start, end, confidence])
+            recWordsList.append([label, start, end, confidence])
 
     recWordsDF =  pd.DataFrame(recWordsList, columns= ['label', 'confidence', 'start', 'end'])    
 
     return asrTranscription, recWordsDF
 
 
-"""
-This is a recursive function. The dynamic alignment algorithm ADAGT doesn't work on long texts. 
-Therefore, we find a piece of text that occurs in both transcriptions, and split the long text into shorter texts at this piece of text.
-This is a recursive function to make this splitting happen.
-The properties targetPartsList and origPartsList are in the end used for further analysis.
-
-targetPartsList     string[]:   The target_text splitted in utterances
-origPartsList       string[]:   The original_text splitted in utterances
-target_text         string:     The complete prompt (can be unlimited words).
-original_text       string:     The reading of the prompt as recognized by the ASR.
-original_space_idx  int:    The idx at which a split can be made
-max_length          int:    Length of utterance.
-"""
-def makeSplit(targetPartsList, origPartsList, target_text, original_text, original_space_idx, max_length):
-
-    # Get slice to split on
-    original_slice = original_text[original_space_idx-3:original_space_idx+3]
-
-    # Find slice in target text
-    target_slice_idx = target_text.find(original_slice)
-
-    # If slice is found in target text
-    if (target_slice_idx != -1 and target_slice_idx < original_space_idx+200 and len(original_slice) != 0):
-
-        # Split the target_text and original_text on the space in the overlapping slice
-        # Add the first part to the partLists
-        target_space_idx = target_slice_idx+3
-        targetPartsList.append(target_text[:target_space_idx])
-        origPartsList.append(original_text[:original_space_idx])
-
-        # Remove the first part from the target_text and original_text
-        target_text = target_text[target_space_idx+1:]
-        original_text = original_text[original_space_idx+1:]
-
-        if (len(original_text) < 80 or len(target_text) < 80):
-            # End of file reached
-            targetPartsList.append(target_text)
-            origPartsList.append(original_text)
-            target_text = ''
-            original_text = ''
-            idx_of_next_space = -1
-
-            return targetPartsList, origPartsList, target_text, original_text, idx_of_next_space, max_length
-        else:
-            # reset around_idx
-            new_space_idx = original_text.find(" ", max_length)
-
-            # make next split
-            return makeSplit(targetPartsList, origPartsList, target_text, original_text, new_space_idx, max_length)
-
-    # If slice is not found in target text
-    else:
-        # reset around_idx to next space
-        idx_of_next_space = original_text.find(" ", original_space_idx+1)
-        if (idx_of_next_space == -1):
-            # End of file reached
-            targetPartsList.append(target_text)
-            origPartsList.append(original_text)
-            return targetPartsList, origPartsList, target_text, original_text, idx_of_next_space, max_length
-        else:
-            return makeSplit(targetPartsList, origPartsList, target_text, original_text, idx_of_next_space, max_length)
-
 """
 Function that checks whether the three input files exist, if not: print error message.
 """
@@ -170,11 +96,26 @@ Function that reads the input files, calls the alignment algorithm and prints th
 
 asrTranscription    string
 prompt              string
+engine              string: alignment engine of utils/alignment_modern.py ('bio', 'anchored', 'linear' or 'tiered')
 """
-def alignOneFile(asrTranscription, prompt):
-    promptAlignDF = alignmod.two_way_alignment_modern(prompt, asrTranscription)
+def alignOneFile(asrTranscription, prompt, engine = alignmod.DEFAULT_ENGINE):
+    promptAlignDF = alignmod.two_way_alignment_modern(prompt, asrTranscription, engine)
     return promptAlignDF
 
+"""
+Index of asrResultWordsDict for searchCorrespondingConfidence: for each label, the dict indexes of the values with this label (in the order of the dict).
+As in a search over the whole dict, a value that is equal to an earlier value with the same label gets the dict index of the earlier value.
+"""
+def getLabelIndex(asrResultWordsDict):
+
+    labelIndex = {}
+    valuesPerLabel = {}
+    for dictIdx, value in asrResultWordsDict.items():
+        values = valuesPerLabel.setdefault(value['label'], [])
+        labelIndex.setdefault(value['label'], []).append(next((idx for idx, earlierValue in values if earlierValue == value), dictIdx))
+        values.append((dictIdx, value))
+    return labelIndex
+
 """
 This function searches in asrResultWordsDict to the values that has as label "prompt". If there are multiple options, it chooses the one with the dict index directly
 
@@ -182,22 +123,15 @@ prompt              string: One prompt word
 asrResultWordsDict  dict:   The key is the index, the values are {label: string, start_time: float, end_time: float, confidence: float} objects. 
                             This dict contains all recognized word segments from the ASR result.
 indexThreshold      int:    Select the first value that has an the 
+labelIndex          dict:   getLabelIndex(asrResultWordsDict). Compute it once if the same dict is searched for many prompt words.
 """
-def searchCorrespondingConfidence(prompt, asrResultWordsDict, indexThreshold):
+def searchCorrespondingConfidence(prompt, asrResultWordsDict, indexThreshold, labelIndex = None):
 
-    # Make list of all dict values with prompt as target_label.
-    allDictValues = [val for val in asrResultWordsDict.values() if val['label'] == prompt]
+    if labelIndex is None:
+        labelIndex = getLabelIndex(asrResultWordsDict)
 
-    # Get indexes in asrResultsWordsDict of this selection of dict values
-    allDictIdxs = [[x[0] for x in asrResultWordsDict.items() if x[1] == value][0] for value in allDictValues]
-
-    # Select one of these dict values. Use the indexThreshold for that.
-    currentDictIdx = -1
-    for i, idxItem in enumerate(allDictIdxs):
-        if (idxItem > indexThreshold):
-            currentDictValue = allDictValues[i]
-            currentDictIdx = idxItem
-            break
+    # Select the first dict index of a value with prompt as label after the indexThreshold.
+    currentDictIdx = next((idxItem for idxItem in labelIndex.get(prompt, []) if idxItem > indexThreshold), -1)
 
     if (currentDictIdx == -1):
         # Means that prompt is part of recognized word (e.g prompt=rilt, recognized=trilt)
@@ -211,94 +145,107 @@ def searchCorrespondingConfidence(prompt, asrResultWordsDict, indexThreshold):
 
     return currentDictIdx, {'confidence': confidence, 'start': start, 'end': end}
 
+"""
+Offsets of the space insertions in an aligned word: a space in aligned_asrTrans aligned with an insertion (*) in aligned_ref.
+"""
 def findAllSpaceInsertions(aligned_ref, aligned_asrTrans):
-    # Find all space insertions
-    space_ins_char_list = []
-    for char_idx in range(len(aligned_ref)):
-        
-        ref_char = aligned_ref[char_idx]
-        asr_char = aligned_asrTrans[char_idx]
-        
-        # Find insertion of space
-        if ref_char == '*' and asr_char == ' ':
-            space_ins_char_list.append(char_idx)
-    return space_ins_char_list
+    return alignmod.aligned_char_offsets(aligned_ref, aligned_asrTrans, '*', ' ').tolist()
 
+"""
+Split an aligned word at the space insertions. The inserted space is not part of the parts.
+"""
 def splitRefAndAsrTransOnSpaceIns(space_ins_char_list, aligned_ref, aligned_asrTrans):
-    w_hyp_list = []
-    w_ref_list = []
-    word_split_list_begin_idx = [0] + space_ins_char_list
-
-    for i in range(len(word_split_list_begin_idx)):
-        begin = word_split_list_begin_idx[i]
 
-        if i != len(word_split_list_begin_idx)-1:
-            end = word_split_list_begin_idx[i+1]
-        else:
-            end = len(aligned_ref)
-        
-        w_ref = aligned_ref[begin: end]
-        w_hyp = aligned_asrTrans[begin: end]
+    starts, ends = alignmod.segment_bounds(np.array(space_ins_char_list, dtype=np.int64), len(aligned_ref))
 
-        if w_hyp[0] == ' ':
-            w_hyp = w_hyp[1:]
-            w_ref = w_ref[1:]
+    # The first part starts without a space in aligned_asrTrans
+    if aligned_asrTrans[:1] == ' ':
+        starts[0] = 1
 
-        w_ref_list.append(w_ref)
-        w_hyp_list.append(w_hyp)
+    w_ref_list = [aligned_ref[begin:end] for begin, end in zip(starts, ends)]
+    w_hyp_list = [aligned_asrTrans[begin:end] for begin, end in zip(starts, ends)]
 
     return w_ref_list, w_hyp_list
 
+"""
+For each position i of items: the first n non-empty items of items[i:].
+"""
+def getFirstNonEmptyWords(items, n):
+
+    nonEmptyItems = [item for item in items if item != '']
+
+    firstNonEmptyWords = []
+    nrNonEmptyBefore = 0
+    for item in items:
+        firstNonEmptyWords.append(nonEmptyItems[nrNonEmptyBefore:nrNonEmptyBefore+n])
+        if item != '':
+            nrNonEmptyBefore += 1
+    return firstNonEmptyWords
+
+"""
+The next recognized word recWordsList[cursor]: [label, confidence, start, end]. If all recognized words are consumed
+(the aligned transcription has more words than the ASR result), a word with label None, which is equal to no word.
+"""
+def getRecWord(recWordsList, cursor):
+    if cursor < len(recWordsList):
+        return recWordsList[cursor]
+    return [None, np.nan, np.nan, np.nan]
+
 def addConfidenceScores(promptAlignDF, recWordsDF):
 
     promptAlignDF = promptAlignDF.reset_index()
 
-    # convert recWordsDF to array 
+    aligned_asrTrans_key = 'aligned_asrTrans'
+    aligned_ref_key = 'aligned_ref'
+
+    # convert recWordsDF to array, the recognized words are consumed in order: recWordsList[cursor] is the next recognized word
     recWordsList = recWordsDF.values.tolist()
+    cursor = 0
 
-    insertionList = []
-    confStartEndList = []
-    for prid, row in promptAlignDF.iterrows():
+    # Get original alignments for insertion detection
+    asrTransOrigList = list(promptAlignDF[aligned_asrTrans_key])
+    refOrigList = list(promptAlignDF[aligned_ref_key])
 
-        aligned_asrTrans_key = 'aligned_asrTrans'
-        aligned_ref_key = 'aligned_ref'
+    # For each row prid: the first five non-empty aligned_asrTrans (without *) from row prid on
+    firstFiveNonEmptyWordsList = getFirstNonEmptyWords([x.replace('*', '') for x in asrTransOrigList], 5)
 
-        # Get original alignments for insertion detection
-        asrTransOrig = row[aligned_asrTrans_key]
-        refOrig = row[aligned_ref_key]
+    insertionList = []
+    confStartEndList = []
+    for prid, (asrTransOrig, refOrig) in enumerate(zip(asrTransOrigList, refOrigList)):
 
         # Select first aligned_asrTrans and remove *
-        asrTrans = row[aligned_asrTrans_key].replace('*', '')
+        asrTrans = asrTransOrig.replace('*', '')
 
         # Select corresponding prompt 
-        prompt = row[aligned_ref_key].replace('*', '')
+        prompt = refOrig.replace('*', '')
 
         # Compute nr of words in asrTrans
         nrWordsAsrTrans = 0 if asrTrans == '' else len(asrTrans.split(' '))
+        recWord = getRecWord(recWordsList, cursor)
         # print('asrTrans:', asrTrans.split(' '), nrWordsAsrTrans, ''.split(' '))
         # print('prompt:', prompt)
-        # print('recWordsList[0][0]', recWordsList[0][0])
-        # print('recWordsList[0][0] == asrTrans', recWordsList[0][0] == asrTrans)
+        # print('recWordsList[cursor][0]', recWordsList[cursor][0])
+        # print('recWordsList[cursor][0] == asrTrans', recWordsList[cursor][0] == asrTrans)
 
         if nrWordsAsrTrans == 1:
             # Check if first entry in recWordList is equal to asrTrans or prompt
             # Yes? Select the first entry and remove it from asrWordInfoDict
             # No? Probably the prompt word is not read by the child. Treat it as a deleted/skipped word (all zeroes).
-            if(recWordsList[0][0] == asrTrans or recWordsList[0][0] == prompt):
+            if(recWord[0] == asrTrans or recWord[0] == prompt):
                 # This is a substitution or correctly read word.
 
                 # Extract relevant information
-                prompt_label = recWordsList[0][0]
-                prompt_conf = recWordsList[0][1]
-                prompt_start = recWordsList[0][2]
-                prompt_end = recWordsList[0][3]
+                prompt_label = recWord[0]
+                prompt_conf = recWord[1]
+                prompt_start = recWord[2]
+                prompt_end = recWord[3]
                 if asrTrans == prompt:
                     prompt_miscue = 'cor'
                 else:
                     prompt_miscue = 'sub'
                 
                 # Update recWordsList
-                recWordsList = recWordsList[1:]
+                cursor += 1
             else:              
 
                 # This is skipped (deleted) word
@@ -309,10 +256,8 @@ def addConfidenceScores(promptAlignDF, recWordsDF):
                 prompt_miscue = 'del'
 
 
-                firstWords = [x.replace('*', '') for x in list(promptAlignDF[aligned_asrTrans_key])[prid:]]
-                firstFiveNonEmptyWords = [x for x in firstWords if x != ''][:5]
-                if not recWordsList[0][0] in firstFiveNonEmptyWords:
-                    recWordsList = recWordsList[1:]
+                if not recWord[0] in firstFiveNonEmptyWordsList[prid]:
+                    cursor += 1
                 
                 
         elif nrWordsAsrTrans == 0:
@@ -325,21 +270,21 @@ def addConfidenceScores(promptAlignDF, recWordsDF):
 
         elif nrWordsAsrTrans >= 2:
 
-            if(recWordsList[0][0] == asrTrans or recWordsList[0][0] == prompt):
+            if(recWord[0] == asrTrans or recWord[0] == prompt):
                 # This statement is added to catch words like 's nachts'
 
                 # Extract relevant information
-                prompt_label = recWordsList[0][0]
-                prompt_conf = recWordsList[0][1]
-                prompt_start = recWordsList[0][2]
-                prompt_end = recWordsList[0][3]
+                prompt_label = recWord[0]
+                prompt_conf = recWord[1]
+                prompt_start = recWord[2]
+                prompt_end = recWord[3]
                 if asrTrans == prompt:
                     prompt_miscue = 'cor'
                 else:
                     prompt_miscue = 'sub'
                 
                 # Update recWordsList
-                recWordsList = recWordsList[1:]
+                cursor += 1
 
             else:
 
@@ -356,59 +301,60 @@ def addConfidenceScores(promptAlignDF, recWordsDF):
 
                     asrTransWord = asrTransWord.replace('*', '').strip()
                     prompt = prompt.replace('*', '').strip()
+                    recWord = getRecWord(recWordsList, cursor)
 
                     # Is asrTransWord the first entry in asrWordInfoDict?
                     # Yes? Select the first entry and remove it from asrWordInfoDict
                     # No? The word is probably inserted by the child. Treat it as an insertion.
-                    if(recWordsList[0][0] == asrTransWord and recWordsList[0][0] == prompt):
+                    if(recWord[0] == asrTransWord and recWord[0] == prompt):
                         # Extract relevant information
-                        subprompt_label = recWordsList[0][0]
-                        subprompt_conf = recWordsList[0][1]
-                        subprompt_start = recWordsList[0][2]
-                        subprompt_end = recWordsList[0][3]
+                        subprompt_label = recWord[0]
+                        subprompt_conf = recWord[1]
+                        subprompt_start = recWord[2]
+                        subprompt_end = recWord[3]
                         subprompt_miscue = 'cor'
                         
                         # Update recWordsList
-                        recWordsList = recWordsList[1:]
+                        cursor += 1
 
                         # Set correctFound to True
                         correctFound = True
 
                         subPromptList.append([subprompt_label, subprompt_conf, subprompt_start, subprompt_end, subprompt_miscue])
 
-                    elif(recWordsList[0][0] == asrTransWord and recWordsList[0][0] != prompt):
+                    elif(recWord[0] == asrTransWord and recWord[0] != prompt):
 
                         if prompt == '':
                             # insertion
                             prompt_with_ins = prid
                             pos_ins_word = idx
-                            ins_label = recWordsList[0][0]
-                            ins_conf = recWordsList[0][1]
-                            ins_start = recWordsList[0][2]
-                            ins_end = recWordsList[0][3]
+                            ins_label = recWord[0]
+                            ins_conf = recWord[1]
+                            ins_start = recWord[2]
+                            ins_end = recWord[3]
                             ins_miscue = 'ins'
                             cor_already_found = correctFound
 
                             insertionList.append([prompt_with_ins, pos_ins_word, ins_label, ins_conf, ins_start, ins_end, ins_miscue, cor_already_found])
 
                             # Update recWordsList
-                            recWordsList = recWordsList[1:]
+                            cursor += 1
 
                         else:
                             # substitution
                             # Extract relevant information
-                            subprompt_label = recWordsList[0][0]
-                            subprompt_conf = recWordsList[0][1]
-                            subprompt_start = recWordsList[0][2]
-                            subprompt_end = recWordsList[0][3]
+                            subprompt_label = recWord[0]
+                            subprompt_conf = recWord[1]
+                            subprompt_start = recWord[2]
+                            subprompt_end = recWord[3]
                             subprompt_miscue = 'sub'
 
                             subPromptList.append([subprompt_label, subprompt_conf, subprompt_start, subprompt_end, subprompt_miscue])
                             
                             # Update recWordsList
-                            recWordsList = recWordsList[1:]
+                            cursor += 1
                     
-                    elif(recWordsList[0][0].find(asrTransWord) != -1 and recWordsList[0][0] != prompt):
+                    elif(recWord[0] is not None and recWord[0].find(asrTransWord) != -1 and recWord[0] != prompt):
                         # The prompt word is not read by the child. Treat it as a deleted/skipped word (all zeroes).
                         subprompt_label = ''
                         subprompt_conf = 0
@@ -421,15 +367,18 @@ def addConfidenceScores(promptAlignDF, recWordsDF):
 
                     else:
                         print('This should not happen, if it does: find out what to do...')
-                        print('recWordsList[0][0]', recWordsList[0][0])
+                        print('recWordsList[cursor][0]', recWord[0])
                         print('asrTransWord:', asrTransWord)
-                        print(recWordsList[0][0] == asrTransWord)
+                        print(recWord[0] == asrTransWord)
                         print('prompt:', prompt)
-                        print(recWordsList[0][0] == prompt)
+                        print(recWord[0] == prompt)
 
 
                 # print(pd.DataFrame(subPromptList))
                 # Extract prompt info from subPromptList
+                if len(subPromptList) == 0:
+                    # None of the words is found in the recognized words: treat it as a skipped (deleted) word
+                    subPromptList.append(['', np.nan, np.nan, np.nan, 'del'])
                 prompt_label = " ".join([x[0] for x in subPromptList])
                 prompt_conf = np.mean([float(x[1]) for x in subPromptList]) # 1=subprompt_start
                 prompt_start = subPromptList[0][2] # 2=subprompt_start
@@ -445,7 +394,16 @@ def addConfidenceScores(promptAlignDF, recWordsDF):
 
     return promptAlignDF, insertionDF
 
-def correctForNotReadSentences(promptAlignConfDF, insertionDF, asrTranscription, recWordsDF):
+"""
+Check for each sentence whether it is read. If the last sentences are not read, the read sentences are aligned again with the asrTranscription,
+and the not read sentences with an empty transcription.
+
+prompt              string: the prompt of promptAlignConfDF, and characterAlignment the STEP 1 alignment (utils/alignment_modern.align_characters_batch)
+                    of prompt and asrTranscription. If given, the alignment of the read sentences is derived from this alignment if possible
+                    (alignmod.one_way_alignment_modern_prefix), so the prompt is only aligned once.
+alignCache          AlignmentCache (utils/alignment_cache.py) or None: cache for the alignment of the read sentences, if it is aligned again.
+"""
+def correctForNotReadSentences(promptAlignConfDF, insertionDF, asrTranscription, recWordsDF, engine = alignmod.DEFAULT_ENGINE, prompt = None, characterAlignment = None, alignCache = None):
     # Check for each sentence whether it is read or not
 
     # Add sentenceNr to the promptAlignConfDF
@@ -453,13 +411,12 @@ def correctForNotReadSentences(promptAlignConfDF, insertionDF, asrTranscription,
 
     # Get for each sentence the percentage of deleted words (prompt_miscue = del)
     unique_sentences = sorted(list(set(promptAlignConfDF['sentence_nr'])), reverse=True)
+    percDelPerSentence = (promptAlignConfDF['prompt_miscue'] == 'del').groupby(promptAlignConfDF['sentence_nr']).mean()
 
     # Loop through each sentence, start from the back. If percentage of del words > 50%, the sentence is probably not read by the child.
     id_last_read_sentence = unique_sentences[0]
     for sentence_idx in unique_sentences:
-        sentenceDF = promptAlignConfDF[(promptAlignConfDF['sentence_nr'] == sentence_idx)]
-        percDelPerSentence = len(sentenceDF[sentenceDF['prompt_miscue'] == 'del']) / len(sentenceDF)
-        if(percDelPerSentence <= 0.5):
+        if(percDelPerSentence[sentence_idx] <= 0.5):
             id_last_read_sentence = sentence_idx
             break
 
@@ -479,11 +436,19 @@ def correctForNotReadSentences(promptAlignConfDF, insertionDF, asrTranscription,
         
         not_read_prompts = " ".join(promptAlignConfDF_not_read['prompt'])
         not_read_promptIDs = promptAlignConfDF_not_read.index
-        empty_recWordsDF =  pd.DataFrame([], columns= ['label', 'confidence', 'start', 'end'])
 
         # The alignment should be done again: read_prompts vs asr_transcript & not_read_prompt vs empty string
-        promptAlignConfDF_read, insertionDF_read = alignWithConfidenceScores(asrTranscription, recWordsDF, read_prompts, read_promptIDs)
-        promptAlignConfDF_not_read, insertionDF_not_read = alignWithConfidenceScores(' ', empty_recWordsDF, not_read_prompts, not_read_promptIDs)
+        # The read_prompts are the start of the prompt: its alignment is derived from the alignment of the whole prompt if possible.
+        promptAlignDF_read = None
+        if characterAlignment is not None and prompt.startswith(read_prompts):
+            prefixAlignment = alignmod.one_way_alignment_modern_prefix(prompt, len(read_prompts), asrTranscription, characterAlignment, engine)
+            if prefixAlignment is not None:
+                promptAlignDF_read = alignmod.alignment_frame(*prefixAlignment)
+        if promptAlignDF_read is None:
+            promptAlignDF_read = alignmod.alignment_frame(*alignBatchCached(alignCache, read_prompts, [asrTranscription], engine)[1][0])
+
+        promptAlignConfDF_read, insertionDF_read = alignWithConfidenceScores(asrTranscription, recWordsDF, read_prompts, read_promptIDs, engine, promptAlignDF_read)
+        promptAlignConfDF_not_read = alignNotReadSentences(not_read_prompts, tuple(not_read_promptIDs), engine)
 
         newPromptAlignConfDF = pd.concat([promptAlignConfDF_read, promptAlignConfDF_not_read])
         newPromptAlignConfDF['index'] = range(len(newPromptAlignConfDF))
@@ -491,11 +456,27 @@ def correctForNotReadSentences(promptAlignConfDF, insertionDF, asrTranscription,
     else:
         return promptAlignConfDF.loc[:, promptAlignConfDF.columns != 'sentence_nr'], insertionDF, sentenceStats
 
+"""
+Alignment of the not read sentences with an empty transcription. This only depends on the sentences, so it is computed once for all
+recordings of a task that stop at the same sentence. Each call returns a copy, which the caller may change.
+"""
+def alignNotReadSentences(not_read_prompts, not_read_promptIDs, engine):
+    return alignNotReadSentencesCached(not_read_prompts, not_read_promptIDs, engine).copy()
+
+@functools.lru_cache(maxsize=256)
+def alignNotReadSentencesCached(not_read_prompts, not_read_promptIDs, engine):
+
+    empty_recWordsDF =  pd.DataFrame([], columns= ['label', 'confidence', 'start', 'end'])
+    promptAlignConfDF_not_read, insertionDF_not_read = alignWithConfidenceScores(' ', empty_recWordsDF, not_read_prompts, list(not_read_promptIDs), engine)
+
+    return promptAlignConfDF_not_read
+
 # @timeoutable()
-def alignWithConfidenceScores(asrTranscription, recWordsDF, prompt, promptIDs):
+def alignWithConfidenceScores(asrTranscription, recWordsDF, prompt, promptIDs, engine = alignmod.DEFAULT_ENGINE, promptAlignDF = None):
 
-    # Align prompt and AsrResult transcription
-    promptAlignDF = alignOneFile(asrTranscription, prompt)
+    # Align prompt and AsrResult transcription (if not aligned already in a batch, see alignTaskBatch)
+    if promptAlignDF is None:
+        promptAlignDF = alignOneFile(asrTranscription, prompt, engine)
     # promptAlignDF.to_csv('promptAlignDF.tsv', sep='\t')
 
     # Add confidence scores with AsrResult
@@ -508,7 +489,112 @@ def alignWithConfidenceScores(asrTranscription, recWordsDF, prompt, promptIDs):
 
     return promptAlignConfDF, insertionDF
 
-    
+"""
+Align a batch of ASR results of the same task with the prompt: the string alignments of all files are done at once
+(utils/alignment_modern.align_characters_batch and finish_alignment_batch), the confidence scores and corrections per file.
+
+Returns a list with (promptAlignConfDF, insertionDF, sentenceStats) for each asrResult (tuple of asrTranscription and recWordsDF).
+promptNgrams: the anchor n-grams of the prompt index (utils/prompt_index.py), if available.
+alignCache: AlignmentCache (utils/alignment_cache.py) or None. Only the string alignments are cached, the confidence scores are added per file.
+"""
+def alignTaskBatch(asrResults, prompt, promptIDs, engine = alignmod.DEFAULT_ENGINE, promptNgrams = None, alignCache = None):
+
+    # STEP 1 is kept, to derive the alignment of the read sentences in correctForNotReadSentences from it
+    characterAlignments, alignments = alignBatchCached(alignCache, prompt, [asrTranscription for asrTranscription, recWordsDF in asrResults], engine, promptNgrams)
+    promptAlignDFs = [alignmod.alignment_frame(*x) for x in alignments]
+
+    outputs = []
+    for (asrTranscription, recWordsDF), promptAlignDF, characterAlignment in zip(asrResults, promptAlignDFs, characterAlignments):
+
+        # Add confidence scores to the alignment
+        promptAlignConfDF, insertionDF = alignWithConfidenceScores(asrTranscription, recWordsDF, prompt, promptIDs, engine, promptAlignDF)
+
+        # Correct alignment process in case the whole prompt is not read
+        outputs.append(correctForNotReadSentences(promptAlignConfDF, insertionDF, asrTranscription, recWordsDF, engine, prompt, characterAlignment, alignCache))
+
+    return outputs
+
+"""
+Write a DataFrame to a .csv file. The file is written to a temporary file first and then renamed,
+so that an interrupted run never leaves a half-written .csv file.
+"""
+def writeCsvAtomic(df, csvFile):
+    tmpFile = csvFile + '.' + str(os.getpid()) + '.tmp'
+    df.to_csv(tmpFile)
+    os.replace(tmpFile, csvFile)
+
+def errorMessage(error):
+    return type(error).__name__ + ': ' + str(error)
+
+"""
+Align a batch of ASR results of the same task (basenames of the .json files) and save the .csv output files.
+If the batch fails, the files are aligned one by one, so that a file that cannot be aligned does not stop the other files.
+
+settings    dict:   outputDir, asrResultDir, promptDir, engine, alignCache and promptIndexes (the prompt index of each task)
+Returns a dict with the sentenceStats of each aligned file and a list of (basename, error message) of the files that failed.
+"""
+def alignAndSaveBatch(task, basenames, settings):
+
+    promptIndex = settings['promptIndexes'][task]
+    promptFile = os.path.join(settings['promptDir'], task + '.prompt')
+
+    try:
+        # Read .json asrResult files
+        asrResults = []
+        for basename in basenames:
+            asrResultFile = os.path.join(settings['asrResultDir'], basename + '.json')
+            checkIfFilesExist(asrResultFile, promptFile)
+            asrResults.append(readAsrResult(asrResultFile))
+
+        # Perform alignment process, and correct it in case the whole prompt is not read
+        outputs = alignTaskBatch(asrResults, promptIndex['prompt'], promptIndex['promptIDs'], settings['engine'], promptIndex['anchorNgrams'], settings['alignCache'])
+
+    except Exception as error:
+        if len(basenames) == 1:
+            return {}, [(basenames[0], errorMessage(error))]
+
+        sentenceStatsPerFile = {}
+        errors = []
+        for basename in basenames:
+            fileSentenceStats, fileErrors = alignAndSaveBatch(task, [basename], settings)
+            sentenceStatsPerFile.update(fileSentenceStats)
+            errors += fileErrors
+        return sentenceStatsPerFile, errors
+
+    sentenceStatsPerFile = {}
+    for basename, (promptAlignConfDF, insertionDF, sentenceStats) in zip(basenames, outputs):
+
+        # Save the csv alignment output files
+        writeCsvAtomic(promptAlignConfDF, os.path.join(settings['outputDir'], 'csv-align-forward', basename + '.csv'))
+        writeCsvAtomic(insertionDF, os.path.join(settings['outputDir'], 'csv-align-forward-ins', basename + '.csv'))
+
+        sentenceStatsPerFile[basename] = sentenceStats
+
+    return sentenceStatsPerFile, []
+
+def initAlignWorker(settings):
+    global workerSettings
+    workerSettings = settings
+
+def alignBatchInWorker(job):
+    return alignAndSaveBatch(*job, workerSettings)
+
+"""
+Run the jobs ((task, basenames) tuples) serially, or with a pool of nJobs worker processes.
+Yields the result of alignAndSaveBatch for each job, in the order in which the jobs finish.
+"""
+def runAlignJobs(jobs, settings, nJobs):
+
+    if nJobs == 1:
+        for job in jobs:
+            yield alignAndSaveBatch(*job, settings)
+        return
+
+    context = multiprocessing.get_context('fork')
+    with context.Pool(processes=nJobs, initializer=initAlignWorker, initargs=(settings,)) as pool:
+        for result in pool.imap_unordered(alignBatchInWorker, jobs, chunksize=1):
+            yield result
+
 def createOutputDirectories(list_of_output_dirs):
 
     for output_dir in list_of_output_dirs:
@@ -523,7 +609,14 @@ def run(args):
     outputDir = args.output_dir
     promptDir = args.prompt_dir
     asrResultDir = args.input_asr_dir
+    engine = args.engine
+    batchSize = args.batchSize
+    nJobs = max(1, args.jobs)
 
+    # Alignment cache, only if --alignCacheDir is given (it can be shared by the output dirs of all ASR settings)
+    alignCache = None
+    if args.alignCacheDir is not None:
+        alignCache = AlignmentCache(args.alignCacheDir)
 
     # Create output directories if they don't exist yet.
     outputDirCsvAlignForward = os.path.join(outputDir, 'csv-align-forward')
@@ -534,50 +627,57 @@ def run(args):
     jsonFileList = glob.glob(os.path.join(asrResultDir, '*.json'))
     print('Nr of ASR result files to align: ', len(jsonFileList))
 
-    # Iterate over each audio file, select the corresponding asrResult and prompt, align the two, save csv output in outputDir
-    sentenceStatsList = []
-    for idx, jsonFile in enumerate(jsonFileList):
-
+    # Group the files per task, so that the prompt of each task is read once and the files of a task are aligned in batches
+    jsonFilesPerTask = {}
+    for jsonFile in sorted(jsonFileList):
         basename = os.path.basename(jsonFile).replace('.json', '')
-        task = basename.split('-')[1]
-
-        promptFile = os.path.join(promptDir, task + '.prompt')
-        promptIdxFile = os.path.join(promptDir, task + '-wordIDX.csv')
-        asrResultFile = os.path.join(asrResultDir, basename + '.json')
-        
-        # Check if csv alignment file already exists. If not, do the alignment process.
-        forwardExists = os.path.isfile(os.path.join(outputDir, 'csv-align-forward/' + basename + '.csv'))
-        # if not forwardExists:
-
-        checkIfFilesExist(asrResultFile, promptFile)
-
-        # Read <task>.prompt file
-        prompt = readPromptFile(promptFile)
-    
-        # Read <task>-wordIDX.csv file
-        promptIDs = getPromptIdxs(promptIdxFile)
-
-        # Read .json asrResult file
-        asrTranscription, recWordsDF = readAsrResult(asrResultFile)
-
-        # Perform alignment process
-        promptAlignConfDF, insertionDF = alignWithConfidenceScores(asrTranscription, recWordsDF, prompt, promptIDs)
-
-        # Correct alignment process in case the whole prompt is not read
-        promptAlignConfDF, insertionDF, sentenceStats = correctForNotReadSentences(promptAlignConfDF, insertionDF, asrTranscription, recWordsDF)
+        jsonFilesPerTask.setdefault(basename.split('-')[1], []).append(basename)
+
+    # Read the normalized <task>.prompt file and the prompt IDs of <task>-wordIDX.csv from the prompt index (parsed once per task, see utils/prompt_index.py)
+    # The indexes are made before the workers are started, so that the workers do not build the same index file at the same time.
+    # The index files are saved in --promptIndexDir (which can be shared by the runs of all ASR settings), the prompt dir is only read.
+    promptIndexes = {}
+    errors = []
+    for task in sorted(jsonFilesPerTask):
+        try:
+            promptIndexes[task] = promptidx.getPromptIndex(promptDir, task, args.promptIndexDir)
+        except Exception as error:
+            errors += [(basename, 'Prompt of task ' + task + ' not available: ' + errorMessage(error)) for basename in jsonFilesPerTask[task]]
+
+    # Jobs: batches of ASR results of the same task. With several workers the batches are smaller, so that all workers are busy.
+    jobs = []
+    for task in sorted(promptIndexes):
+        taskBasenames = jsonFilesPerTask[task]
+        jobSize = min(batchSize, math.ceil(len(taskBasenames) / nJobs))
+        jobs += [(task, taskBasenames[jobStart:jobStart+jobSize]) for jobStart in range(0, len(taskBasenames), jobSize)]
+
+    settings = {'outputDir': outputDir, 'asrResultDir': asrResultDir, 'promptDir': promptDir, 'engine': engine, 'alignCache': alignCache, 'promptIndexes': promptIndexes}
+
+    # Align each batch, save csv output in outputDir and collect the sentenceStats of each file
+    sentenceStatsPerFile = {}
+    for jobSentenceStats, jobErrors in runAlignJobs(jobs, settings, nJobs):
+        sentenceStatsPerFile.update(jobSentenceStats)
+        for basename, error in jobErrors:
+            print('Alignment not possible:', basename, error)
+        errors += jobErrors
+        print(datetime.now(), ':', len(sentenceStatsPerFile) + len(errors), 'of', len(jsonFileList), 'json files processed.')
+
+    # sentenceStats in the order of the file names, independent of the order in which the jobs finished
+    sentenceStatsList = [[basename] + sentenceStatsPerFile[basename] for basename in sorted(sentenceStatsPerFile)]
 
-        # Save the csv alignment output files
-        promptAlignConfDF.to_csv(os.path.join(outputDir, 'csv-align-forward/' + basename + '.csv'))
-        insertionDF.to_csv(os.path.join(outputDir, 'csv-align-forward-ins/' + basename + '.csv'))
-        
-        # Add the sentenceStats to an overview file
-        sentenceStatsList.append([basename] + sentenceStats)
+    sentenceStatsDF = pd.DataFrame(sentenceStatsList, columns = ['audioID', 'id_last_read_sentence', 'nr_missing_sentences', 'perc_sentences_read', 'nr_sentences_prompt']).set_index('audioID')
 
-        if (idx+1)%10==0:
-            print(datetime.now(), ':', idx, 'of', len(jsonFileList), 'json files processed.')
+    # If the ASR results were made with a model cascade (whispert.py --cascadeModel), add the tier that produced each result
+    cascadeTiersFile = os.path.join(os.path.dirname(os.path.normpath(asrResultDir)), 'cascade-tiers.tsv')
+    if os.path.exists(cascadeTiersFile):
+        cascadeTiersDF = pd.read_csv(cascadeTiersFile, sep='\t', index_col='audioID')
+        sentenceStatsDF = sentenceStatsDF.join(cascadeTiersDF[['tier', 'model']].add_prefix('cascade_'))
+    writeCsvAtomic(sentenceStatsDF, os.path.join(outputDir, 'sentenceStats.csv'))
 
-    sentenceStatsDF = pd.DataFrame(sentenceStatsList, columns = ['audioID', 'id_last_read_sentence', 'nr_missing_sentences', 'perc_sentences_read', 'nr_sentences_prompt']).set_index('audioID')
-    sentenceStatsDF.to_csv(os.path.join(outputDir, 'sentenceStats.csv'))
+    if len(errors) > 0:
+        print('Alignment not possible for', len(errors), 'files, these are not in sentenceStats.csv:')
+        for basename, error in sorted(errors):
+            print(basename, error)
 
     print("Script 01 completed: The prompts of all task files are aligned with the ASR results.")
 
@@ -585,11 +685,21 @@ def run(args):
     print('Nr of files in ', os.path.join(outputDir, 'csv-align-forward-ins:') , len(glob.glob(os.path.join(outputDir, 'csv-align-forward-ins/*.csv'))))
     print('sentenceStats.csv created:', os.path.exists(os.path.join(outputDir, 'sentenceStats.csv')))   
 
+    # The output of the other files is saved, but the run failed
+    if len(errors) > 0:
+        sys.exit(1)
+
 def main():
     parser = argparse.ArgumentParser("Message")
     parser.add_argument("--output_dir", type=str, help = "Output directory where csv file with alignment between whisperT output and prompt are saved.")
     parser.add_argument("--prompt_dir", type=str, help = "promptDir")
     parser.add_argument("--input_asr_dir", type=str, help = "Directory with JSON WhisperT AsrResult files corresponding to audio.")
+    parser.add_argument("--engine", type=str, default = alignmod.DEFAULT_ENGINE, choices = alignmod.ENGINES, help = "Alignment engine: bio (character-level alignment of the whole story, default), anchored (as bio, split at unique word n-gram anchors where this gives the same alignment), linear (as bio, in linear memory) or tiered (fast path for (near) exact readings, e.g. orthographic transcriptions).")
+
+    parser.add_argument("--batchSize", type=int, default = 64, help = "Number of ASR results of the same task that are aligned in one batch (default: 64).")
+    parser.add_argument("--jobs", type=int, default = 1, help = "Number of worker processes that align in parallel (default: 1).")
+    parser.add_argument("--alignCacheDir", type=str, default = None, help = "Optional: directory of the alignment cache, which can be shared by the output dirs of all ASR settings (default: no cache).")
+    parser.add_argument("--promptIndexDir", type=str, default = None, help = "Optional: directory of the prompt index files (see utils/prompt_index.py), which can be shared by the runs of all ASR settings (default: the prompts are parsed in each run).")
 
     parser.set_defaults(func=run)
     args = parser.parse_args()
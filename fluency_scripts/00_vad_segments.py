@@ -0,0 +1,59 @@
+import os
+import glob
+import argparse
+from datetime import datetime
+import whisper_timestamped as whisper
+
+import utils.vad_segments as vadseg
+
+"""
+Compute the speech regions (voice activity detection) of each audio file once, and save them next to the audio file
+as <audioFile>.vad.npz (see utils/vad_segments.py).
+
+The cached regions are used by:
+- asr_decoders/whispert.py, for the asrSettings with 'vad' (instead of recomputing the VAD in every run and for every setting)
+- 03_asr-results2features.py and 06_inter-intra-pauses.py (option --audioDir), to cross-check the ASR pauses
+
+Audio files of which the cache file is up-to-date are skipped.
+"""
+
+def run(args):
+
+    audioDir = args.audioDir
+    audioExtension = args.audioExtension
+
+    audioFileList = sorted(glob.glob(os.path.join(audioDir, '*' + audioExtension)))
+
+    assert len(audioFileList) > 0, "In this audioDir are no " + audioExtension + " files."
+
+    startTime = datetime.now()
+    nrOfComputed = 0
+    for audioFile in audioFileList:
+
+        if not args.overwrite and vadseg.loadVadSegments(audioFile, args.vadMethod) is not None:
+            continue
+
+        try:
+            audio = whisper.load_audio(audioFile)
+            starts, ends = vadseg.computeVadSegments(audio, args.vadMethod)
+            vadseg.saveVadSegments(audioFile, starts, ends, args.vadMethod)
+            nrOfComputed += 1
+            print('Created:', vadseg.vadSegmentsPath(audioFile), len(starts), 'speech regions')
+        except Exception as error:
+            print('VAD not possible:', audioFile, error)
+
+    print("Done: computed VAD segments of", nrOfComputed, "of", len(audioFileList), "audio files from", startTime, "till", datetime.now())
+
+def main():
+    parser = argparse.ArgumentParser("Message")
+    parser.add_argument("--audioDir", type=str, help = "Path to audioDir directory.")
+    parser.add_argument("--audioExtension", type=str, help = "Audio extension, e.g., .wav or .mp3")
+    parser.add_argument("--vadMethod", type=str, default = vadseg.VAD_METHOD, help = "VAD method of whisper_timestamped (default: silero, the method used by --asrSettings whispert_vad_dis).")
+    parser.add_argument("--overwrite", action = "store_true", help = "Recompute the VAD segments, also if they are up-to-date.")
+
+    parser.set_defaults(func=run)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,7 @@ import pandas as pd
 import os
 import numpy as np
 
-def normalizeMissingValues(v):
-    if v == '--undefined--' or v == '':
-        return np.nan
-    else:
-        return v
+import utils.syllable_nuclei as syllnuc
 
 
 def run(args):
@@ -35,14 +31,10 @@ def run(args):
         # modulo_idx == 2 : computed measures
 
         if modulo_idx == 2:
-            outputMatrix.append(normalizeMissingValues(item) for item in line.split(', '))
+            outputMatrix.append(line.split(', '))
 
     header = data[1].split(', ')
-    df = pd.DataFrame(outputMatrix, columns = header)
-    
-    # Set index to <speaker>-<task>
-    df['audioID'] = df['name'].apply(lambda x: x.split('-')[0] + '-'+ x.split('-')[1])
-    df = df.drop('name', axis=1).set_index('audioID')
+    df = syllnuc.syllableNucleiFrame(header, outputMatrix)
     df.to_csv(fluencyFeatureTsv, sep='\t', na_rep = 'NA')
 
     print('Output tsv:', fluencyFeatureTsv)
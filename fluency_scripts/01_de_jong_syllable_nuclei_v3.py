@@ -2,57 +2,155 @@ import parselmouth
 from parselmouth.praat import call, run_file
 import argparse
 import os
+import sys
 import shutil
 import glob
+import tempfile
+import multiprocessing
+import pandas as pd
+
+import utils.syllable_nuclei as syllnuc
+import utils.syllable_nuclei_native as sylnat
+
+PRAAT_SCRIPT = './fluency_scripts/SyllableNucleiv3.praat'
+
+"""
+Run SyllableNucleiv3.praat on one audio file.
+The Praat script writes a .auto.TextGrid file next to the audio file. So the audio file is linked (or copied) to a private
+scratch directory and the TextGrid is moved from there to textGridDir: several workers can run the script at the same time.
+Returns (audioFile, header, measures, error): header and measures are lists of strings (see utils/syllable_nuclei.py), error is None or an error message.
+"""
+def runSyllableNuclei(audioDir, audioFile, textGridDir):
+
+    scratchDir = tempfile.mkdtemp(prefix='.scratch-', dir=textGridDir)
+    try:
+        try:
+            os.link(os.path.join(audioDir, audioFile), os.path.join(scratchDir, audioFile))
+        except OSError:
+            shutil.copyfile(os.path.join(audioDir, audioFile), os.path.join(scratchDir, audioFile))
+
+        # Write path to audio file with following structure: '<scratchDir>/*fn000051.wav'
+        audioPath = os.path.join(scratchDir, '*' + audioFile)
+        objects, output = run_file(PRAAT_SCRIPT, audioPath, 'None', -25, 2, 0.3, True, 'Dutch', 1, 'Praat Info window', 'OverWriteData', True, capture_output=True)
+
+        result = syllnuc.parseSyllableNucleiOutput(output)
+        if result is None:
+            return audioFile, None, None, 'No measures in the Praat output: ' + output.strip()
+
+        for tgFile in glob.glob(os.path.join(scratchDir, '*.TextGrid')):
+            outputFile = os.path.join(textGridDir, os.path.basename(tgFile))
+            os.replace(tgFile, outputFile)
+
+        return audioFile, result[0], result[1], None
+
+    except Exception as error:
+        return audioFile, None, None, str(error)
+
+    finally:
+        shutil.rmtree(scratchDir, ignore_errors=True)
+
+"""
+Syllable nuclei of one audio file with utils/syllable_nuclei_native.py (same parameters as the Praat script, no TextGrid).
+Returns (audioFile, header, measures, error) as runSyllableNuclei.
+"""
+def runSyllableNucleiNative(audioDir, audioFile, textGridDir):
+
+    try:
+        sound = parselmouth.Sound(os.path.join(audioDir, audioFile))
+        result = sylnat.syllableNuclei(sound, os.path.splitext(audioFile)[0])
+        return audioFile, sylnat.HEADER, sylnat.formatMeasures(result), None
+
+    except Exception as error:
+        return audioFile, None, None, str(error)
+
+ENGINES = {'praat': runSyllableNuclei, 'native': runSyllableNucleiNative}
+
+def runJob(job):
+    audioDir, audioFile, textGridDir, engine = job
+    return ENGINES[engine](audioDir, audioFile, textGridDir)
+
+def runJobInWorker(job):
+    return runJob(job)
+
+"""
+Run the jobs ((audioDir, audioFile, textGridDir, engine) tuples) serially, or with a pool of nJobs worker processes (longest files first).
+Yields the result of runSyllableNuclei for each job, in the order in which the jobs finish.
+"""
+def runJobs(jobs, nJobs):
+
+    if nJobs == 1:
+        for job in jobs:
+            yield runJob(job)
+        return
+
+    jobs = sorted(jobs, key=lambda job: os.path.getsize(os.path.join(job[0], job[1])), reverse=True)
+
+    context = multiprocessing.get_context('fork')
+    with context.Pool(processes=nJobs) as pool:
+        for result in pool.imap_unordered(runJobInWorker, jobs, chunksize=1):
+            yield result
 
 def run(args):
 
     audioDir = args.audioDir
     audioExtension = args.audioExtension
     fluencyDir = args.fluencyDir
+    nJobs = max(1, args.jobs)
 
     audioFilesRegExp = os.path.join(audioDir, '*' + audioExtension)
     assert len(glob.glob(audioFilesRegExp)) > 0, "audioDir doesn't contain " + audioExtension + " audio files"
 
-    audioFileList = [os.path.basename(x) for x in glob.glob(audioFilesRegExp)]
+    audioFileList = sorted([os.path.basename(x) for x in glob.glob(audioFilesRegExp)])
 
-    for audioFile in audioFileList:
+    # The .TextGrid files of the Praat script are saved in the outputDir
+    outputDir = os.path.join(fluencyDir, 'de_jong_textgrids')
+    if not os.path.exists(outputDir):
+        os.makedirs(outputDir)
 
-        # Write path to audio file with following structure: './comp-q-read_nl_age7-11_nat/audio_first_story/*fn000051.wav'
-        audioPath = os.path.join(audioDir, '*' + audioFile)
+    results = {}
+    for audioFile, header, measures, error in runJobs([(audioDir, audioFile, outputDir, args.engine) for audioFile in audioFileList], nJobs):
+        if error is not None:
+            print('Syllable nuclei not possible:', audioFile, error, file=sys.stderr)
+        else:
+            results[audioFile] = (header, measures)
 
-        try:
-            run_file('./fluency_scripts/SyllableNucleiv3.praat', audioPath, 'None', -25, 2, 0.3, True, 'Dutch', 1, 'Praat Info window', 'OverWriteData', True)
-        except Exception as e:
-            print('\n')
-            pass
+    # Print the measures as the Praat Info window (path, header, measures for each file), in the order of the file names.
+    # This output can be converted with 01_de_jong_syllable_nuclei_postprocess.py
+    for audioFile in sorted(results):
+        header, measures = results[audioFile]
+        print(os.path.join(audioDir, '*' + audioFile))
+        print(', '.join(header))
+        print(', '.join(measures))
 
-    # Running this script also automatically creates .TextGrid files in the audioDir
-    # With this piece of code, we move these .TextGrid files to the outputDir
-    outputDir = os.path.join(fluencyDir, 'de_jong_textgrids')
+    if len(results) == 0:
+        return
+    df = syllnuc.syllableNucleiFrame(results[sorted(results)[0]][0], [results[audioFile][1] for audioFile in sorted(results)])
 
-    # If outputDir doesn't exist, create it and move the TextGrid files to it from the audioDir
-    if not os.path.exists(outputDir):
-        os.makedirs(outputDir)
-    
-        for tg_file in glob.glob(os.path.join(audioDir, '*.TextGrid')):
+    # Save the measures as .tsv file (as 01_de_jong_syllable_nuclei_postprocess.py)
+    if args.outputTsv is not None:
+        tmpFile = args.outputTsv + '.' + str(os.getpid()) + '.tmp'
+        df.to_csv(tmpFile, sep='\t', na_rep = 'NA')
+        os.replace(tmpFile, args.outputTsv)
+        print('Output tsv:', args.outputTsv, file=sys.stderr)
 
-            if not os.path.exists(os.path.join(outputDir, tg_file)):
-                shutil.move(tg_file, outputDir)
-    
-    # Remove remaining TextGrid files in audioDir
-    for tg_file in glob.glob(os.path.join(audioDir, '*.TextGrid')):
-        os.remove(os.path.join(audioDir, tg_file))
+    # Compare the measures with the measures of another run (e.g. the --outputTsv of the Praat engine, to validate the native engine)
+    if args.compareTsv is not None:
+        referenceDF = pd.read_csv(args.compareTsv, sep='\t', index_col='audioID')
+        print(syllnuc.compareSyllableNucleiFrames(df, referenceDF).to_string(), file=sys.stderr)
 
 def main():
     parser = argparse.ArgumentParser("Message")
     parser.add_argument("--audioDir", type=str, help = "Path to audioDir directory.")
     parser.add_argument("--audioExtension", type=str, help = "Audio extension, e.g., .wav or .mp3")
     parser.add_argument("--fluencyDir", type=str, help = "Path to dir where de Jong's output TextGrids should be saved.")
+    parser.add_argument("--jobs", type=int, default = 1, help = "Number of worker processes that run the Praat script in parallel (default: 1).")
+    parser.add_argument("--outputTsv", type=str, default = None, help = "Optional: .tsv file with the measures of all audio files (the output of 01_de_jong_syllable_nuclei_postprocess.py).")
+    parser.add_argument("--engine", type=str, default = 'praat', choices = sorted(ENGINES), help = "praat: run SyllableNucleiv3.praat (default), native (experimental): compute the measures in Python (utils/syllable_nuclei_native.py), without TextGrids. The native engine is only validated on synthetic audio; check it against --engine praat with --compareTsv before using its measures.")
+    parser.add_argument("--compareTsv", type=str, default = None, help = "Optional: .tsv file with measures of another run (e.g. --outputTsv of --engine praat); the agreement per measure is printed to stderr.")
 
     parser.set_defaults(func=run)
     args = parser.parse_args()
     args.func(args)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -5,6 +5,8 @@ import json
 import numpy as np
 import argparse
 
+import utils.vad_segments as vadseg
+
 # def renameFile(fileName):
 #     spk = fileName.split('-')[0]
 #     task = fileName.split('-')[1]
@@ -62,6 +64,22 @@ def pausesAnalysis(items):
     return stats_pauses_durations, pauses_durations
     
 
+"""
+Start and end time of the pauses between items of at least minPause seconds (the pauses of pausesAnalysis).
+"""
+def getPauseIntervals(items, minPause = 0.2):
+    return [(item['end'], nextItem['start']) for item, nextItem in zip(items[:-1], items[1:]) if nextItem['start'] - item['end'] >= minPause]
+
+"""
+Cross-check the pauses between the words with the cached VAD segments of the audio file (see fluency_scripts/00_vad_segments.py).
+Returns an empty dict if there are no VAD segments for this file.
+"""
+def vadPauseAnalysis(audioFile, words):
+    vadSegments = vadseg.loadVadSegments(audioFile) if os.path.exists(audioFile) else None
+    if vadSegments is None or len(words) == 0:
+        return {}
+    return vadseg.vadPauseCrossCheck(getPauseIntervals(words), vadSegments, words[0]['start'], words[-1]['end'])
+
 def changeNamesOfKeys(outputDict, prefix):
     return dict((prefix+key, value) for (key, value) in outputDict.items())
 
@@ -154,6 +172,10 @@ def run(args):
 
             outputDict[basename] = {**stats_reading_fluency, **stats_durations_disfluencies, **stats_conf_disfluencies, **stats_durations_words, **stats_conf_words, **stats_pauses_durations, **stats_pauses2_durations}
 
+            # Optional: cross-check the pauses with the VAD segments of the audio file
+            if args.audioDir is not None:
+                outputDict[basename].update(vadPauseAnalysis(os.path.join(args.audioDir, basename + args.audioExtension), words))
+
         except Exception as error:
             print('not possible:', basename, error)
     
@@ -164,6 +186,8 @@ def main():
     parser = argparse.ArgumentParser("Message")
     parser.add_argument("--jsonAsrResultsDir", type=str, help = "Path to json-asr-results directory.")
     parser.add_argument("--outputFile", type=str, help = "Path to dir where the output file should be saved.")
+    parser.add_argument("--audioDir", type=str, default = None, help = "Optional: path to audio directory with cached VAD segments (see 00_vad_segments.py). Adds vad_* columns that cross-check the pauses.")
+    parser.add_argument("--audioExtension", type=str, default = ".wav", help = "Extension of audio files in audio dir (default: .wav)")
 
     parser.set_defaults(func=run)
     args = parser.parse_args()
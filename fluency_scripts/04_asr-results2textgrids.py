@@ -48,22 +48,22 @@ def obj2interval(obj):
 
     return tgt.core.Interval(start, end, text=txt)
 
-def obj2dfRow(obj):
+"""
+txt_norm: the normalized text of obj
+"""
+def obj2dfRow(obj, txt_norm):
     start = obj['start']
     end = obj['end']
     txt = obj['text']
-    # txt_norm = sclite_norm.normalize_string(txt)
-    txt_norm = sclite_norm.normalize_string(txt, names_as_prompt = False)
 
     return [txt, start, end, txt_norm]
 
-def obj2intervalSegm(obj):
+"""
+txt: the normalized (stripped) text of obj
+"""
+def obj2intervalSegm(obj, txt):
     start = obj['start']
     end = obj['end']
-    txt = obj['text'].strip()
-
-    # txt = sclite_norm.normalize_string(txt)
-    txt = sclite_norm.normalize_string(txt, names_as_prompt = False)
 
     return tgt.core.Interval(start, end, text=txt)
 
@@ -125,7 +125,9 @@ def run(args):
         try:
 
             # Create Segment Tier
-            segments_intervals = [obj2intervalSegm(segment) for segment in segments]
+            # Each different text is normalized once
+            segmentTexts = sclite_norm.normalize_tokens([segment['text'].strip() for segment in segments], names_as_prompt = False)
+            segments_intervals = [obj2intervalSegm(segment, txt) for segment, txt in zip(segments, segmentTexts)]
             segmentsTier = tgt.core.IntervalTier(start_time=0.0, end_time=durLibrosa, name='segments', objects=None)
             segmentsTier.add_intervals(segments_intervals)
 
@@ -143,7 +145,8 @@ def run(args):
             wordsTier.add_intervals(words_intervals)
 
             # Create DataFrame of Words Tier
-            word_items = [obj2dfRow(obj) for obj in words]
+            wordTexts = sclite_norm.normalize_tokens([obj['text'] for obj in words], names_as_prompt = False)
+            word_items = [obj2dfRow(obj, txt_norm) for obj, txt_norm in zip(words, wordTexts)]
             wordItemsList.append(word_items)
 
             # Create words confidence score tier
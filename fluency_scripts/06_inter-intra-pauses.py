@@ -4,6 +4,8 @@ import glob
 import numpy as np
 import argparse
 
+import utils.vad_segments as vadseg
+
 def getDescriptiveStatistics(scores, dur_min):
     scores_dict = pd.Series(scores).describe().to_dict()
     try:
@@ -33,6 +35,18 @@ def getIntraWordPauses(sentenceDF):
     else:
         return []
 
+"""
+Cross-check the pauses between the read words (of at least 0.2s) with the cached VAD segments of the audio file.
+Returns an empty dict if there are no VAD segments for this file.
+"""
+def getVadPauseCrossCheck(audioFile, readDF):
+    vadSegments = vadseg.loadVadSegments(audioFile) if os.path.exists(audioFile) else None
+    if vadSegments is None or len(readDF) == 0:
+        return {}
+
+    pauses = [(end, start) for end, start in zip(list(readDF['end'])[:-1], list(readDF['start'])[1:]) if start - end >= 0.2]
+    return vadseg.vadPauseCrossCheck(pauses, vadSegments, list(readDF['start'])[0], list(readDF['end'])[-1])
+
 def run(args):
 
     print('Start script 06 inter intra pauses')
@@ -77,6 +91,8 @@ def run(args):
             all_pauses = getIntraWordPauses(df[df['end'] > 0])
             # print(len(all_pauses), all_pauses)
             outputAllDict = getDescriptiveStatistics(all_pauses, dur_min)
+            if args.audioDir is not None:
+                outputAllDict.update(getVadPauseCrossCheck(os.path.join(args.audioDir, basename + args.audioExtension), df[df['end'] > 0]))
             allDictList.append(pd.DataFrame.from_dict({basename : outputAllDict}))
 
             ##############################
@@ -177,6 +193,8 @@ def main():
     parser.add_argument("--asrDir", type=str, help = "Path to /04_asr dir.")
     parser.add_argument("--asrSettings", type=str, help = "ASR type")
     parser.add_argument("--outputDir", type=str, help = "outputDir")
+    parser.add_argument("--audioDir", type=str, default = None, help = "Optional: path to audio directory with cached VAD segments (see 00_vad_segments.py). Adds all_vad_* columns to timing_all.tsv.")
+    parser.add_argument("--audioExtension", type=str, default = ".wav", help = "Extension of audio files in audio dir (default: .wav)")
 
     parser.set_defaults(func=run)
     args = parser.parse_args()
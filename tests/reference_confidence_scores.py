@@ -0,0 +1,204 @@
+"""
+addConfidenceScores of asr_prompt_aligners/stories-align-prompt-whispert-confStartEnd.py before the recognized words were
+consumed with a cursor, kept as reference for tests/test_alignment_modern.py. aligner is the loaded aligner script,
+for the helper functions.
+"""
+
+import numpy as np
+import pandas as pd
+
+def addConfidenceScores(aligner, promptAlignDF, recWordsDF):
+
+    promptAlignDF = promptAlignDF.reset_index()
+
+    # convert recWordsDF to array 
+    recWordsList = recWordsDF.values.tolist()
+
+    insertionList = []
+    confStartEndList = []
+    for prid, row in promptAlignDF.iterrows():
+
+        aligned_asrTrans_key = 'aligned_asrTrans'
+        aligned_ref_key = 'aligned_ref'
+
+        # Get original alignments for insertion detection
+        asrTransOrig = row[aligned_asrTrans_key]
+        refOrig = row[aligned_ref_key]
+
+        # Select first aligned_asrTrans and remove *
+        asrTrans = row[aligned_asrTrans_key].replace('*', '')
+
+        # Select corresponding prompt 
+        prompt = row[aligned_ref_key].replace('*', '')
+
+        # Compute nr of words in asrTrans
+        nrWordsAsrTrans = 0 if asrTrans == '' else len(asrTrans.split(' '))
+        # print('asrTrans:', asrTrans.split(' '), nrWordsAsrTrans, ''.split(' '))
+        # print('prompt:', prompt)
+        # print('recWordsList[0][0]', recWordsList[0][0])
+        # print('recWordsList[0][0] == asrTrans', recWordsList[0][0] == asrTrans)
+
+        if nrWordsAsrTrans == 1:
+            # Check if first entry in recWordList is equal to asrTrans or prompt
+            # Yes? Select the first entry and remove it from asrWordInfoDict
+            # No? Probably the prompt word is not read by the child. Treat it as a deleted/skipped word (all zeroes).
+            if(recWordsList[0][0] == asrTrans or recWordsList[0][0] == prompt):
+                # This is a substitution or correctly read word.
+
+                # Extract relevant information
+                prompt_label = recWordsList[0][0]
+                prompt_conf = recWordsList[0][1]
+                prompt_start = recWordsList[0][2]
+                prompt_end = recWordsList[0][3]
+                if asrTrans == prompt:
+                    prompt_miscue = 'cor'
+                else:
+                    prompt_miscue = 'sub'
+                
+                # Update recWordsList
+                recWordsList = recWordsList[1:]
+            else:              
+
+                # This is skipped (deleted) word
+                prompt_label = ''
+                prompt_conf = np.nan
+                prompt_start = np.nan
+                prompt_end = np.nan
+                prompt_miscue = 'del'
+
+
+                firstWords = [x.replace('*', '') for x in list(promptAlignDF[aligned_asrTrans_key])[prid:]]
+                firstFiveNonEmptyWords = [x for x in firstWords if x != ''][:5]
+                if not recWordsList[0][0] in firstFiveNonEmptyWords:
+                    recWordsList = recWordsList[1:]
+                
+                
+        elif nrWordsAsrTrans == 0:
+            # The prompt word is not read by the child. Treat it as a deleted/skipped word (all zeroes).
+            prompt_label = ''
+            prompt_conf = 0
+            prompt_start = 0
+            prompt_end = 0
+            prompt_miscue = 'del'
+
+        elif nrWordsAsrTrans >= 2:
+
+            if(recWordsList[0][0] == asrTrans or recWordsList[0][0] == prompt):
+                # This statement is added to catch words like 's nachts'
+
+                # Extract relevant information
+                prompt_label = recWordsList[0][0]
+                prompt_conf = recWordsList[0][1]
+                prompt_start = recWordsList[0][2]
+                prompt_end = recWordsList[0][3]
+                if asrTrans == prompt:
+                    prompt_miscue = 'cor'
+                else:
+                    prompt_miscue = 'sub'
+                
+                # Update recWordsList
+                recWordsList = recWordsList[1:]
+
+            else:
+
+                space_ins_char_list = aligner.findAllSpaceInsertions(refOrig, asrTransOrig)
+                refWordList, asrTransWordList = aligner.splitRefAndAsrTransOnSpaceIns(space_ins_char_list, refOrig, asrTransOrig)
+
+                if len(refWordList) != len(asrTransWordList):
+                    print('ERROR: unequal lengths: ', refWordList, asrTransWordList)
+
+                correctFound = False
+                subPromptList = []
+                for idx, asrTransWord in enumerate(asrTransWordList):
+                    prompt = refWordList[idx]
+
+                    asrTransWord = asrTransWord.replace('*', '').strip()
+                    prompt = prompt.replace('*', '').strip()
+
+                    # Is asrTransWord the first entry in asrWordInfoDict?
+                    # Yes? Select the first entry and remove it from asrWordInfoDict
+                    # No? The word is probably inserted by the child. Treat it as an insertion.
+                    if(recWordsList[0][0] == asrTransWord and recWordsList[0][0] == prompt):
+                        # Extract relevant information
+                        subprompt_label = recWordsList[0][0]
+                        subprompt_conf = recWordsList[0][1]
+                        subprompt_start = recWordsList[0][2]
+                        subprompt_end = recWordsList[0][3]
+                        subprompt_miscue = 'cor'
+                        
+                        # Update recWordsList
+                        recWordsList = recWordsList[1:]
+
+                        # Set correctFound to True
+                        correctFound = True
+
+                        subPromptList.append([subprompt_label, subprompt_conf, subprompt_start, subprompt_end, subprompt_miscue])
+
+                    elif(recWordsList[0][0] == asrTransWord and recWordsList[0][0] != prompt):
+
+                        if prompt == '':
+                            # insertion
+                            prompt_with_ins = prid
+                            pos_ins_word = idx
+                            ins_label = recWordsList[0][0]
+                            ins_conf = recWordsList[0][1]
+                            ins_start = recWordsList[0][2]
+                            ins_end = recWordsList[0][3]
+                            ins_miscue = 'ins'
+                            cor_already_found = correctFound
+
+                            insertionList.append([prompt_with_ins, pos_ins_word, ins_label, ins_conf, ins_start, ins_end, ins_miscue, cor_already_found])
+
+                            # Update recWordsList
+                            recWordsList = recWordsList[1:]
+
+                        else:
+                            # substitution
+                            # Extract relevant information
+                            subprompt_label = recWordsList[0][0]
+                            subprompt_conf = recWordsList[0][1]
+                            subprompt_start = recWordsList[0][2]
+                            subprompt_end = recWordsList[0][3]
+                            subprompt_miscue = 'sub'
+
+                            subPromptList.append([subprompt_label, subprompt_conf, subprompt_start, subprompt_end, subprompt_miscue])
+                            
+                            # Update recWordsList
+                            recWordsList = recWordsList[1:]
+                    
+                    elif(recWordsList[0][0].find(asrTransWord) != -1 and recWordsList[0][0] != prompt):
+                        # The prompt word is not read by the child. Treat it as a deleted/skipped word (all zeroes).
+                        subprompt_label = ''
+                        subprompt_conf = 0
+                        subprompt_start = 0
+                        subprompt_end = 0
+                        subprompt_miscue = 'del'
+
+                        subPromptList.append([subprompt_label, subprompt_conf, subprompt_start, subprompt_end, subprompt_miscue])
+
+
+                    else:
+                        print('This should not happen, if it does: find out what to do...')
+                        print('recWordsList[0][0]', recWordsList[0][0])
+                        print('asrTransWord:', asrTransWord)
+                        print(recWordsList[0][0] == asrTransWord)
+                        print('prompt:', prompt)
+                        print(recWordsList[0][0] == prompt)
+
+
+                # print(pd.DataFrame(subPromptList))
+                # Extract prompt info from subPromptList
+                prompt_label = " ".join([x[0] for x in subPromptList])
+                prompt_conf = np.mean([float(x[1]) for x in subPromptList]) # 1=subprompt_start
+                prompt_start = subPromptList[0][2] # 2=subprompt_start
+                prompt_end = subPromptList[-1][3] # 3=subprompt_end
+                prompt_miscue = "-".join([x[4] for x in subPromptList]) # 4=reading miscue
+
+        confStartEndList.append([prompt_label, prompt_conf, prompt_start, prompt_end, prompt_miscue])
+
+    confStartEndDF = pd.DataFrame(confStartEndList, index=promptAlignDF.index, columns=['prompt_label', 'prompt_start', 'prompt_end', 'prompt_conf', 'prompt_miscue'])
+    promptAlignDF = pd.concat([promptAlignDF, confStartEndDF], axis=1)
+
+    insertionDF = pd.DataFrame(insertionList, columns = ['prompt_with_ins', 'pos_ins_word', 'ins_label', 'ins_conf', 'ins_start', 'ins_end', 'ins_miscue', 'cor_already_found'] )
+
+    return promptAlignDF, insertionDF
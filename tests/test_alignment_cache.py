@@ -0,0 +1,161 @@
+"""
+The alignment cache of utils/alignment_cache.py must give the same alignments as utils/alignment_modern.py.
+The prompt aligner only uses the cache with --alignCacheDir, and only saves the prompt index with --promptIndexDir.
+Run from the root of the repository: python -m pytest tests
+"""
+
+import filecmp
+import glob
+import json
+import os
+import random
+import shutil
+import tempfile
+import types
+import unittest
+import warnings
+
+import utils.alignment_cache as aligncache
+import utils.alignment_modern as alignmod
+import utils.prompt_index as promptindex
+
+from test_alignment_modern import readPrompt, syntheticReading, nearExactReading, loadAlignerScript
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT_DIR = os.path.join(ROOT, 'example_input_data', '01_prompts')
+TASK = 'AVI1_story1'
+
+class TestAlignmentCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.prompt = readPrompt()
+        words = cls.prompt.split()
+        rng = random.Random(19)
+        cls.readings = [syntheticReading(words, rng) for _ in range(5)] + [nearExactReading(words, rng) for _ in range(5)]
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        self.cache = aligncache.AlignmentCache(self.cacheDir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir)
+
+    def test_round_trip(self):
+        key = self.cache.key(self.prompt, self.readings[0], 'bio')
+        self.assertIsNone(self.cache.get(key))
+
+        characterAlignment = ('de hond', 'de hont')
+        alignment = ('de hond', 'de hont')
+        self.cache.put(key, characterAlignment, alignment)
+        self.assertEqual(self.cache.get(key), (characterAlignment, alignment))
+        self.assertTrue(os.path.exists(os.path.join(self.cacheDir, key[:2], key + '.json')))
+
+    def test_key(self):
+        key = self.cache.key(self.prompt, self.readings[0], 'bio')
+        self.assertEqual(key, self.cache.key(self.prompt, self.readings[0], 'bio'))
+        self.assertNotEqual(key, self.cache.key(self.prompt, self.readings[0], 'tiered'))
+        self.assertNotEqual(key, self.cache.key(self.prompt, self.readings[1], 'bio'))
+
+    def test_corrupt_file(self):
+        key = self.cache.key(self.prompt, self.readings[0], 'bio')
+        os.makedirs(os.path.dirname(self.cache.path(key)))
+        with open(self.cache.path(key), 'w') as f:
+            f.write('{"characterAlignment": ')
+        self.assertIsNone(self.cache.get(key))
+
+    def test_cold_and_warm_cache(self):
+        asrTransList = self.readings + self.readings[:3]
+        expected = aligncache.alignBatchCached(None, self.prompt, asrTransList)
+        self.assertEqual(expected[1], [alignmod.one_way_alignment_modern(self.prompt, asrTrans) for asrTrans in asrTransList])
+
+        self.assertEqual(aligncache.alignBatchCached(self.cache, self.prompt, asrTransList), expected)
+
+        # Warm cache: nothing is aligned again
+        align_characters_batch = alignmod.align_characters_batch
+        def fail(*args):
+            raise AssertionError('aligned again')
+        alignmod.align_characters_batch = fail
+        try:
+            self.assertEqual(aligncache.alignBatchCached(self.cache, self.prompt, asrTransList), expected)
+        finally:
+            alignmod.align_characters_batch = align_characters_batch
+
+class TestAlignerRun(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.aligner = loadAlignerScript()
+        words = readPrompt().split()
+        rng = random.Random(20)
+        cls.readings = [syntheticReading(words, rng) for _ in range(3)] + [nearExactReading(words, rng) for _ in range(2)]
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.asrResultDir = os.path.join(self.tmpDir, 'whispert', 'json-asr-results')
+        os.makedirs(self.asrResultDir)
+        for idx, reading in enumerate(self.readings):
+            words = [{'text': word, 'start': i * 0.5, 'end': i * 0.5 + 0.3, 'confidence': 0.9} for i, word in enumerate(reading.split())]
+            with open(os.path.join(self.asrResultDir, 'spk' + str(idx) + '-' + TASK + '.json'), 'w') as f:
+                json.dump({'text': reading, 'segments': [{'words': words}]}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def runAligner(self, outputDir, alignCacheDir = None, promptIndexDir = None):
+        self.aligner.run(types.SimpleNamespace(output_dir=outputDir, prompt_dir=PROMPT_DIR, input_asr_dir=self.asrResultDir, engine='bio',
+                                               batchSize=64, jobs=1, alignCacheDir=alignCacheDir, promptIndexDir=promptIndexDir))
+
+    def assertSameOutput(self, outputDir, expectedDir):
+        for subDir in ['csv-align-forward', 'csv-align-forward-ins']:
+            names = sorted(os.listdir(os.path.join(expectedDir, subDir)))
+            self.assertEqual(len(names), len(self.readings))
+            self.assertEqual(filecmp.cmpfiles(os.path.join(expectedDir, subDir), os.path.join(outputDir, subDir), names, shallow=False)[0], names)
+        self.assertTrue(filecmp.cmp(os.path.join(expectedDir, 'sentenceStats.csv'), os.path.join(outputDir, 'sentenceStats.csv'), shallow=False))
+
+    def test_cache_is_opt_in(self):
+        expectedDir = os.path.join(self.tmpDir, 'whispert', 'no-cache')
+        self.runAligner(expectedDir)
+        self.assertEqual(sorted(os.listdir(self.tmpDir)), ['whispert'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmpDir, 'whispert'))), ['json-asr-results', 'no-cache'])
+
+        # With --alignCacheDir: the same output, from a cold and from a warm cache
+        alignCacheDir = os.path.join(self.tmpDir, 'alignment-cache')
+        for run in ['cold', 'warm']:
+            outputDir = os.path.join(self.tmpDir, 'whispert', run)
+            self.runAligner(outputDir, alignCacheDir)
+            self.assertSameOutput(outputDir, expectedDir)
+        self.assertGreaterEqual(len(glob.glob(os.path.join(alignCacheDir, '*', '*.json'))), len(self.readings))
+
+    def test_shared_prompt_index(self):
+        expectedDir = os.path.join(self.tmpDir, 'whispert', 'no-index')
+        self.runAligner(expectedDir)
+
+        # The runs of two ASR settings: the index is built in the first run and read in the second
+        promptIndexDir = os.path.join(self.tmpDir, 'prompt-index')
+        indexFile = promptindex.promptIndexPath(promptIndexDir, TASK)
+        for run in ['first', 'second']:
+            outputDir = os.path.join(self.tmpDir, 'whispert', run)
+            self.runAligner(outputDir, promptIndexDir = promptIndexDir)
+            self.assertSameOutput(outputDir, expectedDir)
+            if run == 'first':
+                os.utime(indexFile, ns=(0, 0))
+        self.assertEqual(os.stat(indexFile).st_mtime_ns, 0)
+        self.assertEqual(os.listdir(promptIndexDir), [os.path.basename(indexFile)])
+
+    def test_exit_code_on_errors(self):
+        with open(os.path.join(self.asrResultDir, 'spk9-' + TASK + '.json'), 'w') as f:
+            f.write('{"text": ')
+
+        # The other files are aligned and saved, but the run fails
+        outputDir = os.path.join(self.tmpDir, 'whispert', 'output')
+        with self.assertRaises(SystemExit) as context:
+            self.runAligner(outputDir)
+        self.assertEqual(context.exception.code, 1)
+        self.assertEqual(len(os.listdir(os.path.join(outputDir, 'csv-align-forward'))), len(self.readings))
+        self.assertTrue(os.path.exists(os.path.join(outputDir, 'sentenceStats.csv')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,559 @@
+"""
+The alignment engines of utils/alignment_modern.py must give the same alignments as 'bio'.
+Run from the root of the repository: python -m pytest tests
+"""
+
+import importlib.util
+import os
+import random
+import re
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+from string2string.alignment import NeedlemanWunsch
+
+import utils.alignment_kernel as kernel
+import utils.alignment_modern as alignmod
+
+import reference_confidence_scores
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT_FILE = os.path.join(ROOT, 'example_input_data', '01_prompts', 'AVI1_story1.prompt')
+ALIGNER_SCRIPT = os.path.join(ROOT, 'asr_prompt_aligners', 'stories-align-prompt-whispert-confStartEnd.py')
+
+def readPrompt():
+    with open(PROMPT_FILE, 'r') as f:
+        prompt = f.read().lower()
+    return ' '.join(re.sub(r"[^a-zà-ü' ]", ' ', prompt).split())
+
+"""
+A synthetic reading of the prompt words: a part of the story with skipped, misread, repeated and inserted words,
+and sometimes a hallucinated repetition at the end.
+"""
+def syntheticReading(words, rng):
+    reading = []
+    for word in words[:rng.randint(len(words) // 3, len(words))]:
+        r = rng.random()
+        if r < 0.08:
+            continue
+        if r < 0.16:
+            chars = list(word)
+            chars[rng.randrange(len(chars))] = rng.choice('aeioudtkn')
+            word = ''.join(chars)
+        if r > 0.95:
+            reading.append(rng.choice(words))
+        if r > 0.98:
+            reading += words[max(0, len(reading) - 4):len(reading)]
+        reading.append(word)
+    if rng.random() < 0.2:
+        reading += ['zilver', 'jongen'] * rng.randint(5, 40)
+    return ' '.join(reading)
+
+"""
+A reading of the prompt words with a few misread, inserted or skipped words.
+"""
+def nearExactReading(words, rng):
+    reading = list(words)
+    for _ in range(rng.randint(1, 3)):
+        idx = rng.randrange(len(reading))
+        r = rng.random()
+        if r < 0.4:
+            chars = list(reading[idx])
+            chars[rng.randrange(len(chars))] = rng.choice('aeiokt')
+            reading[idx] = ''.join(chars)
+        elif r < 0.7:
+            reading.insert(idx, rng.choice(words))
+        else:
+            del reading[idx]
+    return ' '.join(reading)
+
+"""
+A reading of the prompt words in which a part of the words is replaced by, or followed by, garbage (random letters or fillers).
+"""
+def garbageReading(words, rng, rate):
+    reading = []
+    for word in words:
+        r = rng.random()
+        if r < rate / 2:
+            reading.append(''.join(rng.choice('aeioudtknrsl') for _ in range(rng.randint(2, 8))))
+            continue
+        reading.append(word)
+        if r < rate:
+            reading.append(rng.choice(['uh', 'eh', 'zilver', 'jongen']))
+    return ' '.join(reading)
+
+class TestAnchoredEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.prompt = readPrompt()
+        cls.words = cls.prompt.split()
+        rng = random.Random(11)
+        cls.readings = [syntheticReading(cls.words, rng) for _ in range(60)] + [nearExactReading(cls.words, rng) for _ in range(60)]
+
+    def test_step1_equals_bio(self):
+        nrSplit = 0
+        for reading in self.readings:
+            aligned = alignmod.align_characters_anchored(self.prompt, reading)
+            if aligned is not None:
+                nrSplit += 1
+                self.assertEqual(tuple(aligned), tuple(alignmod.align_characters_bio(self.prompt, reading)), reading)
+        # The near exact readings are split at the anchors
+        self.assertGreater(nrSplit, 10)
+
+    def test_frames_equal_bio(self):
+        expected = alignmod.two_way_alignment_modern_batch(self.prompt, self.readings, 'bio')
+        result = alignmod.two_way_alignment_modern_batch(self.prompt, self.readings, 'anchored')
+        for reading, expectedDF, resultDF in zip(self.readings, expected, result):
+            pd.testing.assert_frame_equal(resultDF, expectedDF, obj=reading)
+
+    def test_extra_spaces(self):
+        for reading in self.readings[60:70]:
+            reading = reading.replace(' ', '  ', 3)
+            self.assertEqual(alignmod.one_way_alignment_modern(self.prompt, reading, 'anchored'), alignmod.one_way_alignment_modern(self.prompt, reading, 'bio'))
+
+class TestTieredEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.prompt = readPrompt()
+        cls.words = cls.prompt.split()
+
+    def assertEqualToBio(self, reading):
+        self.assertEqual(alignmod.one_way_alignment_modern(self.prompt, reading, 'tiered'), alignmod.one_way_alignment_modern(self.prompt, reading, 'bio'))
+        pd.testing.assert_frame_equal(alignmod.two_way_alignment_modern(self.prompt, reading, 'tiered'), alignmod.two_way_alignment_modern(self.prompt, reading, 'bio'))
+
+    def readingWith(self, idx, words):
+        return ' '.join(self.words[:idx] + words + self.words[idx+1:])
+
+    def test_exact_match(self):
+        self.assertEqualToBio(self.prompt)
+        self.assertEqual(tuple(alignmod.align_characters_batch(self.prompt, [self.prompt], 'tiered')[0][0]), tuple(alignmod.align_characters_bio(self.prompt, self.prompt)))
+
+    def test_single_substitution(self):
+        for idx in range(0, len(self.words), 7):
+            reading = self.readingWith(idx, ['zemel'])
+            self.assertEqualToBio(reading)
+
+    def test_single_insertion(self):
+        for idx in range(0, len(self.words), 7):
+            self.assertEqualToBio(self.readingWith(idx, ['uh', self.words[idx]]))
+            self.assertEqualToBio(self.readingWith(idx, [self.words[idx], self.words[idx]]))
+
+    def test_single_deletion(self):
+        for idx in range(0, len(self.words), 7):
+            self.assertEqualToBio(self.readingWith(idx, []))
+
+    def test_synthetic_readings(self):
+        rng = random.Random(13)
+        readings = [syntheticReading(self.words, rng) for _ in range(30)] + [nearExactReading(self.words, rng) for _ in range(30)]
+        for reading, expectedDF, resultDF in zip(readings, alignmod.two_way_alignment_modern_batch(self.prompt, readings, 'bio'), alignmod.two_way_alignment_modern_batch(self.prompt, readings, 'tiered')):
+            pd.testing.assert_frame_equal(resultDF, expectedDF, obj=reading)
+
+class TestLinearEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.prompt = readPrompt()
+        cls.words = cls.prompt.split()
+        rng = random.Random(12)
+        cls.readings = [syntheticReading(cls.words, rng) for _ in range(15)] + [nearExactReading(cls.words, rng) for _ in range(5)]
+
+    def setUp(self):
+        # Use 'linear' for every alignment, also for the short segments of STEP 3
+        self.linearMinCells = alignmod.LINEAR_MIN_CELLS
+        alignmod.LINEAR_MIN_CELLS = 0
+
+    def tearDown(self):
+        alignmod.LINEAR_MIN_CELLS = self.linearMinCells
+
+    def test_step1_equals_bio(self):
+        for reading in self.readings:
+            self.assertEqual(alignmod.align_characters_linear(self.prompt, reading), tuple(alignmod.align_characters_bio(self.prompt, reading)), reading)
+
+    def test_frames_equal_bio(self):
+        for reading in self.readings:
+            self.assertEqual(alignmod.select_engine(self.prompt, reading, 'bio'), 'linear')
+            pd.testing.assert_frame_equal(alignmod.two_way_alignment_modern(self.prompt, reading, 'linear'), alignmod.two_way_alignment_modern(self.prompt, reading, 'bio'), obj=reading)
+
+    def test_small_blocks(self):
+        # Few characters, so there are many optimal alignments; small blocks, so the traceback is split many times
+        aligner = alignmod.Align.PairwiseAligner(match_score=1.0)
+        scores = (int(aligner.match_score), int(aligner.mismatch_score), int(aligner.gap_score))
+        rng = random.Random(3)
+        for _ in range(500):
+            prompt = ''.join(rng.choice('ab ') for _ in range(rng.randint(1, 30)))
+            asrTrans = ''.join(rng.choice('ab ') for _ in range(rng.randint(1, 30)))
+            prompt_codes, asrTrans_codes = kernel.encode_characters(prompt, asrTrans)
+            pairs = kernel.align_linear(prompt_codes, asrTrans_codes, *scores, kernel.PRIORITY_BIO, max_block_cells=rng.randint(1, 40))
+            align_ref, align_hyp = kernel.pairs_to_items(prompt, asrTrans, pairs)
+            self.assertEqual((''.join(align_ref), ''.join(align_hyp)), tuple(alignmod.align_characters_bio(prompt, asrTrans)), (prompt, asrTrans))
+
+class TestBatchAlignment(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.prompt = readPrompt()
+        cls.words = cls.prompt.split()
+        rng = random.Random(14)
+        cls.readings = [syntheticReading(cls.words, rng) for _ in range(10)] + [nearExactReading(cls.words, rng) for _ in range(10)] + [cls.prompt]
+
+    def test_batch_equals_single(self):
+        for engine in alignmod.ENGINES:
+            result = alignmod.two_way_alignment_modern_batch(self.prompt, self.readings, engine)
+            self.assertEqual(len(result), len(self.readings))
+            for reading, resultDF in zip(self.readings, result):
+                pd.testing.assert_frame_equal(resultDF, alignmod.two_way_alignment_modern(self.prompt, reading, engine), obj=engine + ': ' + reading)
+
+    def test_mixed_engines(self):
+        # The long readings are aligned with 'linear', the others with 'bio', in the same batch
+        linearMinCells = alignmod.LINEAR_MIN_CELLS
+        alignmod.LINEAR_MIN_CELLS = len(self.prompt) * len(self.prompt)
+        try:
+            self.assertIn('linear', [alignmod.select_engine(self.prompt, reading, 'bio') for reading in self.readings])
+            result = alignmod.one_way_alignment_modern_batch(self.prompt, self.readings)
+        finally:
+            alignmod.LINEAR_MIN_CELLS = linearMinCells
+        self.assertEqual(result, [alignmod.one_way_alignment_modern(self.prompt, reading) for reading in self.readings])
+
+class TestPrefixAlignment(unittest.TestCase):
+
+    def test_prefix_equals_new_alignment(self):
+        warnings.filterwarnings('ignore')
+        prompt = readPrompt()
+        words = prompt.split()
+        rng = random.Random(17)
+        readings = [syntheticReading(words, rng) for _ in range(20)]
+
+        nrTruncated = 0
+        for engine in ['bio', 'linear']:
+            alignments, engines = alignmod.align_characters_batch(prompt, readings, engine)
+            for reading, aligned in zip(readings, alignments):
+                for nrWords in [len(reading.split()), len(reading.split()) + 5, len(words) // 2]:
+                    prefix_length = len(' '.join(words[:nrWords]))
+                    result = alignmod.one_way_alignment_modern_prefix(prompt, prefix_length, reading, aligned, engine)
+                    if result is not None:
+                        nrTruncated += 1
+                        self.assertEqual(result, alignmod.one_way_alignment_modern(prompt[:prefix_length], reading, engine), (nrWords, reading))
+        self.assertGreater(nrTruncated, 10)
+
+class TestNeedlemanWunschKernel(unittest.TestCase):
+    """
+    STEP 3 (align_segments) and STEP 4 (align_words) must give the alignments of string2string NeedlemanWunsch,
+    which was used before. The inputs are recorded from the alignments of synthetic readings of the prompt.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.nw = NeedlemanWunsch()
+        prompt = readPrompt()
+        words = prompt.split()
+        rng = random.Random(13)
+        readings = [syntheticReading(words, rng) for _ in range(10)] + [nearExactReading(words, rng) for _ in range(5)]
+
+        cls.segments = []
+        cls.wordPairs = []
+        align_segments, align_words = alignmod.align_segments, alignmod.align_words
+        def recordSegments(ref_segments, hyp_segments, engine = alignmod.DEFAULT_ENGINE):
+            cls.segments += zip(ref_segments, hyp_segments)
+            return align_segments(ref_segments, hyp_segments, engine)
+        def recordWords(ref_words, hyp_words):
+            cls.wordPairs += zip(ref_words, hyp_words)
+            return align_words(ref_words, hyp_words)
+        alignmod.align_segments, alignmod.align_words = recordSegments, recordWords
+        try:
+            for reading in readings:
+                alignmod.two_way_alignment_modern(prompt, reading)
+        finally:
+            alignmod.align_segments, alignmod.align_words = align_segments, align_words
+
+    def assertSegmentsEqualNw(self, segments, engine):
+        aligned = alignmod.align_segments([x[0] for x in segments], [x[1] for x in segments], engine)
+        for (ref, hyp), (align_ref, align_hyp) in zip(segments, aligned):
+            self.assertEqual((' | '.join(align_ref), ' | '.join(align_hyp)), tuple(self.nw.get_alignment(ref, hyp)), (ref, hyp))
+
+    def assertWordsEqualNw(self, wordPairs):
+        align_ref, align_hyp = alignmod.align_words([x[0] for x in wordPairs], [x[1] for x in wordPairs])
+        for (ref, hyp), aligned in zip(wordPairs, zip(align_ref, align_hyp)):
+            expected = self.nw.get_alignment(ref, hyp)
+            self.assertEqual(aligned, (expected[0].replace(' | ', ''), expected[1].replace(' | ', '')), (ref, hyp))
+
+    def test_segments(self):
+        self.assertGreater(len(self.segments), 100)
+        for engine in ['bio', 'linear']:
+            self.assertSegmentsEqualNw(self.segments, engine)
+
+    def test_words(self):
+        self.assertGreater(len(self.wordPairs), 1000)
+        self.assertWordsEqualNw(self.wordPairs)
+
+    def test_ties(self):
+        # Few different items, so many moves have the same score and the priority (diagonal, left, up) decides
+        rng = random.Random(31)
+        segments = [([rng.choice('ab') for _ in range(rng.randint(1, 9))], [rng.choice('ab') for _ in range(rng.randint(1, 9))]) for _ in range(1000)]
+        for engine in ['bio', 'linear']:
+            self.assertSegmentsEqualNw(segments, engine)
+        wordPairs = [(''.join(x[0]), ''.join(x[1])) for x in segments]
+        self.assertWordsEqualNw(wordPairs)
+        self.assertWordsEqualNw([('', 'ab'), ('ab', ''), ('aaaa', 'a'), ('a', 'aaaa'), ('ab', 'ba'), ('abab', 'baba')])
+
+class TestCertifiedCuts(unittest.TestCase):
+
+    def test_random_cuts(self):
+        # Few characters, so there are many optimal alignments
+        rng = random.Random(5)
+        nrSplit = 0
+        for _ in range(3000):
+            prompt = ''.join(rng.choice('ab ') for _ in range(rng.randint(1, 14)))
+            chars = list(prompt)
+            for _ in range(rng.randint(0, 2)):
+                idx = rng.randrange(len(chars))
+                r = rng.random()
+                if r < 0.33:
+                    chars[idx] = rng.choice('ab ')
+                elif r < 0.66:
+                    chars.insert(idx, rng.choice('ab '))
+                elif len(chars) > 1:
+                    del chars[idx]
+            asrTrans = ''.join(chars)
+
+            rows = sorted(rng.sample(range(len(prompt) + 1), min(3, len(prompt) + 1)))
+            columns = sorted(min(len(asrTrans), max(0, i + rng.randint(-1, 1))) for i in rows)
+            cuts = alignmod.certified_cuts(prompt, asrTrans, list(zip(rows, columns)))
+            if len(cuts) > 0:
+                nrSplit += 1
+                self.assertEqual(alignmod.align_characters_split(prompt, asrTrans, cuts), tuple(alignmod.align_characters_bio(prompt, asrTrans)), (prompt, asrTrans, cuts))
+        self.assertGreater(nrSplit, 100)
+
+    def test_cut_off_the_optimal_path(self):
+        # 'aaaa' can be aligned with any of the five a's of the transcription
+        self.assertEqual(alignmod.certified_cuts('aaaa', 'aaaaa', [(2, 2)]), [])
+
+    def test_score_upper_bound(self):
+        self.assertEqual(alignmod.score_upper_bound(3, 5, (1, 0, -1)), 1)
+        self.assertEqual(alignmod.score_upper_bound(4, 4, (1, 0, -1)), 4)
+
+class TestBandedAlignment(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings('ignore')
+        self.linearMinCells = alignmod.LINEAR_MIN_CELLS
+        self.bandMaxFraction = alignmod.BAND_MAX_FRACTION
+
+    def tearDown(self):
+        alignmod.LINEAR_MIN_CELLS = self.linearMinCells
+        alignmod.BAND_MAX_FRACTION = self.bandMaxFraction
+
+    def test_random_bands(self):
+        # Few characters, so there are many optimal alignments; any path gives a lower bound
+        alignmod.BAND_MAX_FRACTION = 1.0
+        rng = random.Random(6)
+        for _ in range(2000):
+            prompt = ''.join(rng.choice('ab ') for _ in range(rng.randint(1, 20)))
+            asrTrans = ''.join(rng.choice('ab ') for _ in range(rng.randint(1, 20)))
+            rows = sorted(rng.sample(range(len(prompt) + 1), min(3, len(prompt) + 1)))
+            columns = sorted(rng.randint(0, len(asrTrans)) for i in rows)
+            aligned = alignmod.align_characters_banded(prompt, asrTrans, list(zip(rows, columns)))
+            self.assertEqual(aligned, tuple(alignmod.align_characters_bio(prompt, asrTrans)), (prompt, asrTrans, rows, columns))
+
+    def test_garbage_readings(self):
+        # Long readings: every reading of the prompt is aligned in a band if the anchors give no cuts
+        alignmod.LINEAR_MIN_CELLS = 0
+        prompt = readPrompt()
+        words = prompt.split()
+        rng = random.Random(21)
+        readings = [garbageReading(words, rng, rate) for rate in [0.05, 0.1, 0.2, 0.4] for _ in range(5)]
+        readings += [syntheticReading(words, rng) for _ in range(20)]
+
+        nrBanded = 0
+        for reading in readings:
+            prompt_words, hyp_words = prompt.split(), reading.split()
+            cells = alignmod.word_run_cells(prompt, reading, prompt_words, hyp_words, alignmod.find_anchors(prompt_words, hyp_words))
+            if len(cells) > 0 and len(alignmod.certified_cuts(prompt, reading, cells)) == 0:
+                aligned = alignmod.align_characters_anchored(prompt, reading)
+                if aligned is not None:
+                    nrBanded += 1
+                    self.assertEqual(aligned, tuple(alignmod.align_characters_bio(prompt, reading)), reading)
+        self.assertGreater(nrBanded, 15)
+
+    def test_band_limits(self):
+        # 3 x 5 characters: a path through the diagonals 0 to 2 scores at most 1, through the next diagonals -2, -5, ...
+        first, last = alignmod.band_limits(3, 5, 1, (1, 0, -1))
+        self.assertEqual((first.tolist(), last.tolist()), ([0, 1, 2, 3], [2, 3, 4, 5]))
+        first, last = alignmod.band_limits(3, 5, -2, (1, 0, -1))
+        self.assertEqual((first.tolist(), last.tolist()), ([0, 0, 1, 2], [3, 4, 5, 5]))
+
+def loadAlignerScript():
+    spec = importlib.util.spec_from_file_location('stories_align_prompt', ALIGNER_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class TestAddConfidenceScores(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.aligner = loadAlignerScript()
+
+    def recWords(self, labels):
+        return pd.DataFrame([[label, 0.9, idx, idx + 0.5] for idx, label in enumerate(labels)], columns=['label', 'confidence', 'start', 'end'])
+
+    def test_equals_reference(self):
+        # The alignments of synthetic readings, with the words of the reading as recognized words
+        prompt = readPrompt()
+        words = prompt.split()
+        rng = random.Random(16)
+        readings = [syntheticReading(words, rng) for _ in range(30)] + [nearExactReading(words, rng) for _ in range(10)]
+
+        nrCompared = 0
+        for engine in ['bio', 'anchored']:
+            for reading, promptAlignDF in zip(readings, alignmod.two_way_alignment_modern_batch(prompt, readings, engine)):
+                recWordsDF = pd.DataFrame([[label, rng.random(), idx, idx + 0.5] for idx, label in enumerate(reading.split())], columns=['label', 'confidence', 'start', 'end'])
+                try:
+                    expected = reference_confidence_scores.addConfidenceScores(self.aligner, promptAlignDF, recWordsDF)
+                except IndexError:
+                    # The reference runs out of recognized words, see test_more_aligned_words_than_recognized_words
+                    continue
+                result = self.aligner.addConfidenceScores(promptAlignDF, recWordsDF)
+                pd.testing.assert_frame_equal(result[0], expected[0], obj=reading)
+                pd.testing.assert_frame_equal(result[1], expected[1], obj=reading)
+                nrCompared += 1
+        self.assertGreater(nrCompared, 60)
+
+    def test_more_aligned_words_than_recognized_words(self):
+        promptAlignDF = pd.DataFrame({'aligned_ref': ['de', 'hond', 'blaft'], 'aligned_asrTrans': ['de', 'hond', 'blaft']})
+        result, insertionDF = self.aligner.addConfidenceScores(promptAlignDF, self.recWords(['de']))
+        self.assertEqual(list(result['prompt_miscue']), ['cor', 'del', 'del'])
+        self.assertTrue(np.isnan(result['prompt_conf'].iloc[2]))
+
+    def test_no_recognized_words_for_multiple_words(self):
+        promptAlignDF = pd.DataFrame({'aligned_ref': ['s nachts'], 'aligned_asrTrans': ['z nachtt']})
+        result, insertionDF = self.aligner.addConfidenceScores(promptAlignDF, self.recWords([]))
+        self.assertEqual(list(result['prompt_miscue']), ['del'])
+
+    def test_all_words_recognized(self):
+        promptAlignDF = pd.DataFrame({'aligned_ref': ['de', 'hond'], 'aligned_asrTrans': ['de', 'hont']})
+        result, insertionDF = self.aligner.addConfidenceScores(promptAlignDF, self.recWords(['de', 'hont']))
+        self.assertEqual(list(result['prompt_miscue']), ['cor', 'sub'])
+        self.assertEqual(list(result['prompt_label']), ['de', 'hont'])
+
+"""
+The loop implementations of the boundary searches before they used array masks, as reference for TestArrayMasks.
+"""
+def referenceSplitAlignmentsInSegments(align_ref, align_hyp):
+    indices = [0] + [i.start() for i in re.finditer(" ", align_ref)] + [len(align_ref)] + [9999]
+    align_ref_list = [align_ref[indices[idx]: indices[idx+1]] for idx, item in enumerate(indices) if item != 9999][:-1]
+    align_hyp_list = [align_hyp[indices[idx]: indices[idx+1]] for idx, item in enumerate(indices) if item != 9999][:-1]
+    align_ref_list = [align_ref_list[0]] + [x[1:] for x in align_ref_list[1:]]
+    align_hyp_list = [align_hyp_list[0]] + [x[1:] for x in align_hyp_list[1:]]
+    return align_ref_list, align_hyp_list
+
+def referenceCommonSpaceSplit(align_ref, align_hyp):
+    index_list = []
+    align_ref = ' ' + align_ref
+    align_hyp = ' ' + align_hyp
+    for idx in range(len(align_ref)):
+        if align_ref[idx] == ' ' and align_hyp[idx] == ' ':
+            index_list.append(idx+1)
+    align_ref_split = [align_ref[i:j].strip() for i,j in zip(index_list, index_list[1:]+[None])]
+    align_hyp_split = [align_hyp[i:j].strip() for i,j in zip(index_list, index_list[1:]+[None])]
+    return align_ref_split, align_hyp_split
+
+def referenceFindAllSpaceInsertions(aligned_ref, aligned_asrTrans):
+    return [char_idx for char_idx in range(len(aligned_ref)) if aligned_ref[char_idx] == '*' and aligned_asrTrans[char_idx] == ' ']
+
+def referenceSplitRefAndAsrTransOnSpaceIns(space_ins_char_list, aligned_ref, aligned_asrTrans):
+    w_hyp_list = []
+    w_ref_list = []
+    word_split_list_begin_idx = [0] + space_ins_char_list
+    for i in range(len(word_split_list_begin_idx)):
+        begin = word_split_list_begin_idx[i]
+        end = word_split_list_begin_idx[i+1] if i != len(word_split_list_begin_idx)-1 else len(aligned_ref)
+        w_ref = aligned_ref[begin: end]
+        w_hyp = aligned_asrTrans[begin: end]
+        if w_hyp[0] == ' ':
+            w_hyp = w_hyp[1:]
+            w_ref = w_ref[1:]
+        w_ref_list.append(w_ref)
+        w_hyp_list.append(w_hyp)
+    return w_ref_list, w_hyp_list
+
+class TestNotReadSentences(unittest.TestCase):
+
+    def test_cached_alignment_is_not_shared(self):
+        warnings.filterwarnings('ignore')
+        aligner = loadAlignerScript()
+        words = readPrompt().split()
+        promptIDs = tuple(str(idx // 10) + '-' + str(idx % 10) + '-' + word for idx, word in enumerate(words[-25:]))
+
+        first = aligner.alignNotReadSentences(' '.join(words[-25:]), promptIDs, 'bio')
+        expected = first.copy()
+        first['sentence_nr'] = 0
+        first.loc[first.index[0], 'prompt_miscue'] = 'changed'
+
+        second = aligner.alignNotReadSentences(' '.join(words[-25:]), promptIDs, 'bio')
+        self.assertEqual(aligner.alignNotReadSentencesCached.cache_info().hits, 1)
+        self.assertIsNot(second, first)
+        pd.testing.assert_frame_equal(second, expected)
+
+class TestArrayMasks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Random aligned strings, also with non-ASCII characters (uint32 codes)
+        rng = random.Random(21)
+        cls.pairs = []
+        for _ in range(3000):
+            alphabet = rng.choice(['ab -*', 'aé -*'])
+            length = rng.randint(0, 20)
+            cls.pairs.append((''.join(rng.choice(alphabet) for _ in range(length)), ''.join(rng.choice(alphabet) for _ in range(length))))
+        cls.aligner = loadAlignerScript()
+
+    def test_char_codes(self):
+        for s in ['', 'de hond', 'één', 'caf\u00e9 \U0001f600']:
+            self.assertEqual([chr(code) for code in alignmod.char_codes(s)], list(s))
+
+    def test_split_alignments_in_segments(self):
+        for align_ref, align_hyp in self.pairs:
+            self.assertEqual(alignmod.split_alignments_in_segments(align_ref, align_hyp), referenceSplitAlignmentsInSegments(align_ref, align_hyp), (align_ref, align_hyp))
+
+    def test_common_spaces(self):
+        for align_ref, align_hyp in self.pairs:
+            starts, ends = alignmod.segment_bounds(alignmod.aligned_char_offsets(align_ref, align_hyp, ' ', ' '), len(align_ref))
+            result = [align_ref[i:j].strip() for i, j in zip(starts, ends)], [align_hyp[i:j].strip() for i, j in zip(starts, ends)]
+            self.assertEqual(result, referenceCommonSpaceSplit(align_ref, align_hyp), (align_ref, align_hyp))
+
+    def test_space_insertions(self):
+        nrCompared = 0
+        for align_ref, align_hyp in self.pairs:
+            offsets = self.aligner.findAllSpaceInsertions(align_ref, align_hyp)
+            self.assertEqual(offsets, referenceFindAllSpaceInsertions(align_ref, align_hyp))
+            try:
+                expected = referenceSplitRefAndAsrTransOnSpaceIns(offsets, align_ref, align_hyp)
+            except IndexError:
+                # The reference fails on an empty part
+                continue
+            self.assertEqual(self.aligner.splitRefAndAsrTransOnSpaceIns(offsets, align_ref, align_hyp), expected, (align_ref, align_hyp))
+            nrCompared += 1
+        self.assertGreater(nrCompared, 1000)
+
+    def test_truncate_alignment(self):
+        for align_ref, align_hyp in self.pairs:
+            ref_columns = [idx for idx, char in enumerate(align_ref) if char != '-']
+            for prefix_length in range(len(ref_columns) + 1):
+                expected = (align_ref, align_hyp)
+                if prefix_length < len(ref_columns):
+                    column = ref_columns[prefix_length]
+                    expected = None if align_hyp[column:].strip('-') != '' else (align_ref[:column], align_hyp[:column])
+                self.assertEqual(alignmod.truncate_alignment(align_ref, align_hyp, prefix_length), expected)
+
+if __name__ == '__main__':
+    unittest.main()
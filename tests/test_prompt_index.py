@@ -0,0 +1,90 @@
+"""
+The prompt index of utils/prompt_index.py must give the same prompt information after saving and loading.
+Run from the root of the repository: python -m pytest tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import utils.prompt_index as promptindex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT_DIR = os.path.join(ROOT, 'example_input_data', '01_prompts')
+TASK = 'AVI1_story1'
+
+class TestPromptIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.promptDir = os.path.join(self.tmpDir, 'prompts')
+        os.makedirs(self.promptDir)
+        for path in promptindex.promptFiles(PROMPT_DIR, TASK):
+            shutil.copy2(path, self.promptDir)
+        self.indexDir = os.path.join(self.tmpDir, 'prompt-index')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def assertIndexEqual(self, index, expected):
+        self.assertEqual(index.keys(), expected.keys())
+        for key, value in expected.items():
+            if isinstance(value, np.ndarray):
+                np.testing.assert_array_equal(index[key], value, err_msg=key)
+            else:
+                self.assertEqual(index[key], value, key)
+
+    def test_round_trip(self):
+        expected = promptindex.buildPromptIndex(self.promptDir, TASK)
+        self.assertIsNone(promptindex.loadPromptIndex(self.promptDir, TASK, self.indexDir))
+
+        self.assertIndexEqual(promptindex.getPromptIndex(self.promptDir, TASK, self.indexDir), expected)
+        self.assertTrue(os.path.exists(promptindex.promptIndexPath(self.indexDir, TASK)))
+        self.assertIndexEqual(promptindex.loadPromptIndex(self.promptDir, TASK, self.indexDir), expected)
+
+    def test_prompt_dir_is_only_read(self):
+        promptFileNames = sorted(os.listdir(self.promptDir))
+        promptindex.getPromptIndex(self.promptDir, TASK, self.indexDir)
+        self.assertEqual(sorted(os.listdir(self.promptDir)), promptFileNames)
+
+        # Without indexDir nothing is saved
+        shutil.rmtree(self.indexDir)
+        promptindex.getPromptIndex(self.promptDir, TASK)
+        self.assertFalse(os.path.exists(self.indexDir))
+        self.assertEqual(sorted(os.listdir(self.promptDir)), promptFileNames)
+
+    def test_prompt_words(self):
+        index = promptindex.getPromptIndex(self.promptDir, TASK, self.indexDir)
+        self.assertEqual(len(index['words']), len(index['promptIDs']))
+        self.assertEqual([index['prompt'][start:end] for start, end in zip(index['charStarts'], index['charEnds'])], index['words'])
+
+    def test_changed_prompt(self):
+        promptindex.getPromptIndex(self.promptDir, TASK, self.indexDir)
+        promptFile, _ = promptindex.promptFiles(self.promptDir, TASK)
+
+        # Same content, new modification time: the index file is still used
+        os.utime(promptFile, ns=(0, 0))
+        self.assertIsNotNone(promptindex.loadPromptIndex(self.promptDir, TASK, self.indexDir))
+
+        # New content: the index file is out-of-date
+        with open(promptFile, 'a') as f:
+            f.write(' Einde.')
+        self.assertIsNone(promptindex.loadPromptIndex(self.promptDir, TASK, self.indexDir))
+        self.assertEqual(promptindex.getPromptIndex(self.promptDir, TASK, self.indexDir)['words'][-1], 'einde')
+
+    def test_other_prompt_dir(self):
+        promptindex.getPromptIndex(self.promptDir, TASK, self.indexDir)
+
+        # A prompt dir with another prompt of the same task does not use the index file
+        otherPromptDir = os.path.join(self.tmpDir, 'other-prompts')
+        shutil.copytree(self.promptDir, otherPromptDir)
+        promptFile, _ = promptindex.promptFiles(otherPromptDir, TASK)
+        with open(promptFile, 'a') as f:
+            f.write(' Einde.')
+        self.assertIsNone(promptindex.loadPromptIndex(otherPromptDir, TASK, self.indexDir))
+
+if __name__ == '__main__':
+    unittest.main()
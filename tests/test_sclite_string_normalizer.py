@@ -0,0 +1,108 @@
+"""
+The normalizer of utils/sclite_string_normalizer.py must give the same strings as the previous normalize_string.
+Run from the root of the repository: python -m pytest tests
+"""
+
+import itertools
+import os
+import random
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import utils.sclite_string_normalizer as sclite_norm
+
+import reference_sclite_string_normalizer as reference_norm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT_FILE = os.path.join(ROOT, 'example_input_data', '01_prompts', 'AVI1_story1.prompt')
+
+WORDS = ['Cas', 'sophie', 'Lukas', 'yo-yo', "yo-yo's", 'yoyos', 'hardstikke', 'bison', "z'n", 'mn', "m'n", "s'nachts", "'t",
+         'ssst', 'wow', 'van-vandaag', '50', '1', '3.5', '1e', '2de', 'inf', 'nan', 'NaN', 'één', 'België', 'Belgiî', 'café',
+         'ik*u', 'hier*a', '*x', 'hallo!', '"ja"', '‘nee’', '`zo`', '(haakjes)', 'a,b', 'jongen.', 'wat?', 'ja-nee', '', '-', "'"]
+
+"""
+A corpus of the sentences of the fixture prompt and random sentences with names, spelling variants, numbers, accents,
+annotations and punctuation.
+"""
+def corpus():
+    with open(PROMPT_FILE, 'r') as f:
+        sentences = [line.strip() for line in f.read().replace('.', '.\n').split('\n') if line.strip() != '']
+
+    rng = random.Random(22)
+    for _ in range(150):
+        sentences.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 8))))
+    return sentences
+
+class TestStringNormalizer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        cls.sentences = corpus()
+
+    def test_all_options(self):
+        for options in itertools.product([True, False], repeat=9):
+            normalizer = sclite_norm.get_normalizer(*options)
+            for sentence in self.sentences:
+                expected = reference_norm.normalize_string(sentence, *options)
+                self.assertEqual(sclite_norm.normalize_string(sentence, *options), expected, (sentence, options))
+                self.assertEqual(normalizer.normalize(sentence), expected, (sentence, options))
+
+    def test_get_normalizer(self):
+        self.assertIs(sclite_norm.get_normalizer(), sclite_norm.get_normalizer())
+        self.assertIsNot(sclite_norm.get_normalizer(annTags=True), sclite_norm.get_normalizer())
+
+    def test_punctuation(self):
+        for sentence in self.sentences:
+            self.assertEqual(sclite_norm.removeAllPunctuation(sentence), reference_norm.removeAllPunctuation(sentence))
+            self.assertEqual(sclite_norm.normalizeApostrophe(sentence), reference_norm.normalizeApostrophe(sentence))
+
+class TestNormalizeTokens(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.filterwarnings('ignore')
+        # Tokens with many repetitions, as the word labels of ASR results
+        rng = random.Random(23)
+        cls.tokens = [rng.choice(WORDS) for _ in range(2000)] + corpus()[:5]
+        cls.optionSets = [{}, {'names_as_prompt': False}, {'annTags': True, 'accents': False}, {'all_punct': False, 'basic_punct': True, 'number_to_letter': False}]
+
+    def expected(self, options):
+        return [reference_norm.normalize_string(token, **options) for token in self.tokens]
+
+    def test_list(self):
+        for options in self.optionSets:
+            self.assertEqual(sclite_norm.normalize_tokens(self.tokens, **options), self.expected(options), options)
+
+    def test_array(self):
+        for options in self.optionSets:
+            result = sclite_norm.normalize_tokens(np.array(self.tokens, dtype=object), **options)
+            self.assertIsInstance(result, np.ndarray)
+            self.assertEqual(result.tolist(), self.expected(options), options)
+
+    def test_series(self):
+        tokens = pd.Series(self.tokens, index=range(10, 10 + len(self.tokens)), name='label')
+        result = sclite_norm.normalize_tokens(tokens, names_as_prompt = False)
+        self.assertEqual(result.name, 'label')
+        self.assertTrue(result.index.equals(tokens.index))
+        self.assertEqual(result.tolist(), self.expected({'names_as_prompt': False}))
+
+    def test_missing_values(self):
+        result = sclite_norm.normalize_tokens(['Cas', None, 'Cas', np.nan])
+        self.assertEqual(result[0], 'kas')
+        self.assertEqual(result[2], 'kas')
+        self.assertTrue(pd.isna(result[1]) and pd.isna(result[3]))
+
+        result = sclite_norm.normalize_tokens(pd.Series(['Cas', None, np.nan]))
+        self.assertEqual(result.iloc[0], 'kas')
+        self.assertTrue(result.iloc[1:].isna().all())
+
+    def test_empty(self):
+        self.assertEqual(sclite_norm.normalize_tokens([]), [])
+        self.assertEqual(len(sclite_norm.normalize_tokens(pd.Series([], dtype=object))), 0)
+
+if __name__ == '__main__':
+    unittest.main()
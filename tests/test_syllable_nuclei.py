@@ -0,0 +1,214 @@
+"""
+01_de_jong_syllable_nuclei_v3.py must give the same measures serially and in parallel, without writing to the audio directory,
+and the same measures with the native engine (utils/syllable_nuclei_native.py) as with the Praat script.
+The audio is synthetic: a harmonic tone with syllable-like amplitude modulation and pauses.
+Run from the root of the repository: python -m pytest tests
+"""
+
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+import numpy as np
+import pandas as pd
+import parselmouth
+from parselmouth.praat import call
+
+import utils.syllable_nuclei as syllnuc
+import utils.syllable_nuclei_native as sylnat
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYLLABLE_NUCLEI_SCRIPT = os.path.join(ROOT, 'fluency_scripts', '01_de_jong_syllable_nuclei_v3.py')
+SAMPLE_RATE = 16000
+
+"""
+Speech-like sound of seconds long: a harmonic tone (f0 around 120 Hz) with about 4 syllables per second, pauses, and some noise.
+"""
+def syntheticSpeech(seconds, seed):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 120 + 20 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    tone = sum(np.sin(k * phase) / k for k in range(1, 15))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 2 * (np.sin(2 * np.pi * 0.3 * t + seed) > -0.5)
+    return parselmouth.Sound(0.3 * tone * envelope / np.max(np.abs(tone)) + 0.001 * rng.standard_normal(len(t)), SAMPLE_RATE)
+
+def loadScript(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # In sys.modules, so the worker processes can find the functions of the script
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+class TestSyllableNucleiScript(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.script = loadScript(SYLLABLE_NUCLEI_SCRIPT, 'de_jong_syllable_nuclei')
+        cls.cwd = os.getcwd()
+        # The Praat script is found relative to the root of the repository
+        os.chdir(ROOT)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.audioDir = os.path.join(self.tmpDir, 'audio')
+        self.fluencyDir = os.path.join(self.tmpDir, 'fluency')
+        os.makedirs(self.audioDir)
+        self.audioFiles = []
+        for idx, seconds in enumerate([6, 9, 4]):
+            audioFile = 'spk0' + str(idx) + '-AVI1_story1-1.wav'
+            syntheticSpeech(seconds, idx).save(os.path.join(self.audioDir, audioFile), 'WAV')
+            self.audioFiles.append(audioFile)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def runJobs(self, nJobs, engine = 'praat'):
+        textGridDir = os.path.join(self.fluencyDir, 'de_jong_textgrids')
+        os.makedirs(textGridDir, exist_ok=True)
+        jobs = [(self.audioDir, audioFile, textGridDir, engine) for audioFile in sorted(os.listdir(self.audioDir))]
+        return {result[0]: result[1:] for result in self.script.runJobs(jobs, nJobs)}
+
+    def test_parallel_equals_serial(self):
+        serial = self.runJobs(1)
+        self.assertEqual(sorted(serial), self.audioFiles)
+        for audioFile, (header, measures, error) in serial.items():
+            self.assertIsNone(error)
+            self.assertEqual(header[0], 'name')
+            self.assertEqual(measures[0], audioFile[:-len('.wav')])
+            self.assertGreater(int(measures[1]), 0)
+
+        self.assertEqual(self.runJobs(2), serial)
+
+    def test_output_files(self):
+        self.runJobs(2)
+        # Only the TextGrids in the output directory, no scratch directories; the audio directory is not written to
+        self.assertEqual(sorted(os.listdir(os.path.join(self.fluencyDir, 'de_jong_textgrids'))), [x.replace('.wav', '.auto.TextGrid') for x in self.audioFiles])
+        self.assertEqual(sorted(os.listdir(self.audioDir)), self.audioFiles)
+
+    def test_broken_file(self):
+        with open(os.path.join(self.audioDir, 'spk09-AVI1_story1-1.wav'), 'w') as f:
+            f.write('no audio')
+        results = self.runJobs(2)
+        self.assertIsNotNone(results['spk09-AVI1_story1-1.wav'][2])
+        for audioFile in self.audioFiles:
+            self.assertIsNone(results[audioFile][2])
+
+    def test_output_tsv(self):
+        outputTsv = os.path.join(self.tmpDir, 'syllable_nuclei.tsv')
+        args = types.SimpleNamespace(audioDir=self.audioDir, audioExtension='.wav', fluencyDir=self.fluencyDir, jobs=2, outputTsv=outputTsv, engine='praat', compareTsv=None)
+        self.script.run(args)
+
+        df = pd.read_csv(outputTsv, sep='\t', index_col='audioID')
+        self.assertEqual(list(df.index), ['spk00-AVI1_story1', 'spk01-AVI1_story1', 'spk02-AVI1_story1'])
+        results = self.runJobs(1)
+        self.assertEqual([str(x) for x in df['nsyll']], [results[audioFile][1][1] for audioFile in self.audioFiles])
+
+    def test_native_equals_praat(self):
+        # --engine native --compareTsv with the --outputTsv of --engine praat: all measures are equal
+        outputTsvs = {}
+        for engine in ['praat', 'native']:
+            outputTsvs[engine] = os.path.join(self.tmpDir, 'syllable_nuclei_' + engine + '.tsv')
+            self.script.run(types.SimpleNamespace(audioDir=self.audioDir, audioExtension='.wav', fluencyDir=self.fluencyDir, jobs=1, outputTsv=outputTsvs[engine],
+                                                  engine=engine, compareTsv=outputTsvs['praat'] if engine == 'native' else None))
+
+        dfs = {engine: pd.read_csv(outputTsv, sep='\t', index_col='audioID') for engine, outputTsv in outputTsvs.items()}
+        comparison = syllnuc.compareSyllableNucleiFrames(dfs['native'], dfs['praat'])
+        self.assertEqual(list(comparison['n']), [len(self.audioFiles)] * len(comparison))
+        self.assertEqual(list(comparison['equal']), [1.0] * len(comparison))
+
+class TestIntensityPeaks(unittest.TestCase):
+
+    def test_equals_intensity_tier_peaks(self):
+        for seed in range(6):
+            intensity = call(syntheticSpeech(3 + 2 * seed, seed), "To Intensity", 50, 0, "yes")
+            tier = call(intensity, "To IntensityTier (peaks)")
+            nrPoints = call(tier, "Get number of points")
+            times, dbs = sylnat.intensityPeaks(intensity)
+            np.testing.assert_allclose(times, [call(tier, "Get time from index", point) for point in range(1, nrPoints + 1)], rtol=0, atol=1e-12)
+            np.testing.assert_allclose(dbs, [call(tier, "Get value at index", point) for point in range(1, nrPoints + 1)], rtol=0, atol=1e-12)
+
+class TestPraatQueries(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sound = syntheticSpeech(6, 1)
+        cls.pitch = call(cls.sound, "To Pitch (ac)", 0.02, 30, 4, "no", 0.03, 0.25, 0.01, 0.35, 0.25, 375)
+        cls.formant = call(cls.sound, "To Formant (burg)", 0, 4, 4200, 0.025, 50)
+
+        # Time ranges: random, within one frame, at the edges of the sound and the whole sound (tmin >= tmax)
+        rng = np.random.default_rng(0)
+        starts = rng.uniform(0, 5.8, 100)
+        cls.ranges = [(start, start + duration) for start, duration in zip(starts, rng.uniform(0.001, 0.5, 100))]
+        cls.ranges += [(1.0001, 1.0002), (0, 0.04), (5.97, 6), (2, 2)]
+
+    def assertSameValues(self, values, expected):
+        np.testing.assert_allclose(values, expected, rtol=0, atol=1e-9)
+        self.assertEqual(list(np.isnan(values)), list(np.isnan(expected)))
+
+    def test_pitch(self):
+        hertz = self.pitch.selected_array['frequency']
+        hertz = np.where((hertz > 0) & (hertz < self.pitch.ceiling), hertz, np.nan)
+        semitones100 = sylnat.hertzToSemitones(hertz, 100.0)
+        semitones = sylnat.hertzToSemitones(hertz, 1.0)
+        for quantile in [0.05, 0.5, 0.95]:
+            self.assertSameValues([sylnat.sampledQuantile(semitones100, self.pitch, tmin, tmax, quantile) for tmin, tmax in self.ranges],
+                                  [call(self.pitch, "Get quantile", tmin, tmax, quantile, "semitones re 100 Hz") for tmin, tmax in self.ranges])
+        self.assertSameValues([sylnat.sampledStandardDeviation(semitones, self.pitch, tmin, tmax) for tmin, tmax in self.ranges],
+                              [call(self.pitch, "Get standard deviation", tmin, tmax, "semitones") for tmin, tmax in self.ranges])
+
+    def test_formant(self):
+        for n in [1, 2, 3]:
+            hertz = call(self.formant, "To Matrix", n).values[0]
+            barks = sylnat.hertzToBark(np.where(hertz > 0, hertz, np.nan))
+            self.assertSameValues([sylnat.sampledQuantile(barks, self.formant, tmin, tmax, 0.5) for tmin, tmax in self.ranges],
+                                  [call(self.formant, "Get quantile", n, tmin, tmax, "bark", 0.5) for tmin, tmax in self.ranges])
+            self.assertSameValues([sylnat.formantStandardDeviation(barks, self.formant, tmin, tmax) for tmin, tmax in self.ranges],
+                                  [call(self.formant, "Get standard deviation", n, tmin, tmax, "bark") for tmin, tmax in self.ranges])
+
+            # The frame times, as in FilledPauses.praat, and times between the frames and outside the sound
+            times = np.r_[self.formant.x1 + np.arange(self.formant.nx + 1) * self.formant.dx, np.linspace(-0.01, 6.01, 301)]
+            self.assertSameValues(sylnat.valuesAtTimes(barks, self.formant, times),
+                                  [call(self.formant, "Get value at time", n, t, "bark", "Linear") for t in times])
+
+class TestParseSyllableNucleiOutput(unittest.TestCase):
+
+    def test_parse(self):
+        output = '\n'.join(['/audio/*spk01-AVI1_story1-1.wav', 'name, nsyll, npause, dur(s)', 'spk01-AVI1_story1-1, 312, --undefined--, 140.21', ''])
+        header, measures = syllnuc.parseSyllableNucleiOutput(output)
+        self.assertEqual(header, ['name', 'nsyll', 'npause', 'dur(s)'])
+        self.assertEqual(measures, ['spk01-AVI1_story1-1', '312', '--undefined--', '140.21'])
+
+        df = syllnuc.syllableNucleiFrame(header, [measures])
+        self.assertEqual(list(df.index), ['spk01-AVI1_story1'])
+        self.assertTrue(np.isnan(df['npause'].iloc[0]))
+
+    def test_filled_pauses_warning(self):
+        output = 'name, nsyll, npause, dur(s), nrFP, tFP(s)\nspk01-AVI1_story1-1, 312, 41, 140.21Warning: replaced 5/200 F0 values by mean (3.125) in spk01-AVI1_story1-1.\n, 3, 1.274\n'
+        header, measures = syllnuc.parseSyllableNucleiOutput(output)
+        self.assertEqual(measures, ['spk01-AVI1_story1-1', '312', '41', '140.21', '3', '1.274'])
+
+    def test_compare_frames(self):
+        header = ['name', 'nsyll', 'npause']
+        df = syllnuc.syllableNucleiFrame(header, [['spk01-AVI1_story1-1', '10', '2'], ['spk02-AVI1_story1-1', '12', '--undefined--']])
+        referenceDF = syllnuc.syllableNucleiFrame(header, [['spk01-AVI1_story1-1', '10', '3'], ['spk02-AVI1_story1-1', '14', '--undefined--'], ['spk03-AVI1_story1-1', '1', '1']])
+        comparison = syllnuc.compareSyllableNucleiFrames(df, referenceDF)
+        self.assertEqual(list(comparison['n']), [2, 2])
+        self.assertEqual(list(comparison['equal']), [0.5, 0.5])
+        self.assertEqual(comparison.loc['nsyll', 'maxAbsDiff'], 2)
+
+    def test_no_measures(self):
+        self.assertIsNone(syllnuc.parseSyllableNucleiOutput(''))
+        self.assertIsNone(syllnuc.parseSyllableNucleiOutput('Error\nsomething went wrong'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+Tests of utils/whisper_decoding.py with a small, randomly initialized Whisper model, so no model has to be downloaded.
+The model is saved as a checkpoint file, which whisper.load_model accepts as model name.
+Run from the root of the repository: python -m pytest tests
+"""
+
+import dataclasses
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from whisper.model import ModelDimensions, Whisper
+
+from utils.asr_backends import getBackend
+import utils.vad_segments as vadseg
+import utils.whisper_decoding as whisperdec
+
+SAMPLE_RATE = 16000
+
+"""
+Small Whisper model with random weights and the multilingual tokenizer.
+"""
+def randomModel(seed, layers = 2, state = 64):
+    torch.manual_seed(seed)
+    dims = ModelDimensions(n_mels=80, n_audio_ctx=1500, n_audio_state=state, n_audio_head=4, n_audio_layer=layers,
+                           n_vocab=51865, n_text_ctx=448, n_text_state=state, n_text_head=4, n_text_layer=layers)
+    model = Whisper(dims).eval()
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.normal_(0, 0.5)
+    return model
+
+def saveModel(model, path):
+    torch.save({'dims': dataclasses.asdict(model.dims), 'model_state_dict': model.state_dict()}, path)
+    return path
+
+"""
+A 220 Hz tone that is switched on and off at random.
+"""
+def syntheticAudio(seconds, seed):
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    return (0.1 * np.sin(np.arange(n) * 2 * np.pi * 220 / SAMPLE_RATE) * (rng.random(n) > 0.3)).astype(np.float32)
+
+"""
+Bursts of a modulated tone, separated by pauses of more than one second.
+"""
+def syntheticBursts(bursts, seed):
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i in range(bursts):
+        t = np.arange(int(rng.uniform(1, 2.5) * SAMPLE_RATE)) / SAMPLE_RATE
+        parts.append(0.3 * np.sin(2 * np.pi * 180 * t) * (np.sin(2 * np.pi * 4 * t) > 0))
+        parts.append(0.001 * rng.standard_normal(int(rng.uniform(1.2, 2.5) * SAMPLE_RATE)))
+    return np.concatenate(parts).astype(np.float32)
+
+class TestRunJobsInPool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.modelFile = saveModel(randomModel(0), os.path.join(self.tmpDir, 'random.pt'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_errors_of_workers_are_returned(self):
+        # The workers are started with spawn, so they load the model and run the jobs in a fresh interpreter
+        jobs = []
+        for i in range(2):
+            audioFile = os.path.join(self.tmpDir, 'story' + str(i) + '.wav')
+            with open(audioFile, 'wb') as f:
+                f.write(b'not audio' * (i + 1))
+            jobs.append({'audioFile': audioFile, 'asrSettings': 'whispert', 'prompt': 'een verhaal', 'outputFile': audioFile.replace('.wav', '.json')})
+
+        errors = whisperdec.runJobsInPool(jobs, 2, 1, self.modelFile)
+
+        self.assertEqual(sorted(audioFile for audioFile, error in errors), sorted(job['audioFile'] for job in jobs))
+        self.assertTrue(all(error for audioFile, error in errors))
+        self.assertFalse(any(os.path.exists(job['outputFile']) for job in jobs))
+
+    def test_existing_output_is_skipped(self):
+        audioFile = os.path.join(self.tmpDir, 'story.wav')
+        outputFile = os.path.join(self.tmpDir, 'story.json')
+        for path in [audioFile, outputFile]:
+            with open(path, 'w') as f:
+                f.write('{}')
+
+        errors = whisperdec.runJobsInPool([{'audioFile': audioFile, 'asrSettings': 'whispert', 'prompt': '', 'outputFile': outputFile}], 2, 1, self.modelFile)
+
+        self.assertEqual(errors, [])
+
+class TestCachedVadSegments(unittest.TestCase):
+
+    # silero is downloaded from GitHub by whisper_timestamped, auditok is installed with it
+    METHOD = 'auditok'
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.vadMethod = vadseg.VAD_METHOD
+        vadseg.VAD_METHOD = self.METHOD
+        self.model = randomModel(0)
+
+    def tearDown(self):
+        vadseg.VAD_METHOD = self.vadMethod
+        shutil.rmtree(self.tmpDir)
+
+    def test_json_equals_vad_true(self):
+        audio = syntheticBursts(4, 0)
+
+        # The .vad.npz file belongs to an audio file; whisper.load_audio needs ffmpeg, so the audio array is decoded directly
+        audioFile = os.path.join(self.tmpDir, 'story.wav')
+        with open(audioFile, 'wb') as f:
+            f.write(audio.tobytes())
+        starts, ends = vadseg.computeVadSegments(audio, self.METHOD)
+        vadseg.saveVadSegments(audioFile, starts, ends, self.METHOD)
+        vadSegments = vadseg.loadVadSegments(audioFile, self.METHOD)
+        self.assertGreater(len(vadSegments), 1)
+
+        jsonFiles = []
+        for name, segments in [('computed', None), ('cached', vadSegments)]:
+            jsonFiles.append(os.path.join(self.tmpDir, name + '.json'))
+            whisperdec.writeAsrResult(whisperdec.decodeAudio(self.model, audio, 'whispert_vad_dis', '', segments), jsonFiles[-1])
+
+        with open(jsonFiles[0]) as f, open(jsonFiles[1]) as g:
+            self.assertEqual(f.read(), g.read())
+
+"""
+Word table of a result: text, start, end and confidence of each word.
+"""
+def wordTable(result):
+    return [(word['text'], word['start'], word['end'], word['confidence']) for segment in result['segments'] for word in segment.get('words', [])]
+
+class TestSpeculativeBackend(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpDir = tempfile.mkdtemp()
+        cls.modelFile = saveModel(randomModel(0), os.path.join(cls.tmpDir, 'random.pt'))
+        cls.audio = syntheticAudio(8, 0)
+        cls.reference = whisperdec.loadModel(cls.modelFile, 'fp32')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpDir)
+
+    def test_only_fp32_is_identical(self):
+        self.assertTrue(getBackend('fp32').identical)
+        self.assertFalse(getBackend('speculative').identical)
+
+    def test_words_of_fp32(self):
+        reference = whisperdec.decodeAudio(self.reference, self.audio, 'whispert_dis', '')
+
+        # A draft that is always accepted (the same model) and a draft that is never accepted
+        drafts = [self.modelFile, saveModel(randomModel(2, layers = 1, state = 32), os.path.join(self.tmpDir, 'draft.pt'))]
+        for draftFile, accepted in zip(drafts, [True, False]):
+            model = whisperdec.loadModel(self.modelFile, 'speculative', {'draftModel': draftFile})
+            result = whisperdec.decodeAudio(model, self.audio, 'whispert_dis', '')
+
+            # Accepted draft tokens save forward passes of the large model
+            stats = model.decodingStatsLog[-1]
+            self.assertEqual(stats['accepted'] > 0, accepted)
+            self.assertEqual(stats['targetPasses'] < stats['tokens'], accepted)
+
+            self.assertEqual(result['text'], reference['text'])
+            self.assertEqual(wordTable(result), wordTable(reference))
+
+if __name__ == '__main__':
+    unittest.main()
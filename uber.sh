@@ -13,6 +13,11 @@ spkTaskSep=-
 asrDir=$datasetDir/04_asr
 autoFeatDir=$datasetDir/05_automatic_fluency_features
 manualFeatDir=$datasetDir/06_manual_fluency_features
+nJobs=$(nproc)
+# Alignment cache, shared by the aligner runs of all ASR settings and the orthographic transcriptions
+alignCacheDir=$asrDir/alignment-cache
+# Prompt index of each task (see utils/prompt_index.py), shared by the same aligner runs
+promptIndexDir=$asrDir/prompt-index
 
 
 ################################
@@ -39,17 +44,21 @@ if ! test -d $manualFeatDir; then
 fi
 
 
+# Compute the VAD segments of each audio file once (<audio>.vad.npz), used by the decoder and by scripts 03 and 06
+python3 ./fluency_scripts/00_vad_segments.py --audioDir $audioDir --audioExtension $audioExtension
+
 ######################################################################
 ####   FLUENCY STEP 1: Compute features directly from audio (a)   ####
 ######################################################################
 
-### Praat script de Jong et al.: One script to run the Praat script, one to convert the feature txt file to a csv file.
+### Praat script de Jong et al.: the script runs the Praat script on each audio file (in parallel) and saves the features as tsv file.
+### The txt file has the Praat output, which can also be converted with ./fluency_scripts/01_de_jong_syllable_nuclei_postprocess.py
+### --engine native (in-process Python version) is experimental: it is only validated on synthetic audio, so the Praat script is used here.
 
 current_datetime=$(date +"%Y-%m-%d_%H:%M:%S.%3N")
 echo "Current date and time: $current_datetime"
 output_txt=$autoFeatDir/de_jong_syll_nucl_$current_datetime.txt
-python3 ./fluency_scripts/01_de_jong_syllable_nuclei_v3.py --audioDir $audioDir --audioExtension '.wav' --fluencyDir $autoFeatDir > $output_txt
-python3 ./fluency_scripts/01_de_jong_syllable_nuclei_postprocess.py --fluencyFeatureTxt $output_txt --fluencyFeatureTsv $autoFeatDir/de_jong_syll_nucl.tsv
+python3 ./fluency_scripts/01_de_jong_syllable_nuclei_v3.py --audioDir $audioDir --audioExtension '.wav' --fluencyDir $autoFeatDir --jobs $nJobs --outputTsv $autoFeatDir/de_jong_syll_nucl.tsv > $output_txt
 
 
 ### eGeMAPS features (using Open Smile)
@@ -64,15 +73,16 @@ python3 ./fluency_scripts/02_eGeMAPS_feature_selection.py --eGeMAPSFile $autoFea
 ###   FLUENCY STEP 2: Compute features directly from audio + word segmentation (aw)  ###
 ########################################################################################
 
+# Decode audio using ASR: all ASR settings in one pass over each audio file (the model is loaded once,
+# and the audio, log-mel spectrogram and encoder output are shared between the settings)
+python3 ./asr_decoders/whispert.py --asrSettings whispert,whispert_dis,whispert_vad_dis,whispert_prompts --audioDir $audioDir --audioExtension $audioExtension --spkTaskSep $spkTaskSep --promptsDir $promptsDir --asrDir $asrDir
+
 for asrSettings in whispert whispert_dis whispert_vad_dis whispert_prompts
 do
     echo "Step 2: Processing $asrSettings"
-    
-    # Decode audio using ASR
-    python3 ./asr_decoders/whispert_dart_96.py --asrSettings $asrSettings --audioDir $audioDir --audioExtension $audioExtension --spkTaskSep $spkTaskSep --promptsDir $promptsDir --asrResultDir $asrDir/$asrSettings/json-asr-results
 
     # Compute features directly from .json ASR results and create TextGrids
-    python3 ./fluency_scripts/03_asr-results2features.py --jsonAsrResultsDir $asrDir/$asrSettings/json-asr-results --outputFile $autoFeatDir/$asrSettings/asr-features.tsv
+    python3 ./fluency_scripts/03_asr-results2features.py --jsonAsrResultsDir $asrDir/$asrSettings/json-asr-results --outputFile $autoFeatDir/$asrSettings/asr-features.tsv --audioDir $audioDir --audioExtension $audioExtension
     python3 ./fluency_scripts/04_asr-results2textgrids.py --jsonAsrResultsDir $asrDir/$asrSettings/json-asr-results --audioDir $audioDir
 done
 
@@ -87,13 +97,13 @@ do
     echo "STEP 3: Processing $asrSettings"
 
     # Align ASR result with prompt
-    python3 ./asr_prompt_aligners/stories-align-prompt-whispert-confStartEnd.py --input_asr_dir $asrDir/$asrSettings/json-asr-results --prompt_dir $promptsDir --output_dir $asrDir/$asrSettings
+    python3 ./asr_prompt_aligners/stories-align-prompt-whispert-confStartEnd.py --input_asr_dir $asrDir/$asrSettings/json-asr-results --prompt_dir $promptsDir --output_dir $asrDir/$asrSettings --alignCacheDir $alignCacheDir --promptIndexDir $promptIndexDir --jobs $nJobs
 
     # Compute reading accuracy-related features
     python3 ./fluency_scripts/05_accuracy_scores.py --asrDir $asrDir --asrSettings $asrSettings --outputDir $autoFeatDir/$asrSettings
 
     # Compute intrasentential and intersentential pause rate, duration and std
-    python3 ./fluency_scripts/06_inter-intra-pauses.py --asrDir $asrDir --asrSettings $asrSettings --outputDir $autoFeatDir/$asrSettings
+    python3 ./fluency_scripts/06_inter-intra-pauses.py --asrDir $asrDir --asrSettings $asrSettings --outputDir $autoFeatDir/$asrSettings --audioDir $audioDir --audioExtension $audioExtension
 done
 
 
@@ -116,7 +126,7 @@ python3 ./fluency_scripts/04_asr-results2textgrids.py --jsonAsrResultsDir $manua
 
 
 #Align ASR result with prompt
-python3 ./asr_prompt_aligners/stories-align-prompt-whispert-confStartEnd.py --input_asr_dir $manualFeatDir/json-orth-trans --prompt_dir $promptsDir --output_dir $manualFeatDir/$asrSettings
+python3 ./asr_prompt_aligners/stories-align-prompt-whispert-confStartEnd.py --input_asr_dir $manualFeatDir/json-orth-trans --prompt_dir $promptsDir --output_dir $manualFeatDir/$asrSettings --engine tiered --alignCacheDir $alignCacheDir --promptIndexDir $promptIndexDir --jobs $nJobs
         
 Compute reading accuracy-related features
 python3 ./fluency_scripts/05_accuracy_scores.py --asrDir $manualFeatDir --asrSettings $asrSettings --outputDir $manualFeatDir/$asrSettings
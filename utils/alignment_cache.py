@@ -0,0 +1,89 @@
+"""
+On-disk cache of prompt-transcription alignments (utils/alignment_modern.py).
+
+The alignment of a prompt and an ASR transcription only depends on the normalized strings, the alignment engine and the
+alignment code, not on the ASR settings or the word timestamps. Transcriptions of the same recording with different
+ASR settings are often identical after normalization, and a re-run of the prompt aligner aligns the same strings again.
+
+A result is stored under a key that is computed from:
+- the normalized prompt (sha256) and the normalized transcription (sha256);
+- the alignment engine;
+- the aligner version: the sha256 of the source of utils/alignment_modern.py and utils/alignment_kernel.py, and the version of Biopython.
+
+Layout: <cacheDir>/<key[:2]>/<key>.json with the STEP 1 alignment and the result of one_way_alignment_modern.
+The output frame of two_way_alignment_modern is made from this result with alignment_modern.alignment_frame.
+Several processes can share one cache dir: files are written to a temporary file and renamed.
+"""
+
+import os
+import json
+import hashlib
+import Bio
+
+import utils.alignment_modern as alignmod
+import utils.alignment_kernel as kernel
+from utils.decode_cache import hashFile, hashString
+
+ALIGNER_VERSION = hashString(' '.join([hashFile(alignmod.__file__), hashFile(kernel.__file__), Bio.__version__]))
+
+class AlignmentCache:
+
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir, exist_ok=True)
+
+    def key(self, prompt, asrTrans, engine):
+        keyFields = [ALIGNER_VERSION, engine, hashString(prompt), hashString(asrTrans)]
+        return hashlib.sha256(json.dumps(keyFields).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cacheDir, key[:2], key + '.json')
+
+    """
+    Returns (characterAlignment, alignment): the STEP 1 alignment and the result of one_way_alignment_modern (tuples of two strings), or None.
+    """
+    def get(self, key):
+        try:
+            with open(self.path(key), 'r') as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        return tuple(result['characterAlignment']), tuple(result['alignment'])
+
+    def put(self, key, characterAlignment, alignment):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmpPath = path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpPath, 'w') as f:
+            f.write(json.dumps({'characterAlignment': list(characterAlignment), 'alignment': list(alignment)}, ensure_ascii = False))
+        os.replace(tmpPath, path)
+
+"""
+alignment_modern.align_characters_batch and finish_alignment_batch for many transcriptions of the same prompt, with the results in cache if given.
+Transcriptions that are not in the cache are aligned in one batch, identical transcriptions only once.
+Returns the list of STEP 1 alignments and the list of results of one_way_alignment_modern.
+"""
+def alignBatchCached(cache, prompt, asrTransList, engine = alignmod.DEFAULT_ENGINE, promptNgrams = None):
+
+    results = {}
+    keys = {}
+    if cache is not None:
+        for asrTrans in set(asrTransList):
+            keys[asrTrans] = cache.key(prompt, asrTrans, engine)
+            result = cache.get(keys[asrTrans])
+            if result is not None:
+                results[asrTrans] = result
+
+    todo = list(dict.fromkeys(asrTrans for asrTrans in asrTransList if asrTrans not in results))
+    if len(todo) > 0:
+        characterAlignments, engines = alignmod.align_characters_batch(prompt, todo, engine, promptNgrams)
+        for asrTrans, characterAlignment, alignment in zip(todo, characterAlignments, alignmod.finish_alignment_batch(characterAlignments, engines)):
+            results[asrTrans] = (characterAlignment, alignment)
+            if cache is not None:
+                cache.put(keys[asrTrans], characterAlignment, alignment)
+
+    return [results[asrTrans][0] for asrTrans in asrTransList], [results[asrTrans][1] for asrTrans in asrTransList]
@@ -0,0 +1,369 @@
+"""
+Dynamic programming kernels for the alignment of a prompt with an ASR transcription (used by utils/alignment_modern.py).
+
+Global alignment with a match score, a mismatch score and a linear gap score, of two sequences a and b that are
+encoded as integer arrays (encode_characters, encode_words).
+An alignment is a list of (i, j) index pairs from start to end: i is an index in a (-1 for a gap in a), j an index in b (-1 for a gap in b).
+
+If several moves give the optimal score, the traceback (from the end to the start) takes the first move of priority:
+- PRIORITY_NEEDLEMAN_WUNSCH   diagonal, left, up: the backtrack of string2string NeedlemanWunsch
+- PRIORITY_BIO                left, up, diagonal: the first alignment of Bio.Align.PairwiseAligner
+(up = a[i] aligned with a gap, left = b[j] aligned with a gap)
+
+align_batch aligns many pairs of short sequences at once (e.g. the words of a story): the DP matrices of a batch of pairs
+are filled along the anti-diagonals (wavefront), vectorized over the cells of a diagonal and over the pairs.
+
+align_linear is a divide-and-conquer (Hirschberg-style) alignment with memory linear in the length of b:
+the rows of the DP matrix are computed from top to bottom keeping only the last row, the traceback is done on blocks of
+at most max_block_cells cells. The result is the same traceback as on the full DP matrix.
+
+align_banded only computes the cells of a band of columns lo[i], ..., hi[i] in each row i, the other cells score BAND_OUTSIDE.
+If the band contains every optimal path, the result is the same traceback as on the full DP matrix.
+"""
+
+import numpy as np
+
+DIAG = 'diag'
+UP = 'up'
+LEFT = 'left'
+
+PRIORITY_NEEDLEMAN_WUNSCH = (DIAG, LEFT, UP)
+PRIORITY_BIO = (LEFT, UP, DIAG)
+
+MAX_BLOCK_CELLS = 1000000
+MAX_BATCH_CELLS = 4000000
+
+# Score of the cells outside the band of align_banded: lower than the score of any alignment
+BAND_OUTSIDE = -2**30
+
+"""
+Strings as arrays of unicode code points.
+"""
+def encode_characters(*strings):
+    return [np.frombuffer(string.encode('utf-32-le'), dtype=np.uint32) for string in strings]
+
+"""
+Lists of words as arrays of word ids. The ids are shared by all lists.
+"""
+def encode_words(*word_lists):
+    vocabulary = {}
+    return [np.array([vocabulary.setdefault(word, len(vocabulary)) for word in words], dtype=np.int64) for words in word_lists]
+
+"""
+Row i of the DP matrix from row i-1 (prev_row), where a_item = a[i-1].
+The left moves within the row are a running maximum: F[i,j] = max over k <= j of (T[k] + gap*(j-k)),
+with T[k] the best diagonal or up move into (i,k).
+"""
+def next_row(prev_row, a_item, b, match, mismatch, gap):
+
+    best = np.empty(len(prev_row), dtype=np.int32)
+    best[0] = prev_row[0] + gap
+    best[1:] = np.maximum(prev_row[:-1] + np.where(b == a_item, match, mismatch), prev_row[1:] + gap)
+
+    offsets = gap * np.arange(len(prev_row), dtype=np.int32)
+    return np.maximum.accumulate(best - offsets) + offsets
+
+"""
+Traceback in matrix, the rows r0, r0+1, ... of the DP matrix, from (i, j) until row r0 is reached.
+The pairs are appended in reverse order. Returns the column in which row r0 is reached.
+"""
+def traceback(matrix, a, b, r0, i, j, match, mismatch, gap, priority, pairs):
+
+    while i > r0:
+        score = matrix[i - r0][j]
+        for move in priority:
+            if move == DIAG and j > 0 and score == matrix[i - r0 - 1][j-1] + (match if a[i-1] == b[j-1] else mismatch):
+                pairs.append((i-1, j-1))
+                i, j = i-1, j-1
+                break
+            if move == UP and score == matrix[i - r0 - 1][j] + gap:
+                pairs.append((i-1, -1))
+                i = i-1
+                break
+            if move == LEFT and j > 0 and score == matrix[i - r0][j-1] + gap:
+                pairs.append((-1, j-1))
+                j = j-1
+                break
+        else:
+            raise RuntimeError('No traceback move at ({}, {})'.format(i, j))
+
+    return j
+
+"""
+Traceback on the block of rows r0, ..., r1 of the DP matrix from (r1, j_end) until row r0 is reached.
+"""
+def traceback_block(a, b, r0, row_r0, r1, j_end, match, mismatch, gap, priority, pairs):
+
+    block = np.empty((r1 - r0 + 1, j_end + 1), dtype=np.int32)
+    block[0] = row_r0
+    for i in range(r0 + 1, r1 + 1):
+        block[i - r0] = next_row(block[i - r0 - 1], a[i-1], b[:j_end], match, mismatch, gap)
+
+    return traceback(block.tolist(), a.tolist(), b.tolist(), r0, r1, j_end, match, mismatch, gap, priority, pairs)
+
+"""
+Traceback from (r1, j_end) until row r0 is reached, with only one row per level of recursion in memory.
+Row mid is computed from row r0, the lower half is traced back first (from row r1 to row mid), then the upper half.
+"""
+def traceback_recursive(a, b, r0, row_r0, r1, j_end, match, mismatch, gap, priority, max_block_cells, pairs):
+
+    if r1 - r0 <= 1 or (r1 - r0 + 1) * (j_end + 1) <= max_block_cells:
+        return traceback_block(a, b, r0, row_r0, r1, j_end, match, mismatch, gap, priority, pairs)
+
+    mid = (r0 + r1) // 2
+    row_mid = row_r0
+    for i in range(r0 + 1, mid + 1):
+        row_mid = next_row(row_mid, a[i-1], b[:j_end], match, mismatch, gap)
+
+    j_mid = traceback_recursive(a, b, mid, row_mid, r1, j_end, match, mismatch, gap, priority, max_block_cells, pairs)
+    return traceback_recursive(a, b, r0, row_r0[:j_mid + 1], mid, j_mid, match, mismatch, gap, priority, max_block_cells, pairs)
+
+"""
+Global alignment of a and b with memory linear in len(b). Returns the list of (i, j) pairs.
+"""
+def align_linear(a, b, match, mismatch, gap, priority, max_block_cells = MAX_BLOCK_CELLS):
+
+    row_0 = gap * np.arange(len(b) + 1, dtype=np.int32)
+
+    pairs = []
+    j = traceback_recursive(a, b, 0, row_0, len(a), len(b), match, mismatch, gap, priority, max_block_cells, pairs)
+
+    # Row 0: only left moves
+    pairs += [(-1, jj) for jj in range(j-1, -1, -1)]
+
+    return pairs[::-1]
+
+"""
+Row i of the banded DP matrix, the columns lo, ..., hi, from row i-1 (prev_row, the columns prev_lo, ...), where a_item = a[i-1].
+b_padded[j] = b[j-1]. As next_row, with BAND_OUTSIDE for the cells of row i-1 outside its band.
+"""
+def next_band_row(prev_row, prev_lo, a_item, b_padded, lo, hi, match, mismatch, gap):
+
+    # Row i-1 in the columns lo-1, ..., hi
+    prev = np.full(hi - lo + 2, BAND_OUTSIDE, dtype=np.int32)
+    start, end = max(prev_lo, lo - 1), min(prev_lo + len(prev_row), hi + 1)
+    if start < end:
+        prev[start - lo + 1:end - lo + 1] = prev_row[start - prev_lo:end - prev_lo]
+
+    best = np.maximum(prev[:-1] + np.where(b_padded[lo:hi+1] == a_item, match, mismatch), prev[1:] + gap)
+    if lo == 0:
+        best[0] = prev[1] + gap
+
+    offsets = gap * np.arange(hi - lo + 1, dtype=np.int32)
+    return (np.maximum.accumulate(best - offsets) + offsets).astype(np.int32)
+
+"""
+Row of the banded DP matrix as a row of the full DP matrix for traceback: BAND_OUTSIDE outside the band.
+"""
+class BandRow:
+
+    def __init__(self, row, lo):
+        self.row = row
+        self.lo = lo
+
+    def __getitem__(self, j):
+        if self.lo <= j < self.lo + len(self.row):
+            return int(self.row[j - self.lo])
+        return BAND_OUTSIDE
+
+"""
+Global alignment of a and b with the cells lo[i], ..., hi[i] of each row i of the DP matrix (0 <= lo[i] <= hi[i] <= len(b)),
+the other cells score BAND_OUTSIDE. Returns the list of (i, j) pairs.
+The traceback is the traceback on the full DP matrix if every optimal path of the full DP matrix lies within the band:
+the cells of an optimal path then have the same score as in the full DP matrix, and all other cells a lower score.
+"""
+def align_banded(a, b, lo, hi, match, mismatch, gap, priority):
+
+    b_padded = np.concatenate(([-1], b.astype(np.int64)))
+
+    rows = [gap * np.arange(lo[0], hi[0] + 1, dtype=np.int32)]
+    for i in range(1, len(a) + 1):
+        rows.append(next_band_row(rows[-1], lo[i-1], a[i-1], b_padded, lo[i], hi[i], match, mismatch, gap))
+
+    matrix = [BandRow(row, row_lo) for row, row_lo in zip(rows, lo)]
+    pairs = []
+    j = traceback(matrix, a.tolist(), b.tolist(), 0, len(a), len(b), match, mismatch, gap, priority, pairs)
+
+    # Row 0: only left moves
+    pairs += [(-1, jj) for jj in range(j-1, -1, -1)]
+
+    return pairs[::-1]
+
+"""
+DP matrices of a batch of pairs (a_list[k], b_list[k]), shape (batch, max len a + 1, max len b + 1).
+The sequences are padded; the cells (i, j) with i <= len(a_list[k]) and j <= len(b_list[k]) do not depend on the padding.
+The cells of one anti-diagonal i + j = d only depend on the two previous diagonals, so each diagonal is computed at once.
+"""
+def score_matrices(a_list, b_list, match, mismatch, gap):
+
+    n = max(len(a) for a in a_list)
+    m = max(len(b) for b in b_list)
+
+    a_padded = np.full((len(a_list), n), -1, dtype=np.int64)
+    b_padded = np.full((len(b_list), m), -2, dtype=np.int64)
+    for k, (a, b) in enumerate(zip(a_list, b_list)):
+        a_padded[k, :len(a)] = a
+        b_padded[k, :len(b)] = b
+
+    matrices = np.empty((len(a_list), n + 1, m + 1), dtype=np.int32)
+    matrices[:, :, 0] = gap * np.arange(n + 1)
+    matrices[:, 0, :] = gap * np.arange(m + 1)
+
+    for d in range(2, n + m + 1):
+        i = np.arange(max(1, d - m), min(n, d - 1) + 1)
+        j = d - i
+        diagonal = matrices[:, i-1, j-1] + np.where(a_padded[:, i-1] == b_padded[:, j-1], match, mismatch)
+        matrices[:, i, j] = np.maximum(diagonal, np.maximum(matrices[:, i-1, j], matrices[:, i, j-1]) + gap)
+
+    return matrices
+
+"""
+The alignment of a pair that needs no DP (match > mismatch and gap <= 0): an empty sequence, or identical sequences.
+Returns None for other pairs.
+"""
+def trivial_alignment(len_a, len_b, identical):
+    if len_b == 0:
+        return [(i, -1) for i in range(len_a)]
+    if len_a == 0:
+        return [(-1, j) for j in range(len_b)]
+    if identical:
+        return [(i, i) for i in range(len_a)]
+    return None
+
+"""
+Global alignment of each pair (a_list[k], b_list[k]) with the full DP matrix. Returns a list with the list of (i, j) pairs of each alignment.
+The pairs are sorted on size and batched, with at most max_batch_cells DP cells per batch.
+"""
+def align_batch(a_list, b_list, match, mismatch, gap, priority, max_batch_cells = MAX_BATCH_CELLS):
+
+    alignments = [None] * len(a_list)
+    todo = []
+    for k, (a, b) in enumerate(zip(a_list, b_list)):
+        alignments[k] = trivial_alignment(len(a), len(b), len(a) == len(b) and np.array_equal(a, b))
+        if alignments[k] is None:
+            todo.append(k)
+
+    lengths = {k: (len(a_list[k]), len(b_list[k])) for k in todo}
+    order = sorted(todo, key = lambda k: (lengths[k][0] + 1) * (lengths[k][1] + 1))
+
+    start = 0
+    while start < len(order):
+
+        # Largest batch within max_batch_cells (at least one pair)
+        end = start + 1
+        n, m = lengths[order[start]]
+        while end < len(order):
+            n_next, m_next = max(n, lengths[order[end]][0]), max(m, lengths[order[end]][1])
+            if (end + 1 - start) * (n_next + 1) * (m_next + 1) > max_batch_cells:
+                break
+            n, m = n_next, m_next
+            end += 1
+
+        batch = order[start:end]
+        matrices = score_matrices([a_list[k] for k in batch], [b_list[k] for k in batch], match, mismatch, gap)
+
+        for matrix, k in zip(matrices, batch):
+            a, b = a_list[k].tolist(), b_list[k].tolist()
+            pairs = []
+            j = traceback(matrix.tolist(), a, b, 0, len(a), len(b), match, mismatch, gap, priority, pairs)
+            pairs += [(-1, jj) for jj in range(j-1, -1, -1)]
+            alignments[k] = pairs[::-1]
+
+        start = end
+
+    return alignments
+
+"""
+align_batch for sequences of items (strings, or lists of words) that are encoded with encode (encode_characters or encode_words).
+Pairs of identical sequences are aligned without encoding them.
+"""
+def align_items_batch(a_list, b_list, encode, match, mismatch, gap, priority):
+
+    alignments = [trivial_alignment(len(a), len(b), a == b) for a, b in zip(a_list, b_list)]
+    todo = [k for k, alignment in enumerate(alignments) if alignment is None]
+
+    codes = encode(*[a_list[k] for k in todo], *[b_list[k] for k in todo])
+    for k, pairs in zip(todo, align_batch(codes[:len(todo)], codes[len(todo):], match, mismatch, gap, priority)):
+        alignments[k] = pairs
+
+    return alignments
+
+"""
+The aligned items of a and b, gap_char for a gap.
+With pad = True, the shorter item of each pair is padded with spaces (as in the output of string2string).
+"""
+def pairs_to_items(a_items, b_items, pairs, gap_char = '-', pad = False):
+
+    if not pad:
+        return [a_items[i] if i >= 0 else gap_char for i, j in pairs], [b_items[j] if j >= 0 else gap_char for i, j in pairs]
+
+    aligned_a = []
+    aligned_b = []
+    for i, j in pairs:
+        item_a = a_items[i] if i >= 0 else gap_char
+        item_b = b_items[j] if j >= 0 else gap_char
+        width = max(len(item_a), len(item_b))
+        item_a, item_b = item_a.ljust(width), item_b.ljust(width)
+        aligned_a.append(item_a)
+        aligned_b.append(item_b)
+
+    return aligned_a, aligned_b
+
+"""
+Matching blocks of a shortest edit script (insertions and deletions) of the sequences a and b, with the O((N+M)D) diff algorithm of Myers (1986):
+linear in the length of the sequences for a small number of edits D. Items are compared with ==.
+Returns a list of (i, j, length): a[i:i+length] == b[j:j+length], increasing and not overlapping, or None if more than max_edits edits are needed.
+"""
+def diff_sequences(a, b, max_edits):
+
+    n, m = len(a), len(b)
+
+    # furthest[k]: the furthest x on diagonal k = x - y after d edits; history[d]: furthest after d edits
+    furthest = {1: 0}
+    history = []
+    for d in range(max_edits + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and furthest[k-1] < furthest[k+1]):
+                x = furthest[k+1]
+            else:
+                x = furthest[k-1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x, y = x + 1, y + 1
+            furthest[k] = x
+
+            if x >= n and y >= m:
+                history.append(dict(furthest))
+                return diff_blocks(history, n, m)
+
+        history.append(dict(furthest))
+
+    return None
+
+"""
+Traceback of diff_sequences from (n, m).
+"""
+def diff_blocks(history, n, m):
+
+    blocks = []
+    x, y = n, m
+    for d in range(len(history) - 1, 0, -1):
+        k = x - y
+        previous = history[d-1]
+        if k == -d or (k != d and previous[k-1] < previous[k+1]):
+            previous_k = k + 1
+            x_start = previous[previous_k]
+        else:
+            previous_k = k - 1
+            x_start = previous[previous_k] + 1
+        y_start = x_start - k
+
+        if x > x_start:
+            blocks.append((x_start, y_start, x - x_start))
+        x = previous[previous_k]
+        y = x - previous_k
+
+    if x > 0:
+        blocks.append((0, 0, x))
+
+    return blocks[::-1]
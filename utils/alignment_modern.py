@@ -10,34 +10,75 @@ Old ADAPT alignment:
 rode doppen daarna laat ze op het bord een tekening zien daarop staat
 ro--------n-d------------e ----------d----------onk --en-daarop staat
 
+Alignment engines (argument engine of one_way_alignment_modern and two_way_alignment_modern):
+- 'bio'       the complete prompt and transcription are aligned at character level (STEP 1), and refined (STEP 2-5). This is the default.
+- 'anchored'  word n-grams that occur exactly once in both the prompt and the transcription are used as anchors. STEP 1 is split at
+              the word boundaries of the anchors through which every optimal alignment of the whole story passes (see certified_cuts),
+              and only done for the pieces between them. Such cuts are only found in readings with very few errors.
+              Other long readings (more than LINEAR_MIN_CELLS) are aligned within a band of the DP matrix: the cells through which
+              a path can score at least as high as the path through the anchors (see align_characters_banded). The band contains every
+              optimal alignment, so this gives the same alignment as 'bio'. If the band has more than BAND_MAX_FRACTION of the cells
+              (many errors, or a long hallucinated insertion), and for all other readings, the reading is aligned as a whole, as with 'bio'.
+- 'linear'    as 'bio', but STEP 1 and STEP 3 are done with the divide-and-conquer alignment of utils/alignment_kernel.py,
+              with memory linear in the length of the transcription. It gives the same alignment as 'bio'.
+              Used automatically for alignments of more than LINEAR_MIN_CELLS characters x characters (e.g. hallucinated transcriptions).
+- 'tiered'    for (near) exact readings, e.g. orthographic transcriptions. A transcription that is equal to the prompt is aligned
+              directly. Otherwise the prompt and transcription words are compared with a word diff (alignment_kernel.diff_sequences),
+              which is linear in the number of words if there are few edits. If there are at most TIERED_MAX_EDIT_RATE edits per prompt word,
+              the runs of equal words are used as the anchors of 'anchored'. Otherwise as 'bio'. This gives the same alignment as 'bio'.
+
+The word-level (STEP 3) and local character-level (STEP 4) alignments are done with alignment_kernel.align_batch, which gives the
+same alignments as the Needleman-Wunsch aligner of string2string (match 1, mismatch -1, gap -1) that was used before.
 """
 
 from Bio import Align
-from string2string.alignment import NeedlemanWunsch
 import os
-import re
+import numpy as np
 import pandas as pd
 
-nw = NeedlemanWunsch()
+import utils.alignment_kernel as kernel
 
-def split_alignments_in_segments(align_ref, align_hyp):
+ENGINES = ['bio', 'anchored', 'linear', 'tiered']
+DEFAULT_ENGINE = 'bio'
+ANCHOR_NGRAM = 3
+TIERED_MAX_EDIT_RATE = 0.2
+LINEAR_MIN_CELLS = 10000000
+BAND_MAX_FRACTION = 0.5
+
+# Needleman-Wunsch scores (match, mismatch, gap) of STEP 3 and 4
+NW_SCORES = (1, -1, -1)
+GAP_CHAR = '-'
 
-    # indices_rev = [0] + [i.start() for i in re.finditer(" ",align_ref_rev)] + [len(align_ref_rev)] + [9999]
-    # align_ref_rev_list = [align_ref_rev[indices_rev[idx]: indices_rev[idx+1]]
-    #                       for idx, item in enumerate(indices_rev) if item != 9999][:-1]
-    # align_hyp_rev_list = [align_hyp_rev[indices_rev[idx]: indices_rev[idx+1]]
-    #                       for idx, item in enumerate(indices_rev) if item != 9999][:-1]
+"""
+Character codes of s as an array: uint8 for ASCII strings, otherwise uint32 code points. Element i is the code of s[i].
+Used to find characters in aligned strings with boolean masks instead of a loop over the characters.
+"""
+def char_codes(s):
+    if s.isascii():
+        return np.frombuffer(s.encode('ascii'), dtype=np.uint8)
+    return np.frombuffer(s.encode('utf-32-le'), dtype=np.uint32)
 
-    indices = [0] + [i.start() for i in re.finditer(" ", align_ref)
-                     ] + [len(align_ref)] + [9999]
-    align_ref_list = [align_ref[indices[idx]: indices[idx+1]]
-                      for idx, item in enumerate(indices) if item != 9999][:-1]
-    align_hyp_list = [align_hyp[indices[idx]: indices[idx+1]]
-                      for idx, item in enumerate(indices) if item != 9999][:-1]
+"""
+Offsets of the columns of the alignment (align_ref, align_hyp) with ref_char in align_ref and hyp_char in align_hyp.
+"""
+def aligned_char_offsets(align_ref, align_hyp, ref_char, hyp_char):
+    return np.flatnonzero((char_codes(align_ref) == ord(ref_char)) & (char_codes(align_hyp) == ord(hyp_char)))
+
+"""
+Start and end offsets of the segments of a string of length length that is split at separator offsets (the separators are not part of the segments).
+"""
+def segment_bounds(offsets, length):
+    return np.r_[0, offsets + 1].tolist(), np.r_[offsets, length].tolist()
+
+"""
+Split the output of one_way_alignment_modern in words: at the spaces of align_ref.
+"""
+def split_alignments_in_segments(align_ref, align_hyp):
 
+    starts, ends = segment_bounds(np.flatnonzero(char_codes(align_ref) == ord(' ')), len(align_ref))
 
-    align_ref_list = [align_ref_list[0]] + [x[1:] for x in align_ref_list[1:]]
-    align_hyp_list = [align_hyp_list[0]] + [x[1:] for x in align_hyp_list[1:]]
+    align_ref_list = [align_ref[i:j] for i, j in zip(starts, ends)]
+    align_hyp_list = [align_hyp[i:j] for i, j in zip(starts, ends)]
 
     return align_ref_list, align_hyp_list
 
@@ -60,7 +101,7 @@ def determineCorrectness(row):
 
 #     return list(promptDF['prompt_id'])
 
-def one_way_alignment_modern(prompt, asrTrans):
+def align_characters_bio(prompt, asrTrans):
     ############
     # Step 1: Global alignment using Bio aligner. 
     # We chose this one, since it keeps asrTrans words as much as possible together, example alignment:
@@ -76,27 +117,94 @@ def one_way_alignment_modern(prompt, asrTrans):
     align_ref = al[0]
     align_hyp = al[1]
 
-    ############
-    # Step 2: Split aligned strings at clear word boundaries (a space at the same spot in both align_ref and align_hyp)
-    ############
-    index_list = []
-    align_ref = ' ' + align_ref 
-    align_hyp = ' ' + align_hyp
+    return align_ref, align_hyp
 
-    for idx in range(len(align_ref)):
+"""
+STEP 1 with alignment_kernel.align_linear, with the scores and tie-breaking of the Bio aligner.
+"""
+def align_characters_linear(prompt, asrTrans):
 
-        ref_char_at_idx = align_ref[idx]
-        hyp_char_at_idx = align_hyp[idx]
+    aligner = Align.PairwiseAligner(match_score=1.0)
+    scores = (int(aligner.match_score), int(aligner.mismatch_score), int(aligner.gap_score))
+
+    prompt_codes, asrTrans_codes = kernel.encode_characters(prompt, asrTrans)
+    pairs = kernel.align_linear(prompt_codes, asrTrans_codes, *scores, kernel.PRIORITY_BIO)
+    align_ref, align_hyp = kernel.pairs_to_items(prompt, asrTrans, pairs)
+
+    return ''.join(align_ref), ''.join(align_hyp)
 
-        if ref_char_at_idx == ' ' and hyp_char_at_idx == ' ':
-            index_list.append(idx+1)
+"""
+STEP 3: word-level alignment of each pair of segments (lists of words).
+Returns for each pair the aligned words of the reference and the hypothesis, a gap is '-'. The shorter word of each aligned pair
+is padded with spaces. With engine 'linear', the segments are aligned with alignment_kernel.align_linear.
+"""
+def align_segments(ref_segments, hyp_segments, engine = DEFAULT_ENGINE):
 
-    align_ref_split = [align_ref[i:j].strip() for i,j in zip(index_list, index_list[1:]+[None])]
-    align_hyp_split = [align_hyp[i:j].strip() for i,j in zip(index_list, index_list[1:]+[None])]
+    if engine == 'linear':
+        alignments = [kernel.align_linear(*kernel.encode_words(i, j), *NW_SCORES, kernel.PRIORITY_NEEDLEMAN_WUNSCH) for i,j in zip(ref_segments, hyp_segments)]
+    else:
+        alignments = kernel.align_items_batch(ref_segments, hyp_segments, kernel.encode_words, *NW_SCORES, kernel.PRIORITY_NEEDLEMAN_WUNSCH)
 
-    # print('version1')
-    # print(align_ref_split)
-    # print(align_hyp_split)
+    return [kernel.pairs_to_items(i, j, pairs, GAP_CHAR, pad=True) for i, j, pairs in zip(ref_segments, hyp_segments, alignments)]
+
+"""
+STEP 4: character-level alignment of each pair of words. Returns the aligned reference words and hypothesis words, a gap is '-'.
+"""
+def align_words(ref_words, hyp_words):
+
+    alignments = kernel.align_items_batch(ref_words, hyp_words, kernel.encode_characters, *NW_SCORES, kernel.PRIORITY_NEEDLEMAN_WUNSCH)
+
+    aligned = [kernel.pairs_to_items(i, j, pairs, GAP_CHAR) for i, j, pairs in zip(ref_words, hyp_words, alignments)]
+    return [''.join(x[0]) for x in aligned], [''.join(x[1]) for x in aligned]
+
+def align_characters(prompt, asrTrans, engine = DEFAULT_ENGINE):
+    if engine == 'linear':
+        return align_characters_linear(prompt, asrTrans)
+    return align_characters_bio(prompt, asrTrans)
+
+"""
+'linear' for alignments with more than LINEAR_MIN_CELLS cells, otherwise engine.
+"""
+def select_engine(prompt, asrTrans, engine):
+    if len(prompt) * len(asrTrans) > LINEAR_MIN_CELLS:
+        return 'linear'
+    return engine
+
+def refine_alignment(align_ref, align_hyp, engine = DEFAULT_ENGINE):
+    return refine_alignment_batch([(align_ref, align_hyp)], [engine])[0]
+
+"""
+Split items in consecutive parts of the given lengths.
+"""
+def split_list(items, lengths):
+    parts = []
+    start = 0
+    for length in lengths:
+        parts.append(items[start:start+length])
+        start += length
+    return parts
+
+"""
+STEP 2-4 for a list of (align_ref, align_hyp) alignments of STEP 1, engines: the engine of each alignment.
+STEP 3 and STEP 4 of all alignments are done in one batch (except STEP 3 for engine 'linear').
+Returns a list with (align_ref_3, align_hyp_3) for each alignment.
+"""
+def refine_alignment_batch(alignments, engines):
+
+    ref_segments = []
+    hyp_segments = []
+    for align_ref, align_hyp in alignments:
+
+        ############
+        # Step 2: Split aligned strings at clear word boundaries (a space at the same spot in both align_ref and align_hyp)
+        ############
+        starts, ends = segment_bounds(aligned_char_offsets(align_ref, align_hyp, ' ', ' '), len(align_ref))
+
+        align_ref_split = [align_ref[i:j].strip() for i, j in zip(starts, ends)]
+        align_hyp_split = [align_hyp[i:j].strip() for i, j in zip(starts, ends)]
+
+        ref_segments.append([i.replace('-', '').split(' ') for i in align_ref_split])
+        hyp_segments.append([j.replace('-', '').split(' ') for j in align_hyp_split])
 
     #############
     # STEP 3: Align these segments again, this time use word-level alignment.
@@ -104,13 +212,18 @@ def one_way_alignment_modern(prompt, asrTrans):
     # I hope that this will improve reconstruction of the confidence scores later on.
     #########
 
-    alignment = [nw.get_alignment(i.replace('-', '').split(' '), j.replace('-', '').split(' ')) for i,j in zip(align_ref_split, align_hyp_split)]
+    batch = [k for k, engine in enumerate(engines) if engine != 'linear']
+    batch_alignment = align_segments([segment for k in batch for segment in ref_segments[k]], [segment for k in batch for segment in hyp_segments[k]])
 
-    align_ref_2 = [x[0].split(' | ') for x in alignment]
-    align_hyp_2 = [x[1].split(' | ') for x in alignment]
+    alignment = [None] * len(alignments)
+    for k, segment_alignment in zip(batch, split_list(batch_alignment, [len(ref_segments[k]) for k in batch])):
+        alignment[k] = segment_alignment
+    for k, engine in enumerate(engines):
+        if engine == 'linear':
+            alignment[k] = align_segments(ref_segments[k], hyp_segments[k], engine)
 
-    align_ref_flatten = [item for sublist in align_ref_2 for item in sublist]
-    align_hyp_flatten = [item for sublist in align_hyp_2 for item in sublist]
+    align_ref_flatten = [[item for x in segment_alignment for item in x[0]] for segment_alignment in alignment]
+    align_hyp_flatten = [[item for x in segment_alignment for item in x[1]] for segment_alignment in alignment]
 
     # print('version2')
     # print(align_ref_flatten)
@@ -125,15 +238,17 @@ def one_way_alignment_modern(prompt, asrTrans):
     # ['begin', 'jollo', 'met', 'twee', 'donker', 'voor', 'een', 'f-est', 'kom', 'je', 'bijvoorbeeld', 'een', 'jong', 'ma--n', 'krijgt', 'wat', 'is', 'een', 'jong', 'nou', 'meer', 'vraagt', 'zeun', 'dat', 'is', 'heel', 'erg', 'leuk', 'nou-------', '---------', 'stilze-t', 'j-e', 'stoe-l', 'uit', 'ze', 'laat', 'een', 'jongen', 'zien', 'en', 'doet', 'voor', 'hoe', 'het', 'werkt', 'd-e', 'jongen', 'heeft', 'ze', 'zelf', 'gemaakt', 'van', 'twee', 'ronde', '------', '------', '----', '--', '--', '---', '----', '---', 'donke--n-', '----', 'daarop', 'staat', 'precies', 'wat', 'ze', 'moet--', 'doen', 'om', 'een', 'jongen', 'te', 'maken', 'dan', 'zegt', 'ze', 'heel', 'veel', 'gekleurde', 'donken', 'op', 'haar', 'zetafel', 'nu', 'mogen', 'juffie', 'het', 'allemaal', 'zelf', 'proberen', 'zelf', 'zegt', 'ze', 'dat', 'k-an', 'ik', 'erg', 'de', 'hele', 'middag', 'de', 'druk', 'met', 'de---', 'zin', 'het', 'einde', 'van', 'de', 'dag', 'h---et', '--', 'zilsamen', '---', '------', '-----', '-------', '--', '---', 'me--t', '----------', '-----', '--', '----de', '----', '--', '---', '-------', '------', '---', '--', '---', '-----', '------jongen', '----', '------', '--', 'z---ij', '----', '------', '---', '--', '--', '----', '-----', '--', '----', '----', '----', '--', '------', '-----', 'maakt', '------', '-----', '--------', '----', '---', '-------', '--', '----', '---', '--', '---', '---', '------', '--', '----', '------', '---', '---------', '-----', '---', '-----', '----', '--', '----', '--', '-------', '----', 'zilver']
     ##############
 
-    alignment2 = [nw.get_alignment(i.replace('-', '').strip(), j.replace('-', '').strip()) for i,j in zip(align_ref_flatten, align_hyp_flatten)]
-
-    align_ref_3 = [x[0].replace(' | ', '') for x in alignment2]
-    align_hyp_3 = [x[1].replace(' | ', '') for x in alignment2]
+    align_ref_3, align_hyp_3 = align_words([i.replace('-', '').strip() for flatten in align_ref_flatten for i in flatten], [j.replace('-', '').strip() for flatten in align_hyp_flatten for j in flatten])
 
     # print('version3')
     # print(align_ref_3)
     # print(align_hyp_3)
 
+    lengths = [len(flatten) for flatten in align_ref_flatten]
+    return list(zip(split_list(align_ref_3, lengths), split_list(align_hyp_3, lengths)))
+
+def merge_insertions(align_ref_3, align_hyp_3):
+
     ##############
     # STEP 5: Make sure that the reference consists of the same amount of words as the prompt.
     # The result of step 4 sees inserted words (in the hypothesis) as separate words in the ref (-------). 
@@ -175,30 +290,412 @@ def one_way_alignment_modern(prompt, asrTrans):
 
     return align_ref_4.replace('-', '*'), align_hyp_4.replace('-', '*')
 
+"""
+Unique word n-grams of words: n-gram -> start index. N-grams that occur more than once are left out.
+"""
+def unique_ngrams(words, n):
+    positions = {}
+    for idx in range(len(words) - n + 1):
+        positions.setdefault(tuple(words[idx:idx+n]), []).append(idx)
+    return {ngram: idxs[0] for ngram, idxs in positions.items() if len(idxs) == 1}
+
+"""
+Longest chain of (prompt_idx, hyp_idx) pairs that increases in both indices (longest increasing subsequence, O(k log k)).
+pairs must be sorted on prompt_idx, which is unique.
+"""
+def longest_increasing_chain(pairs):
+
+    tails = []      # tails[k]: index in pairs of the last pair of the best chain of length k+1
+    previous = [-1] * len(pairs)
+    for idx, (prompt_idx, hyp_idx) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if pairs[tails[mid]][1] < hyp_idx:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            previous[idx] = tails[lo-1]
+        if lo == len(tails):
+            tails.append(idx)
+        else:
+            tails[lo] = idx
+
+    chain = []
+    idx = tails[-1] if len(tails) > 0 else -1
+    while idx != -1:
+        chain.append(pairs[idx])
+        idx = previous[idx]
+    return chain[::-1]
+
+"""
+Find anchors between the prompt words and the hypothesis words: runs of identical words that start with an n-gram
+that occurs exactly once in both. Returns a list of (prompt_start, hyp_start, length), increasing and not overlapping.
+prompt_ngrams: unique_ngrams(prompt_words, n), if already computed.
+"""
+def find_anchors(prompt_words, hyp_words, n = ANCHOR_NGRAM, prompt_ngrams = None):
+
+    if prompt_ngrams is None:
+        prompt_ngrams = unique_ngrams(prompt_words, n)
+    hyp_ngrams = unique_ngrams(hyp_words, n)
+    pairs = sorted((prompt_idx, hyp_ngrams[ngram]) for ngram, prompt_idx in prompt_ngrams.items() if ngram in hyp_ngrams)
+
+    anchors = []
+    for prompt_idx, hyp_idx in longest_increasing_chain(pairs):
+        if len(anchors) > 0:
+            prev_prompt, prev_hyp, prev_length = anchors[-1]
+
+            # Same diagonal and overlapping or adjacent: extend the previous anchor
+            if prompt_idx - prev_prompt == hyp_idx - prev_hyp and prompt_idx <= prev_prompt + prev_length:
+                anchors[-1] = (prev_prompt, prev_hyp, max(prev_length, prompt_idx - prev_prompt + n))
+                continue
+
+            # Overlaps the previous anchor on another diagonal
+            if prompt_idx < prev_prompt + prev_length or hyp_idx < prev_hyp + prev_length:
+                continue
+
+        anchors.append((prompt_idx, hyp_idx, n))
+
+    return anchors
+
+"""
+Upper bound of the STEP 1 score of any alignment of p prompt characters with q transcription characters (scores: match, mismatch, gap):
+all min(p, q) diagonal steps score the best of match and mismatch, the other |p - q| characters are gaps.
+"""
+def score_upper_bound(p, q, scores):
+    match, mismatch, gap = scores
+    return np.minimum(p, q) * max(match, mismatch) + np.abs(p - q) * gap
+
+"""
+Score of the STEP 1 alignment of prompt and asrTrans with the Bio aligner. Bio does not align empty strings: then all characters are gaps.
+"""
+def score_characters(aligner, prompt, asrTrans):
+    if len(prompt) == 0 or len(asrTrans) == 0:
+        return (len(prompt) + len(asrTrans)) * aligner.gap_score
+    return aligner.score(prompt, asrTrans)
+
+"""
+Character offset of the start of each word (prompt.split()) in s.
+"""
+def word_offsets(s):
+    codes = char_codes(s)
+    space = np.isin(codes, [ord(c) for c in ' \t\n\r\x0b\x0c'])
+    return np.flatnonzero(~space & np.concatenate(([True], space[:-1])))
+
+"""
+Score of the best STEP 1 path of prompt and asrTrans through the cells (increasing in both offsets): the sum of the Bio scores
+of the pieces between them. A lower bound of the optimal score.
+"""
+def path_score(aligner, prompt, asrTrans, cells):
+
+    score = 0
+    prompt_idx, hyp_idx = 0, 0
+    for i, j in cells + [(len(prompt), len(asrTrans))]:
+        score += score_characters(aligner, prompt[prompt_idx:i], asrTrans[hyp_idx:j])
+        prompt_idx, hyp_idx = i, j
+    return score
+
+"""
+DP cells (prompt offset, asrTrans offset) at the word boundaries of runs of identical words (prompt_start, hyp_start, length):
+the start of each word of a run and the end of its last word. A path through these cells aligns the words of the runs with each other.
+"""
+def word_run_cells(prompt, asrTrans, prompt_words, hyp_words, runs):
+
+    prompt_offsets, hyp_offsets = word_offsets(prompt), word_offsets(asrTrans)
+
+    cells = []
+    for prompt_start, hyp_start, length in runs:
+        for idx in range(length):
+            cells.append((int(prompt_offsets[prompt_start+idx]), int(hyp_offsets[hyp_start+idx])))
+        last_length = len(prompt_words[prompt_start+length-1])
+        cells.append((int(prompt_offsets[prompt_start+length-1]) + last_length, int(hyp_offsets[hyp_start+length-1]) + last_length))
+
+    return cells
+
+"""
+The cells (increasing in both offsets) through which every optimal STEP 1 path of prompt and asrTrans passes.
+The score of the path through all cells (the Bio scores of the pieces between them) is a lower bound of the optimal score.
+A path that avoids the cell (i, j) passes row i in another column k, so its score is at most
+score_upper_bound(i, k) + score_upper_bound(len(prompt) - i, len(asrTrans) - k). If this is lower than the lower bound for all k != j,
+no optimal path avoids the cell. The bound is concave in k, so its maximum over k != j is at one of its breakpoints (k = i and
+k = len(asrTrans) - len(prompt) + i) or next to j.
+"""
+def certified_cuts(prompt, asrTrans, cells):
+
+    aligner = Align.PairwiseAligner(match_score=1.0)
+    scores = (aligner.match_score, aligner.mismatch_score, aligner.gap_score)
+    lower_bound = path_score(aligner, prompt, asrTrans, cells)
+
+    n, m = len(prompt), len(asrTrans)
+    i, j = np.array(cells, dtype=np.int64).reshape(-1, 2).T
+    k = np.stack([i, m - n + i, j - 1, j + 1])
+    valid = (k >= 0) & (k <= m) & (k != j)
+    bound = score_upper_bound(i, k, scores) + score_upper_bound(n - i, m - k, scores)
+    avoiding = np.where(valid, bound, -np.inf).max(axis=0)
+
+    return [cell for cell, certified in zip(cells, avoiding < lower_bound) if certified]
+
+"""
+STEP 1 of prompt and asrTrans, split at the cells cuts (see certified_cuts). The pieces between the cuts are aligned with
+the Bio aligner (or 'linear' if large, see select_engine), empty pieces with gaps.
+Every optimal path passes the cuts, and the traceback of the Bio aligner after (before) a cut only depends on the DP cells after
+(before) it, so this is the same alignment as align_characters_bio of the complete strings.
+"""
+def align_characters_split(prompt, asrTrans, cuts):
+
+    align_ref_parts = []
+    align_hyp_parts = []
+    prompt_idx, hyp_idx = 0, 0
+    for i, j in cuts + [(len(prompt), len(asrTrans))]:
+
+        prompt_piece, hyp_piece = prompt[prompt_idx:i], asrTrans[hyp_idx:j]
+        if len(prompt_piece) > 0 and len(hyp_piece) > 0:
+            align_ref, align_hyp = align_characters(prompt_piece, hyp_piece, select_engine(prompt_piece, hyp_piece, 'bio'))
+        else:
+            align_ref, align_hyp = prompt_piece + '-' * len(hyp_piece), '-' * len(prompt_piece) + hyp_piece
+        align_ref_parts.append(align_ref)
+        align_hyp_parts.append(align_hyp)
+
+        prompt_idx, hyp_idx = i, j
+
+    return ''.join(align_ref_parts), ''.join(align_hyp_parts)
+
+"""
+For each row i of the STEP 1 DP matrix of n prompt characters and m transcription characters: the first and last column k
+with score_upper_bound(i, k) + score_upper_bound(n - i, m - k) >= lower_bound. A path through a cell outside these columns
+scores less than lower_bound, so if lower_bound is at most the optimal score, every optimal path lies within them.
+The bound is concave in k, so the columns are found with a binary search on each side of its maximum.
+"""
+def band_limits(n, m, lower_bound, scores):
+
+    i = np.arange(n + 1)
+    def bound(k):
+        return score_upper_bound(i, k, scores) + score_upper_bound(n - i, m - k, scores)
+
+    # The maximum is at one of the breakpoints k = i and k = m - n + i
+    k1, k2 = np.clip(i, 0, m), np.clip(m - n + i, 0, m)
+    peak = np.where(bound(k1) >= bound(k2), k1, k2)
+    assert (bound(peak) >= lower_bound).all(), "The lower bound is higher than the score of any alignment"
+
+    lo, hi = np.zeros(n + 1, dtype=np.int64), peak.copy()
+    while (lo < hi).any():
+        mid = (lo + hi) // 2
+        inside = bound(mid) >= lower_bound
+        lo, hi = np.where(inside, lo, mid + 1), np.where(inside, mid, hi)
+    first = lo
+
+    lo, hi = peak.copy(), np.full(n + 1, m, dtype=np.int64)
+    while (lo < hi).any():
+        mid = (lo + hi + 1) // 2
+        inside = bound(mid) >= lower_bound
+        lo, hi = np.where(inside, mid, lo), np.where(inside, hi, mid - 1)
+
+    return first, lo
+
+"""
+STEP 1 of prompt and asrTrans with alignment_kernel.align_banded, within the band of band_limits with the score of the path through
+the cells (see path_score) as lower bound. This is the same alignment as align_characters_bio (every optimal path lies within the band).
+Returns None if the band has more than BAND_MAX_FRACTION of the cells of the DP matrix, e.g. for a reading with many errors or a
+long hallucinated insertion: then the complete strings have to be aligned.
+"""
+def align_characters_banded(prompt, asrTrans, cells):
+
+    aligner = Align.PairwiseAligner(match_score=1.0)
+    scores = (int(aligner.match_score), int(aligner.mismatch_score), int(aligner.gap_score))
+
+    lo, hi = band_limits(len(prompt), len(asrTrans), int(path_score(aligner, prompt, asrTrans, cells)), scores)
+    if (hi - lo + 1).sum() > BAND_MAX_FRACTION * (len(prompt) + 1) * (len(asrTrans) + 1):
+        return None
+
+    prompt_codes, asrTrans_codes = kernel.encode_characters(prompt, asrTrans)
+    pairs = kernel.align_banded(prompt_codes, asrTrans_codes, lo.tolist(), hi.tolist(), *scores, kernel.PRIORITY_BIO)
+    align_ref, align_hyp = kernel.pairs_to_items(prompt, asrTrans, pairs)
+
+    return ''.join(align_ref), ''.join(align_hyp)
+
+"""
+STEP 1 with the runs of identical words (prompt_start, hyp_start, length) as candidate cuts: split at the word boundaries of the runs
+that every optimal path passes (see certified_cuts). If there are no such cuts, STEP 1 of a long transcription (more than LINEAR_MIN_CELLS
+characters x characters) is done within a band of the DP matrix (see align_characters_banded).
+Returns None if neither can be used: then the complete strings have to be aligned.
+"""
+def align_characters_runs(prompt, asrTrans, prompt_words, hyp_words, runs):
+
+    cells = word_run_cells(prompt, asrTrans, prompt_words, hyp_words, runs)
+    if len(cells) == 0:
+        return None
+
+    cuts = certified_cuts(prompt, asrTrans, cells)
+    if len(cuts) > 0:
+        return align_characters_split(prompt, asrTrans, cuts)
+
+    # The Bio aligner is faster than the band, which replaces the 'linear' engine
+    if select_engine(prompt, asrTrans, 'bio') == 'linear':
+        return align_characters_banded(prompt, asrTrans, cells)
+
+    return None
+
+"""
+STEP 1 of the 'anchored' engine: the anchors (see find_anchors) are candidate cuts, see align_characters_runs.
+Returns None if there are no anchors or none of them can be used.
+"""
+def align_characters_anchored(prompt, asrTrans, prompt_words = None, prompt_ngrams = None):
+
+    if prompt_words is None:
+        prompt_words = prompt.split()
+    hyp_words = asrTrans.split()
+
+    anchors = find_anchors(prompt_words, hyp_words, ANCHOR_NGRAM, prompt_ngrams)
+    return align_characters_runs(prompt, asrTrans, prompt_words, hyp_words, anchors)
+
+"""
+STEP 1 of the 'tiered' engine for a transcription that differs from the prompt: if the word diff (alignment_kernel.diff_sequences)
+has at most TIERED_MAX_EDIT_RATE edits per prompt word, its runs of equal words are candidate cuts, see align_characters_runs.
+Returns None if there are more edits, or none of the runs can be used.
+"""
+def align_characters_tiered(prompt, asrTrans, prompt_words = None):
+
+    if prompt_words is None:
+        prompt_words = prompt.split()
+    hyp_words = asrTrans.split()
+
+    runs = kernel.diff_sequences(prompt_words, hyp_words, max(1, int(TIERED_MAX_EDIT_RATE * len(prompt_words))))
+    if runs is None:
+        return None
+
+    return align_characters_runs(prompt, asrTrans, prompt_words, hyp_words, runs)
+
+def one_way_alignment_modern(prompt, asrTrans, engine = DEFAULT_ENGINE):
+    return one_way_alignment_modern_batch(prompt, [asrTrans], engine)[0]
+
+"""
+one_way_alignment_modern for many transcriptions of the same prompt (e.g. all readings of one story).
+The prompt words and anchor n-grams are prepared once, STEP 3 and 4 of all transcriptions are done in one batch.
+The result for each transcription is the same as the result of one_way_alignment_modern.
+prompt_ngrams: unique_ngrams(prompt.split(), ANCHOR_NGRAM), if already computed (e.g. in the prompt index, see utils/prompt_index.py).
+"""
+def one_way_alignment_modern_batch(prompt, asrTransList, engine = DEFAULT_ENGINE, prompt_ngrams = None):
+    return finish_alignment_batch(*align_characters_batch(prompt, asrTransList, engine, prompt_ngrams))
+
+"""
+STEP 1 of one_way_alignment_modern_batch. Returns the list of (align_ref, align_hyp) alignments, and the list of engines
+with which STEP 3 is done for each alignment.
+"""
+def align_characters_batch(prompt, asrTransList, engine = DEFAULT_ENGINE, prompt_ngrams = None):
+
+    assert engine in ENGINES, "Unknown alignment engine: " + str(engine)
+
+    if engine in ['anchored', 'tiered']:
+        prompt_words = prompt.split()
+    if engine == 'anchored' and prompt_ngrams is None:
+        prompt_ngrams = unique_ngrams(prompt_words, ANCHOR_NGRAM)
+
+    alignments = []
+    engines = []
+    for asrTrans in asrTransList:
+
+        aligned = None
+        asrTrans_engine = engine
+        if engine == 'anchored':
+            aligned = align_characters_anchored(prompt, asrTrans, prompt_words, prompt_ngrams)
+            asrTrans_engine = 'bio'
+        elif engine == 'tiered':
+            aligned = (prompt, asrTrans) if asrTrans == prompt else align_characters_tiered(prompt, asrTrans, prompt_words)
+            asrTrans_engine = 'bio'
+
+        if aligned is None:
+            asrTrans_engine = select_engine(prompt, asrTrans, asrTrans_engine)
+            aligned = align_characters(prompt, asrTrans, asrTrans_engine)
+
+        alignments.append(aligned)
+        engines.append(asrTrans_engine)
+
+    return alignments, engines
+
+"""
+STEP 2-5 of one_way_alignment_modern_batch for the STEP 1 alignments and engines of align_characters_batch.
+"""
+def finish_alignment_batch(alignments, engines):
+
+    # STEP 2-4
+    refined = refine_alignment_batch(alignments, engines)
+
+    # STEP 5
+    return [merge_insertions(*x) for x in refined]
+
+"""
+The STEP 1 alignment of prompt[:prefix_length] and asrTrans, from the STEP 1 alignment (align_ref, align_hyp) of prompt and asrTrans
+with engine 'bio' or 'linear'.
+The DP matrix of the prefix is the top of the DP matrix of the whole prompt, and the traceback from a cell only depends on the cells above
+and left of it. So if the traceback of the whole prompt passes the cell (prefix_length, len(asrTrans)), i.e. the characters after the prefix
+are only aligned with gaps, the alignment of the prefix is the first part of the alignment of the whole prompt.
+Returns None otherwise.
+"""
+def truncate_alignment(align_ref, align_hyp, prefix_length):
+
+    ref_columns = np.flatnonzero(char_codes(align_ref) != ord('-'))
+    if prefix_length >= len(ref_columns):
+        return align_ref, align_hyp
+
+    column = int(ref_columns[prefix_length])
+    if align_hyp[column:].strip('-') != '':
+        return None
+
+    return align_ref[:column], align_hyp[:column]
+
+"""
+one_way_alignment_modern(prompt[:prefix_length], asrTrans, engine) from the STEP 1 alignment aligned of prompt and asrTrans (see align_characters_batch),
+without a new STEP 1 (see truncate_alignment). Returns None if this is not possible: then the prefix has to be aligned again.
+"""
+def one_way_alignment_modern_prefix(prompt, prefix_length, asrTrans, aligned, engine = DEFAULT_ENGINE):
+
+    if engine not in ['bio', 'linear']:
+        return None
+
+    truncated = truncate_alignment(*aligned, prefix_length)
+    if truncated is None:
+        return None
+
+    return finish_alignment_batch([truncated], [select_engine(prompt[:prefix_length], asrTrans, engine)])[0]
+
 def removeInsertionsAsterisk(s):
     return s.replace("*", "")
 
 def trimPipesAndSpaces(s):
     return s.replace("|", " ").strip()
 
-def two_way_alignment_modern(prompt, asrTrans):
+def two_way_alignment_modern(prompt, asrTrans, engine = DEFAULT_ENGINE):
 
     # Forward alignment
-    prompt_align, asrTrans_align = one_way_alignment_modern(prompt, asrTrans)
+    prompt_align, asrTrans_align = one_way_alignment_modern(prompt, asrTrans, engine)
 
     # REversed alignment
     # The reversed alignment part is removed, since this returned exactly the same as the forward alignment.
 
-    align_ref_list, align_hyp_list = split_alignments_in_segments(prompt_align, asrTrans_align)
-    
-    # Create output DataFrame
-    outputDF = pd.DataFrame()
-    outputDF['prompt'] = pd.Series(align_ref_list).apply(removeInsertionsAsterisk).apply(trimPipesAndSpaces)
-    outputDF['aligned_ref'] = pd.Series( align_ref_list).apply(trimPipesAndSpaces)
-    outputDF['aligned_asrTrans'] = pd.Series(align_hyp_list).apply(trimPipesAndSpaces)
-    outputDF['correct'] = outputDF.apply(determineCorrectness, axis=1)
+    return alignment_frame(prompt_align, asrTrans_align)
 
-    return outputDF
+"""
+two_way_alignment_modern for many transcriptions of the same prompt, see one_way_alignment_modern_batch.
+Returns a list with the output DataFrame of each transcription.
+"""
+def two_way_alignment_modern_batch(prompt, asrTransList, engine = DEFAULT_ENGINE, prompt_ngrams = None):
+    return [alignment_frame(prompt_align, asrTrans_align) for prompt_align, asrTrans_align in one_way_alignment_modern_batch(prompt, asrTransList, engine, prompt_ngrams)]
 
+"""
+Output DataFrame with for each prompt word the aligned reference and transcription, and whether it is read correctly.
+"""
+def alignment_frame(prompt_align, asrTrans_align):
 
+    align_ref_list, align_hyp_list = split_alignments_in_segments(prompt_align, asrTrans_align)
+    
+    prompt_list = [trimPipesAndSpaces(removeInsertionsAsterisk(x)) for x in align_ref_list]
+    aligned_asrTrans_list = [trimPipesAndSpaces(x) for x in align_hyp_list]
 
+    # Create output DataFrame
+    return pd.DataFrame({
+        'prompt': prompt_list,
+        'aligned_ref': [trimPipesAndSpaces(x) for x in align_ref_list],
+        'aligned_asrTrans': aligned_asrTrans_list,
+        'correct': [prompt in aligned_asrTrans for prompt, aligned_asrTrans in zip(prompt_list, aligned_asrTrans_list)],
+    })
@@ -0,0 +1,113 @@
+"""
+Decoder backends for utils/whisper_decoding.py.
+
+A backend loads a Whisper model and transcribes an audio array into the whisper-timestamped result format:
+{'text': str, 'segments': [{..., 'words': [{'text', 'start', 'end', 'confidence'}]}], 'language': str}
+The later stages (03-06) only use this word table, so all backends produce it.
+
+Available backends:
+- fp32  whisper-timestamped with the PyTorch fp32 model (the reference).
+- int8  whisper-timestamped with a dynamically quantized model: the weights of all linear layers are stored as int8
+        and the activations are quantized on the fly. This backend runs on the CPU only.
+- speculative
+        whisper-timestamped with the fp32 model, of which the greedy decoding is sped up with a small draft model
+        (see utils/speculative_decoding.py). The word alignment is the default (efficient) approach of whisper-timestamped.
+        The statistics of each decoding (acceptance rate, forward passes) are added to model.decodingStatsLog.
+
+The decoding itself (word timestamps, disfluency detection, VAD) is the same whisper_timestamped.transcribe for all backends.
+Only fp32 gives the reference results; identical is False for the other backends. int8 changes the model, speculative gives the
+word table of fp32 up to floating point rounding: the large model verifies several tokens in one forward pass.
+These backends are not used by the default pipeline (uber.sh), compare them with asr_decoders/whispert_benchmark.py.
+
+loadModel() gets the backend options (e.g. draftModel) as keyword arguments, backends ignore the options they do not use.
+transcribe() gets the story prompt as readingPrompt, also if it is not used as initial prompt; backends may use it as a hint.
+"""
+
+import torch
+import whisper_timestamped as whisper
+
+import utils.speculative_decoding as speculative
+
+"""
+Reference backend: whisper-timestamped on PyTorch.
+"""
+class WhisperTimestampedBackend:
+
+    name = 'fp32'
+    identical = True
+
+    def loadModel(self, modelName, **options):
+        return whisper.load_model(name=modelName)
+
+    def transcribe(self, model, audio, language, detect_disfluencies, vad, initial_prompt, readingPrompt = None):
+        return whisper.transcribe(model, audio, language=language, detect_disfluencies=detect_disfluencies, vad=vad, initial_prompt=initial_prompt)
+
+"""
+whisper-timestamped on a dynamically quantized (int8) model on the CPU.
+"""
+class QuantizedWhisperTimestampedBackend(WhisperTimestampedBackend):
+
+    name = 'int8'
+    identical = False
+
+    def loadModel(self, modelName, **options):
+        model = whisper.load_model(name=modelName, device='cpu')
+        replaceWhisperLinearLayers(model)
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def transcribe(self, model, audio, language, detect_disfluencies, vad, initial_prompt, readingPrompt = None):
+        # fp16 is not available on the CPU
+        return whisper.transcribe(model, audio, language=language, detect_disfluencies=detect_disfluencies, vad=vad, initial_prompt=initial_prompt, fp16=False)
+
+"""
+whisper-timestamped with speculative greedy decoding: a small draft model proposes tokens that the large model verifies.
+
+Options:
+draftModel          name of the draft model (default: base), with the same tokenizer as the large model
+draftLength         number of tokens proposed per forward pass of the large model (default: 8)
+draftPromptBias     added to the draft logit of the next prompt token (default: 0, no bias)
+"""
+class SpeculativeWhisperTimestampedBackend(WhisperTimestampedBackend):
+
+    name = 'speculative'
+    identical = False
+
+    def loadModel(self, modelName, draftModel = speculative.DRAFT_MODEL_NAME, draftLength = speculative.DRAFT_LENGTH, draftPromptBias = 0.0, **options):
+        model = whisper.load_model(name=modelName)
+        print('Load draft model:', draftModel)
+        model.draftModel = whisper.load_model(name=draftModel, device=model.device)
+        model.draftModelName = draftModel
+        model.draftLength = draftLength
+        model.draftPromptBias = draftPromptBias
+        model.decodingStatsLog = []
+        return model
+
+    def transcribe(self, model, audio, language, detect_disfluencies, vad, initial_prompt, readingPrompt = None):
+
+        biasText = readingPrompt if readingPrompt is not None else initial_prompt
+        with speculative.speculativeDecoding(model.draftModel, model.draftLength, model.draftPromptBias, biasText) as stats:
+            result = whisper.transcribe(model, audio, language=language, detect_disfluencies=detect_disfluencies, vad=vad, initial_prompt=initial_prompt)
+
+        model.decodingStatsLog.append({'draftModel': model.draftModelName, **stats})
+        return result
+
+"""
+Whisper uses its own subclass of torch.nn.Linear, which quantize_dynamic does not recognize.
+Replace these layers by plain torch.nn.Linear layers with the same weights (identical output in fp32).
+"""
+def replaceWhisperLinearLayers(module):
+
+    for childName, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            linear = torch.nn.Linear(child.in_features, child.out_features, bias = child.bias is not None)
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, childName, linear)
+        else:
+            replaceWhisperLinearLayers(child)
+
+BACKENDS = {backend.name: backend for backend in [WhisperTimestampedBackend, QuantizedWhisperTimestampedBackend, SpeculativeWhisperTimestampedBackend]}
+
+def getBackend(backendName):
+    assert backendName in BACKENDS, "Unknown backend " + str(backendName) + ", choose from: " + ", ".join(BACKENDS)
+    return BACKENDS[backendName]()
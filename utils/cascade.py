@@ -0,0 +1,73 @@
+"""
+Confidence-gated model cascade for asr_decoders/whispert.py (option --cascadeModel).
+
+Tier 1: all files are decoded with a cheap Whisper model (e.g. tiny or base). The results are kept in
+        <asrDir>/<asrSettings>/json-asr-results-<cascadeModel>, so an interrupted run does not decode them again.
+Gate:   the tier 1 transcription is aligned with the prompt (utils/alignment_modern.two_way_alignment_modern, as in the prompt aligner).
+        The tier 1 result is used if the mean word confidence and the proportion of correctly read prompt words are both
+        at least the thresholds.
+Tier 2: the other files are decoded with large-v2.
+
+For each file, the tier that produced the result is saved in <asrDir>/<asrSettings>/cascade-tiers.tsv.
+The prompt aligner adds this record to sentenceStats.csv.
+"""
+
+import os
+import csv
+import numpy as np
+
+import utils.sclite_string_normalizer as sclite_norm
+import utils.alignment_modern as alignmod
+
+CASCADE_TIERS_FILE = 'cascade-tiers.tsv'
+CASCADE_TIERS_COLUMNS = ['audioID', 'tier', 'model', 'meanConfidence', 'propCorrect']
+
+def tier1OutputFile(outputFile, cascadeModel):
+    outputDir = os.path.dirname(os.path.abspath(outputFile))
+    return os.path.join(os.path.dirname(outputDir), os.path.basename(outputDir) + '-' + cascadeModel, os.path.basename(outputFile))
+
+def cascadeTiersFile(outputFile):
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(outputFile))), CASCADE_TIERS_FILE)
+
+"""
+Mean word confidence (disfluencies [*] excluded) and proportion of correctly read prompt words of an ASR result.
+The prompt and transcription are normalized as in the prompt aligner.
+"""
+def resultQuality(asrResult, promptText):
+
+    words = [word for segment in asrResult['segments'] for word in segment.get('words', []) if word['text'] != '[*]']
+    meanConfidence = float(np.mean([word['confidence'] for word in words])) if len(words) > 0 else 0.0
+
+    prompt = sclite_norm.normalize_string(promptText.replace('\n', ' '), annTags=False, names_as_prompt=False)
+    asrTranscription = sclite_norm.normalize_string(asrResult['text'], names_as_prompt=False)
+
+    if asrTranscription.strip() == '':
+        propCorrect = 0.0
+    else:
+        propCorrect = float(alignmod.two_way_alignment_modern(prompt, asrTranscription)['correct'].mean())
+
+    return {'meanConfidence': round(meanConfidence, 3), 'propCorrect': round(propCorrect, 3)}
+
+def passesGate(quality, minConfidence, minCorrect):
+    return quality['meanConfidence'] >= minConfidence and quality['propCorrect'] >= minCorrect
+
+"""
+Update the cascade-tiers.tsv file with rows (dicts with CASCADE_TIERS_COLUMNS). Rows of files that were decoded before are replaced.
+"""
+def updateCascadeTiers(tiersFile, rows):
+
+    records = {}
+    if os.path.exists(tiersFile):
+        with open(tiersFile, 'r') as f:
+            records = {row['audioID']: row for row in csv.DictReader(f, delimiter='\t')}
+
+    for row in rows:
+        records[row['audioID']] = row
+
+    tmpFile = tiersFile + '.' + str(os.getpid()) + '.tmp'
+    with open(tmpFile, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CASCADE_TIERS_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        for audioID in sorted(records):
+            writer.writerow(records[audioID])
+    os.replace(tmpFile, tiersFile)
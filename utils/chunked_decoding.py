@@ -0,0 +1,171 @@
+"""
+Helper functions for chunked, memory-bounded decoding of long recordings.
+
+The audio is decoded in fixed windows of chunkSec seconds that overlap by overlapSec seconds.
+Only the window that is decoded is read from the audio file (with ffmpeg, like whisper.load_audio).
+The word timestamps of each chunk are shifted to the timebase of the original file.
+Each chunk 'owns' the part of its window up to the middle of the overlaps with its neighbours:
+a word is kept in the chunk that owns the midpoint of the word.
+
+After each chunk, the segments of all finished chunks are saved in a checkpoint file next to the output file
+(<output>.json.chunks, which does not match the *.json pattern of the later stages). An interrupted run resumes from the last completed chunk.
+"""
+
+import os
+import json
+import numpy as np
+from subprocess import run, CalledProcessError
+
+SAMPLE_RATE = 16000
+
+"""
+Read the window [start, start+duration] of an audio file as a mono 16 kHz float32 array.
+This is whisper.load_audio with a seek, so that only the window is kept in memory.
+"""
+def loadAudioWindow(audioFile, start, duration, sr = SAMPLE_RATE):
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-threads", "0",
+        "-ss", str(start),
+        "-t", str(duration),
+        "-i", audioFile,
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(sr),
+        "-"
+    ]
+    try:
+        out = run(cmd, capture_output=True, check=True).stdout
+    except CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+def getAudioDuration(audioFile):
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", audioFile]
+    out = run(cmd, capture_output=True, check=True).stdout
+    return float(out.decode().strip())
+
+"""
+Split [offset, offset+duration] in overlapping chunks.
+Returns a list of dicts with the window (start, end) and the owned part (ownStart, ownEnd) of each chunk.
+"""
+def planChunks(duration, chunkSec, overlapSec, offset = 0.0):
+
+    assert chunkSec > overlapSec, "chunkSec should be larger than overlapSec"
+
+    chunks = []
+    start = 0.0
+    while True:
+        end = min(start + chunkSec, duration)
+        chunks.append({'index': len(chunks), 'start': round(start, 3), 'end': round(end, 3)})
+        if end >= duration:
+            break
+        start += chunkSec - overlapSec
+
+    for idx, chunk in enumerate(chunks):
+        chunk['ownStart'] = 0.0 if idx == 0 else round(chunk['start'] + overlapSec / 2, 3)
+        chunk['ownEnd'] = duration if idx == len(chunks)-1 else round(chunks[idx+1]['start'] + overlapSec / 2, 3)
+
+    if offset != 0:
+        for chunk in chunks:
+            for key in ['start', 'end', 'ownStart', 'ownEnd']:
+                chunk[key] = round(chunk[key] + offset, 3)
+
+    return chunks
+
+"""
+Shift all segment and word timestamps of a whisper-timestamped result by offset seconds.
+"""
+def shiftResultTimestamps(result, offset):
+
+    if offset == 0:
+        return result
+
+    for segment in result['segments']:
+        segment['start'] = round(segment['start'] + offset, 2)
+        segment['end'] = round(segment['end'] + offset, 2)
+        for word in segment.get('words', []):
+            word['start'] = round(word['start'] + offset, 2)
+            word['end'] = round(word['end'] + offset, 2)
+
+    return result
+
+"""
+Only keep the words of which the midpoint lies in [ownStart, ownEnd).
+Segments of which some words are removed get new start, end and text; segments without words are removed.
+"""
+def keepOwnedWords(segments, ownStart, ownEnd):
+
+    ownedSegments = []
+    for segment in segments:
+        words = segment.get('words', [])
+        ownedWords = [word for word in words if ownStart <= (word['start'] + word['end']) / 2 < ownEnd]
+
+        if len(ownedWords) == 0:
+            continue
+
+        if len(ownedWords) != len(words):
+            segment = dict(segment)
+            segment['words'] = ownedWords
+            segment['start'] = ownedWords[0]['start']
+            segment['end'] = ownedWords[-1]['end']
+            segment['text'] = ' ' + ' '.join([word['text'] for word in ownedWords])
+
+        ownedSegments.append(segment)
+
+    return ownedSegments
+
+"""
+Combine the owned segments of all chunks into one result with the same schema as whisper_timestamped.transcribe.
+"""
+def stitchChunks(chunkResults):
+
+    segments = []
+    for chunkResult in chunkResults:
+        for segment in chunkResult['segments']:
+            segment = dict(segment)
+            segment['id'] = len(segments)
+            segments.append(segment)
+
+    language = chunkResults[0]['language'] if len(chunkResults) > 0 else None
+
+    return {'text': ''.join([segment['text'] for segment in segments]), 'segments': segments, 'language': language}
+
+"""
+Checkpoint file with the owned segments of each finished chunk of one output file.
+The checkpoint is only reused if it was made with the same chunk parameters.
+"""
+class ChunkCheckpoint:
+
+    def __init__(self, outputFile, params):
+        self.path = outputFile + '.chunks'
+        self.params = params
+        self.chunks = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                checkpoint = json.load(f)
+            if checkpoint['params'] == params:
+                self.chunks = {int(idx): chunkResult for idx, chunkResult in checkpoint['chunks'].items()}
+
+    def isDone(self, chunkIdx):
+        return chunkIdx in self.chunks
+
+    def add(self, chunkIdx, chunkResult):
+        self.chunks[chunkIdx] = chunkResult
+
+        tmpPath = self.path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpPath, 'w') as f:
+            f.write(json.dumps({'params': self.params, 'chunks': self.chunks}, ensure_ascii = False))
+        os.replace(tmpPath, self.path)
+
+    def results(self):
+        return [self.chunks[idx] for idx in sorted(self.chunks)]
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,129 @@
+"""
+Content-addressed on-disk cache of Whisper decoding results.
+
+A result is stored under a key that is computed from:
+- the content of the audio file (sha256), so a re-cut recording gets a new key and a copy of
+  the same recording in another dataset directory gets the same key;
+- the model name and language;
+- the decoding options detect_disfluencies and vad;
+- the initial prompt (sha256), or None if no prompt is used.
+
+Layout: <cacheDir>/<key[:2]>/<key>.json
+The cache is bounded in size: if it grows above maxBytes, the least recently used results are removed.
+Each hit updates the modification time of the file, which is used as the LRU order.
+Several processes can share one cache dir: files are written to a temporary file and renamed.
+"""
+
+import os
+import json
+import glob
+import hashlib
+
+CACHE_VERSION = 1
+
+"""
+sha256 of the content of a file, read in blocks of 1 MB.
+"""
+def hashFile(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def hashString(s):
+    if s is None:
+        return None
+    return hashlib.sha256(s.encode('utf-8')).hexdigest()
+
+class DecodeCache:
+
+    def __init__(self, cacheDir, maxBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.audioHashes = {}
+
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir, exist_ok=True)
+
+        self.totalBytes = sum(os.path.getsize(path) for path in self.listEntries())
+
+    def listEntries(self):
+        return glob.glob(os.path.join(self.cacheDir, '*', '*.json'))
+
+    """
+    Compute the cache key of one decoding. The hash of each audio file is computed only once per process.
+    extras: dict with other decoding options that change the result, or None.
+    """
+    def key(self, audioFile, modelName, language, detect_disfluencies, vad, initialPrompt, extras = None):
+
+        audioFile = os.path.abspath(audioFile)
+        stat = os.stat(audioFile)
+        statKey = (audioFile, stat.st_size, stat.st_mtime_ns)
+        if statKey not in self.audioHashes:
+            self.audioHashes[statKey] = hashFile(audioFile)
+
+        keyFields = [CACHE_VERSION, self.audioHashes[statKey], modelName, language, detect_disfluencies, vad, hashString(initialPrompt)]
+
+        # Other options that change the result (e.g. chunked decoding) are only added if they are used,
+        # so the keys of plain decoding stay the same
+        if extras is not None:
+            keyFields.append(extras)
+        return hashlib.sha256(json.dumps(keyFields, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cacheDir, key[:2], key + '.json')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'r') as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return result
+
+    def put(self, key, result):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmpPath = path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpPath, 'w') as f:
+            f.write(json.dumps(result, ensure_ascii = False))
+        os.replace(tmpPath, path)
+
+        self.totalBytes += os.path.getsize(path)
+        if self.totalBytes > self.maxBytes:
+            self.evict()
+
+    """
+    Remove least recently used results until the cache is below maxBytes.
+    The sizes are recomputed from disk, since other processes may use the same cache dir.
+    """
+    def evict(self):
+
+        entries = []
+        for path in self.listEntries():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                pass
+
+        self.totalBytes = sum(entry[1] for entry in entries)
+
+        for mtime, size, path in sorted(entries):
+            if self.totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.totalBytes -= size
@@ -0,0 +1,162 @@
+"""
+Compiled prompt index of a task (story), built once and stored in an index dir that is shared by all runs of the prompt aligner.
+
+The prompt aligner needs the normalized prompt of a task and the prompt IDs of its words. These are the same for all
+recordings of the task, so they are parsed once (<task>.prompt with sclite_norm.normalize_string, <task>-wordIDX.csv)
+and saved in <indexDir>/<task>.promptidx.npz with:
+- prompt            the normalized prompt
+- words             the words of the normalized prompt
+- promptIDs         the prompt IDs of the words (<sentence_nr>-<word_nr>-<prompt>)
+- sentenceNrs       the sentence number of each prompt ID
+- sentenceStarts    the index of the first word of each sentence
+- charStarts        the character offset of each word in prompt, charEnds the offset after each word
+- anchorStarts      the word index of each word n-gram (n = anchorNgram) that occurs once in the prompt (anchors of the 'anchored' alignment engine)
+- the prompt dir, and the modification time and sha256 of both prompt files
+
+The prompt dir is only read: indexDir is a separate dir, e.g. <asrDir>/prompt-index for the runs of all ASR settings (see uber.sh).
+An index file is used if the prompt files are in the same dir and have the same modification time, or else the same content (sha256),
+as when it was built. Otherwise it is built again. Without indexDir, or if indexDir is not writable, the index is only kept in memory.
+
+Used by asr_prompt_aligners/stories-align-prompt-whispert-confStartEnd.py (option --promptIndexDir). 05_accuracy_scores.py and
+06_inter-intra-pauses.py do not read the prompt files: they only use the prompt IDs in the output of the aligner, which contain the sentence number.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+import utils.sclite_string_normalizer as sclite_norm
+import utils.alignment_modern as alignmod
+from utils.decode_cache import hashFile
+
+INDEX_VERSION = 2
+PROMPT_INDEX_EXTENSION = '.promptidx.npz'
+
+def promptFiles(promptDir, task):
+    return os.path.join(promptDir, task + '.prompt'), os.path.join(promptDir, task + '-wordIDX.csv')
+
+def promptIndexPath(indexDir, task):
+    return os.path.join(indexDir, task + PROMPT_INDEX_EXTENSION)
+
+"""
+Parse the prompt files of a task. Returns the index as a dict (see above).
+"""
+def buildPromptIndex(promptDir, task):
+
+    promptFile, promptIdxFile = promptFiles(promptDir, task)
+
+    with open(promptFile, 'r') as f:
+        promptRaw = f.read().replace('\n', ' ')
+    prompt = sclite_norm.normalize_string(promptRaw, annTags=False, names_as_prompt=False)
+    words = prompt.split()
+
+    promptIDs = [str(promptID) for promptID in pd.read_csv(promptIdxFile)['prompt_id']]
+    sentenceNrs = np.array([int(promptID.split('-')[0]) for promptID in promptIDs], dtype=np.int64)
+
+    charStarts = []
+    offset = 0
+    for word in words:
+        offset = prompt.index(word, offset)
+        charStarts.append(offset)
+        offset += len(word)
+
+    return {
+        'prompt': prompt,
+        'words': words,
+        'promptIDs': promptIDs,
+        'sentenceNrs': sentenceNrs,
+        'sentenceStarts': np.flatnonzero(np.r_[True, sentenceNrs[1:] != sentenceNrs[:-1]]) if len(sentenceNrs) > 0 else np.zeros(0, dtype=np.int64),
+        'charStarts': np.array(charStarts, dtype=np.int64),
+        'charEnds': np.array(charStarts, dtype=np.int64) + np.array([len(word) for word in words], dtype=np.int64),
+        'anchorNgram': alignmod.ANCHOR_NGRAM,
+        'anchorNgrams': alignmod.unique_ngrams(words, alignmod.ANCHOR_NGRAM),
+    }
+
+"""
+Prompt dir, modification times and sha256 of the prompt files, to check whether an index file is up-to-date.
+"""
+def promptFilesStamp(promptDir, task, withHashes = True):
+    stamp = {'promptDir': os.path.abspath(promptDir)}
+    for name, path in zip(['prompt', 'wordIDX'], promptFiles(promptDir, task)):
+        stamp[name + 'Mtime'] = os.stat(path).st_mtime_ns
+        if withHashes:
+            stamp[name + 'Hash'] = hashFile(path)
+    return stamp
+
+"""
+Save the index of a task. The file is written to a temporary file first and then renamed.
+"""
+def savePromptIndex(indexDir, task, index, stamp):
+    os.makedirs(indexDir, exist_ok=True)
+    path = promptIndexPath(indexDir, task)
+    tmpPath = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmpPath, 'wb') as f:
+        np.savez(f, version=INDEX_VERSION, prompt=index['prompt'], words=np.array(index['words'], dtype=str),
+                 promptIDs=np.array(index['promptIDs'], dtype=str), sentenceNrs=index['sentenceNrs'], sentenceStarts=index['sentenceStarts'],
+                 charStarts=index['charStarts'], charEnds=index['charEnds'], anchorNgram=index['anchorNgram'],
+                 anchorStarts=np.array(sorted(index['anchorNgrams'].values()), dtype=np.int64), **stamp)
+    os.replace(tmpPath, path)
+
+def trySavePromptIndex(indexDir, task, index, stamp):
+    try:
+        savePromptIndex(indexDir, task, index, stamp)
+    except OSError as error:
+        print('Prompt index not saved:', promptIndexPath(indexDir, task), error)
+
+"""
+Read the index file of a task in indexDir. Returns the index, or None if there is no (up-to-date) index file.
+"""
+def loadPromptIndex(promptDir, task, indexDir):
+    path = promptIndexPath(indexDir, task)
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path) as data:
+        if int(data['version']) != INDEX_VERSION or int(data['anchorNgram']) != alignmod.ANCHOR_NGRAM:
+            return None
+
+        stamp = promptFilesStamp(promptDir, task, withHashes = False)
+        touched = str(data['promptDir']) != stamp['promptDir'] or any(int(data[key]) != value for key, value in stamp.items() if key.endswith('Mtime'))
+        if touched:
+            stamp = promptFilesStamp(promptDir, task)
+            if any(str(data[key]) != value for key, value in stamp.items() if key.endswith('Hash')):
+                return None
+
+        words = data['words'].tolist()
+        n = int(data['anchorNgram'])
+        index = {
+            'prompt': str(data['prompt']),
+            'words': words,
+            'promptIDs': data['promptIDs'].tolist(),
+            'sentenceNrs': data['sentenceNrs'],
+            'sentenceStarts': data['sentenceStarts'],
+            'charStarts': data['charStarts'],
+            'charEnds': data['charEnds'],
+            'anchorNgram': n,
+            'anchorNgrams': {tuple(words[idx:idx+n]): idx for idx in data['anchorStarts'].tolist()},
+        }
+
+    # Same content with a new modification time or in another dir (e.g. a copy): save the new stamp, so the files are not hashed again
+    if touched:
+        trySavePromptIndex(indexDir, task, index, stamp)
+
+    return index
+
+"""
+The index of a task: read from the index file in indexDir if it is up-to-date, else built and saved in indexDir.
+Without indexDir, the index is built and not saved.
+"""
+def getPromptIndex(promptDir, task, indexDir = None):
+
+    if indexDir is None:
+        return buildPromptIndex(promptDir, task)
+
+    index = loadPromptIndex(promptDir, task, indexDir)
+    if index is not None:
+        return index
+
+    stamp = promptFilesStamp(promptDir, task)
+    index = buildPromptIndex(promptDir, task)
+    trySavePromptIndex(indexDir, task, index, stamp)
+
+    return index
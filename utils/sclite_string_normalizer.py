@@ -1,6 +1,9 @@
 from num2words import num2words
 import re
+import functools
 import unidecode
+import numpy as np
+import pandas as pd
 
 personal_names_dict = {
     # incorrect version : # correct version
@@ -50,20 +53,35 @@ spelling_variants_dict = {
 }
 
 
+possessive_pronouns_dict = {
+    'zn': 'zijn',
+    'z\'n': 'zijn',
+    'mn': 'mijn',
+    'm\'n': 'mijn',
+}
+
+# One lexicon for write_names_as_prompt_and_correct_spelling_variants: personal names first, then spelling variants, then speaker sounds
+names_and_variants_dict = {**speaker_sounds_dict, **spelling_variants_dict, **personal_names_dict}
+
+ALL_PUNCT = '''!()[]{};:'"\\,<>./???@#$%^&*_‘~’'''
+# onlyKeepOrthTransPunct: " ‘ ’ ` are first replaced with ', which is then removed
+BASIC_PUNCT = '''!-'.?"‘’`'''
+APOSTROPHES = '''"‘’`'''
+
+ALL_PUNCT_TABLE = str.maketrans('', '', ALL_PUNCT)
+BASIC_PUNCT_TABLE = str.maketrans('', '', BASIC_PUNCT)
+APOSTROPHE_TABLE = str.maketrans(APOSTROPHES, "'" * len(APOSTROPHES))
+
+# Strings that num2words (decimal.Decimal) can convert contain a digit, or are infinity or nan
+NUMBER_CANDIDATE = re.compile(r'\d|inf|nan', re.IGNORECASE)
+
+NORMALIZER_CACHE_SIZE = 65536
+
 def write_names_as_prompt_and_correct_spelling_variants(word):
-    if word in list(personal_names_dict.keys()):
-        return personal_names_dict[word]
-    
-    if word in list(spelling_variants_dict.keys()):
-        return spelling_variants_dict[word] 
-
-    if word in list(speaker_sounds_dict.keys()):
-        return speaker_sounds_dict[word] 
-    
-    return word
+    return names_and_variants_dict.get(word, word)
 
 def normalize_spellings_with_dashes(word):
-    if word in list(spelling_variants_with_dashes_dict.keys()):
+    if word in spelling_variants_with_dashes_dict:
         return spelling_variants_with_dashes_dict[word]
     else:
         return word.replace('-', ' ')
@@ -74,16 +92,13 @@ Replace " ‘ ’ ` with '
 Only keep . ! ? ' - 
 """
 def normalizeApostrophe(s):
-    return "".join(['\'' if letter in '\'"‘’`' else letter for letter in s])
+    return s.translate(APOSTROPHE_TABLE)
 
 def onlyKeepOrthTransPunct(s):
-    s = normalizeApostrophe(s)
-    return "".join(['' if letter in '''!-'.?''' else letter for letter in s])
+    return s.translate(BASIC_PUNCT_TABLE)
 
 def removeAllPunctuation(s):
-    punc = '''!()[]{};:'"\,<>./???@#$%^&*_‘~’'''
-    # s = s.replace('-', ' ')
-    return "".join([letter for letter in s if letter not in punc])
+    return s.translate(ALL_PUNCT_TABLE)
 
 def removeAnnotations(ot):
 
@@ -91,11 +106,7 @@ def removeAnnotations(ot):
     return re.sub('(\*[a-z]){1}', '', ot)
 
 def normalizePossessivePronouns(word):
-    if word in ['zn', 'z\'n']:
-        return 'zijn'
-    elif word in ['mn', 'm\'n']:
-        return 'mijn'
-    return word
+    return possessive_pronouns_dict.get(word, word)
 
 def correctApostropheSpellingErrorAsrTranscript(word):
     # If word starts with s'
@@ -107,49 +118,107 @@ def correctApostropheSpellingErrorAsrTranscript(word):
 
 
 """
-Function to normalize a string
+String normalizer for one set of options (see normalize_string), built once with get_normalizer.
+The words of a sentence are normalized independently of each other, so the normalized form of each word is kept in an LRU cache
+(cache_size words). unidecode replaces each character on its own, so it is also done per word.
 """
-def normalize_string(sentence: str = '', all_punct: bool = True, basic_punct: bool=False, lower: bool = True, accents: bool = True, number_to_letter : bool = True, names_as_prompt: bool = True, poss_pro: bool = True, annTags: bool = False, apostrophe_spelling_error:bool = True):
-    if annTags:
-        sentence = removeAnnotations(sentence)
-
-    if lower:
-        sentence = sentence.lower()
-
-    normalized_word_list = []
-    for word in sentence.split(' '):
+class StringNormalizer:
+
+    def __init__(self, all_punct: bool = True, basic_punct: bool = False, lower: bool = True, accents: bool = True, number_to_letter: bool = True, names_as_prompt: bool = True, poss_pro: bool = True, annTags: bool = False, apostrophe_spelling_error: bool = True, cache_size: int = NORMALIZER_CACHE_SIZE):
+        self.all_punct = all_punct
+        self.basic_punct = basic_punct
+        self.lower = lower
+        self.accents = accents
+        self.number_to_letter = number_to_letter
+        self.names_as_prompt = names_as_prompt
+        self.poss_pro = poss_pro
+        self.annTags = annTags
+        self.apostrophe_spelling_error = apostrophe_spelling_error
+
+        self.normalize_word = functools.lru_cache(maxsize=cache_size)(self.normalize_word_uncached)
+
+    """
+    Normalized form of one word of a sentence (after removeAnnotations and lower), without spaces around it.
+    """
+    def normalize_word_uncached(self, word):
 
         word = normalize_spellings_with_dashes(word)
 
-        if apostrophe_spelling_error:
+        if self.apostrophe_spelling_error:
             word = correctApostropheSpellingErrorAsrTranscript(word)
 
-        if all_punct:
-            word = removeAllPunctuation(word)
-            
-        if basic_punct:
-            word = onlyKeepOrthTransPunct(word)
+        if self.all_punct:
+            word = word.translate(ALL_PUNCT_TABLE)
+
+        if self.basic_punct:
+            word = word.translate(BASIC_PUNCT_TABLE)
 
-        if number_to_letter:
+        if self.number_to_letter and NUMBER_CANDIDATE.search(word):
             try:
                 word = num2words(word.strip(), lang='nl')
             except:
                 word = word
 
-        if names_as_prompt:
-            word = write_names_as_prompt_and_correct_spelling_variants(word)
+        if self.names_as_prompt:
+            word = names_and_variants_dict.get(word, word)
+
+        if self.poss_pro:
+            word = possessive_pronouns_dict.get(word, word)
+
+        word = word.strip()
+
+        if self.accents:
+            word = unidecode.unidecode(word)
+
+        return word
+
+    def normalize(self, sentence: str = ''):
+        if self.annTags:
+            sentence = removeAnnotations(sentence)
+
+        if self.lower:
+            sentence = sentence.lower()
+
+        return " ".join([self.normalize_word(word) for word in sentence.split(' ')]).strip()
+
+"""
+The StringNormalizer of a set of options, made once per set of options.
+"""
+@functools.lru_cache(maxsize=None)
+def get_normalizer(all_punct: bool = True, basic_punct: bool = False, lower: bool = True, accents: bool = True, number_to_letter: bool = True, names_as_prompt: bool = True, poss_pro: bool = True, annTags: bool = False, apostrophe_spelling_error: bool = True):
+    return StringNormalizer(all_punct, basic_punct, lower, accents, number_to_letter, names_as_prompt, poss_pro, annTags, apostrophe_spelling_error)
+
+"""
+Function to normalize a string
+"""
+def normalize_string(sentence: str = '', all_punct: bool = True, basic_punct: bool=False, lower: bool = True, accents: bool = True, number_to_letter : bool = True, names_as_prompt: bool = True, poss_pro: bool = True, annTags: bool = False, apostrophe_spelling_error:bool = True):
+    return get_normalizer(all_punct, basic_punct, lower, accents, number_to_letter, names_as_prompt, poss_pro, annTags, apostrophe_spelling_error).normalize(sentence)
+
+"""
+normalize_string for many tokens (e.g. all words of the ASR results), with the same options.
+tokens: list, NumPy array or pandas Series of strings. The tokens are reduced to a vocabulary of unique tokens (pandas.factorize),
+each unique token is normalized once and the results are mapped back with the integer codes, so the cost depends on the size
+of the vocabulary instead of the number of tokens. Missing values (None, NaN) stay missing.
+Returns the normalized tokens as a list, NumPy array or pandas Series (with the index of tokens), as tokens.
+
+Example:
+df['text_norm'] = normalize_tokens(df['text'], names_as_prompt = False)
+"""
+def normalize_tokens(tokens, **options):
 
-        if poss_pro:
-            word = normalizePossessivePronouns(word)
+    normalizer = get_normalizer(**options)
 
-        normalized_word_list.append(word)
+    codes, vocabulary = pd.factorize(pd.Series(tokens, dtype=object) if not isinstance(tokens, pd.Series) else tokens)
 
-    new_sentence = " ".join([x.strip() for x in normalized_word_list])
+    # Code -1 (missing value) selects the last item
+    normalized_vocabulary = np.array([normalizer.normalize(token) for token in vocabulary] + [None], dtype=object)
+    normalized = normalized_vocabulary[codes]
 
-    if accents:
-        new_sentence = unidecode.unidecode(new_sentence)
-    
-    return new_sentence.strip()
+    if isinstance(tokens, pd.Series):
+        return pd.Series(normalized, index=tokens.index, name=tokens.name).where(tokens.notna())
+    if isinstance(tokens, np.ndarray):
+        return normalized
+    return normalized.tolist()
 
 # normalized_string = normalize_string('Hallo! Ik*u ben van-vandaag hier*a met 50 en 1 persoon, waaronder m\'n Cas en Lucas. Hoe is \'t?', True, False, True, True, True, True, True, True)
 # print('\n', normalized_string)
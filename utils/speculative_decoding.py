@@ -0,0 +1,308 @@
+"""
+Speculative greedy decoding for Whisper.
+
+A small draft model (e.g. tiny or base) proposes a run of draftLength tokens, which the large model verifies in one forward pass.
+For each position of the run, the logit filters and the greedy decoder of the large model are applied exactly as in
+whisper.decoding.DecodingTask._main_loop. The first token of the run on which the large model disagrees is replaced by the token
+of the large model, and the rest of the run is discarded. The tokens are therefore the tokens of plain greedy decoding with the
+large model, only the number of sequential forward passes of the large model is smaller.
+(Up to floating point: one forward pass over several tokens may round differently than several passes over one token.)
+
+Optionally, the draft model is biased toward the text that is read (the story prompt): the token that follows the last
+generated tokens in the prompt gets promptBias added to its draft logit. This only changes the proposals, not the output.
+
+Speculative decoding is only used for greedy decoding (temperature 0, no beam search) of one segment at a time,
+other decoding tasks fall back to the standard DecodingTask.
+
+Usage:
+with speculativeDecoding(draftModel, draftLength, promptBias, biasText) as stats:
+    whisper_timestamped.transcribe(model, audio, ...)
+The (default) efficient approach of whisper_timestamped reads the tokens, cross-attention weights and logits of the large model with
+forward hooks, which expect one forward pass per token. The verification pass therefore runs with these hooks suspended, after which
+they are called for each accepted position of the run, one position at a time (see DecoderHookReplay). The word timestamps and
+confidences are computed as for plain greedy decoding with the large model, up to the same floating point rounding.
+"""
+
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import torch
+import whisper.decoding as whisperDecoding
+import whisper.model as whisperModel
+
+DRAFT_MODEL_NAME = "base"
+DRAFT_LENGTH = 8
+
+"""
+Causal attention mask for n new tokens at positions offset, ..., offset+n-1 that attend to the offset tokens in the KV cache and to each other.
+whisper.model.MultiHeadAttention slices the mask with mask[:n_ctx, :n_ctx], which only works without KV cache or for one new token:
+this object returns the complete (n, offset+n) mask for any slice.
+"""
+class OffsetCausalMask:
+
+    def __init__(self, offset, n, device):
+        self.mask = torch.empty(n, offset + n, device=device).fill_(-np.inf).triu_(offset + 1)
+
+    def __getitem__(self, index):
+        return self.mask
+
+"""
+whisper.model.TextDecoder.forward for tokens at positions offset, ..., offset+n-1, of which the keys and values of the first offset positions are in kvCache.
+"""
+def decoderForward(decoder, tokens, audioFeatures, kvCache, offset):
+
+    n = tokens.shape[-1]
+    x = decoder.token_embedding(tokens) + decoder.positional_embedding[offset : offset + n]
+    x = x.to(audioFeatures.dtype)
+
+    mask = OffsetCausalMask(offset, n, x.device)
+    for block in decoder.blocks:
+        x = block(x, audioFeatures, mask=mask, kv_cache=kvCache)
+
+    x = decoder.ln(x)
+    return (x @ torch.transpose(decoder.token_embedding.weight.to(x.dtype), 0, 1)).float()
+
+def selfAttentionModules(model):
+    return [block.attn.key for block in model.decoder.blocks] + [block.attn.value for block in model.decoder.blocks]
+
+"""
+Roll the self-attention KV cache back to the first length positions. The cross-attention cache does not depend on the tokens.
+"""
+def truncateKVCache(kvCache, modules, length):
+    for module in modules:
+        if module in kvCache:
+            kvCache[module] = kvCache[module][:, :length]
+
+"""
+For n = 1, 2, 3: the tokens that follow each n-gram of the prompt tokens.
+"""
+def buildPromptNgrams(promptTokens, maxN = 3):
+    ngrams = {}
+    for n in range(1, maxN + 1):
+        for i in range(len(promptTokens) - n):
+            ngrams.setdefault(tuple(promptTokens[i:i+n]), set()).add(promptTokens[i+n])
+    return ngrams
+
+"""
+Slice the positions start, ..., end-1 out of a tensor of tokens (batch, n), of hidden states (batch, n, d) or of
+attention weights (batch, heads, n, ctx), or out of a tuple of these.
+"""
+def slicePositions(value, start, end):
+    if isinstance(value, tuple):
+        return tuple(slicePositions(v, start, end) for v in value)
+    if not isinstance(value, torch.Tensor):
+        return value
+    return value[:, start:end] if value.dim() == 2 else value[..., start:end, :]
+
+"""
+Forward hooks of the token embedding, the cross-attention layers and the final layer norm of a decoder, for a forward pass over
+several tokens. Within suspend(), the hooks are not called; the inputs and outputs of these modules are recorded instead.
+replay(start, end) then calls the hooks with the positions start, ..., end-1 of the recorded pass, in the order of a forward pass.
+Only the first input (the tokens or the hidden states) is sliced, the other inputs (e.g. the audio features) are passed as they are.
+"""
+class DecoderHookReplay:
+
+    def __init__(self, decoder):
+        self.modules = [decoder.token_embedding] + [block.cross_attn for block in decoder.blocks] + [decoder.ln]
+        self.hooks = {module: module._forward_hooks for module in self.modules}
+        self.recorded = {}
+
+    def hasHooks(self):
+        return any(len(hooks) > 0 for hooks in self.hooks.values())
+
+    def record(self, module, inputs, outputs):
+        self.recorded[module] = (inputs, outputs)
+
+    @contextmanager
+    def suspend(self):
+        for module in self.modules:
+            module._forward_hooks = OrderedDict()
+            module.register_forward_hook(self.record)
+        try:
+            yield
+        finally:
+            for module in self.modules:
+                module._forward_hooks = self.hooks[module]
+
+    def replay(self, start, end):
+        for module in self.modules:
+            inputs, outputs = self.recorded[module]
+            inputs = (slicePositions(inputs[0], start, end),) + tuple(inputs[1:])
+            outputs = slicePositions(outputs, start, end)
+            for hook in list(self.hooks[module].values()):
+                hook(module, inputs, outputs)
+
+def newStats():
+    return {'tokens': 0, 'targetPasses': 0, 'draftPasses': 0, 'proposed': 0, 'accepted': 0}
+
+class SpeculativeDecodingTask(whisperDecoding.DecodingTask):
+
+    def __init__(self, model, options, draftModel = None, draftLength = DRAFT_LENGTH, promptBias = 0.0, biasText = None, stats = None):
+        super().__init__(model, options)
+        self.draftModel = draftModel
+        self.draftLength = draftLength
+        self.promptBias = promptBias
+        self.stats = stats if stats is not None else newStats()
+
+        self.promptNgrams = {}
+        if promptBias != 0 and biasText is not None:
+            self.promptNgrams = buildPromptNgrams(self.tokenizer.encode(' ' + biasText.strip()))
+
+    def run(self, mel):
+        self.mel = mel
+        return super().run(mel)
+
+    """
+    Speculative decoding is only possible for greedy decoding of one sequence, with a draft model with the same vocabulary.
+    """
+    def isSpeculative(self, tokens):
+        return (self.draftModel is not None
+                and isinstance(self.decoder, whisperDecoding.GreedyDecoder) and self.decoder.temperature == 0
+                and tokens.shape[0] == 1
+                and self.draftModel.dims.n_vocab == self.model.dims.n_vocab
+                and self.mel.shape[-2:] != (self.model.dims.n_audio_ctx, self.model.dims.n_audio_state))
+
+    """
+    Add promptBias to the draft logits of the tokens that follow the last generated text tokens in the prompt.
+    """
+    def applyPromptBias(self, logits, tokens):
+
+        if len(self.promptNgrams) == 0:
+            return
+
+        textTokens = [token for token in tokens[0, self.sample_begin:].tolist() if token < self.tokenizer.eot]
+        for n in [3, 2, 1]:
+            if len(textTokens) >= n and tuple(textTokens[-n:]) in self.promptNgrams:
+                logits[0, list(self.promptNgrams[tuple(textTokens[-n:])])] += self.promptBias
+                return
+
+    def _main_loop(self, audio_features, tokens):
+
+        if not self.isSpeculative(tokens):
+            return super()._main_loop(audio_features, tokens)
+
+        sum_logprobs = torch.zeros(1, device=audio_features.device)
+        no_speech_probs = [np.nan]
+
+        draftAudioFeatures = self.draftModel.embed_audio(self.mel)
+
+        targetCache, targetHooks = self.model.install_kv_cache_hooks()
+        draftCache, draftHooks = self.draftModel.install_kv_cache_hooks()
+        targetModules = selfAttentionModules(self.model)
+        draftModules = selfAttentionModules(self.draftModel)
+        hookReplay = DecoderHookReplay(self.model.decoder)
+
+        # Number of tokens of which the keys and values are in the cache of the target and draft model
+        targetLength = 0
+        draftLength = 0
+        nGenerated = 0
+        done = False
+
+        try:
+            while not done:
+                n = tokens.shape[-1]
+
+                # 1. The draft model proposes a run of tokens, within the limits of the main loop of whisper
+                maxDrafts = min(self.draftLength, self.sample_len - nGenerated - 1, self.n_ctx - n)
+                drafts = []
+                draftTokens = tokens
+                while len(drafts) < maxDrafts:
+                    logits = decoderForward(self.draftModel.decoder, draftTokens[:, draftLength:], draftAudioFeatures, draftCache, draftLength)[:, -1]
+                    draftLength = draftTokens.shape[-1]
+                    self.stats['draftPasses'] += 1
+
+                    self.applyPromptBias(logits, draftTokens)
+                    for logit_filter in self.logit_filters:
+                        logit_filter.apply(logits, draftTokens)
+
+                    nextToken = logits.argmax(dim=-1)
+                    drafts.append(int(nextToken[0]))
+                    draftTokens = torch.cat([draftTokens, nextToken[:, None]], dim=-1)
+                    if drafts[-1] == self.tokenizer.eot:
+                        break
+
+                # 2. The target model computes the logits of all positions of the run in one forward pass
+                verifyTokens = torch.cat([tokens[:, targetLength:], torch.tensor([drafts], dtype=tokens.dtype, device=tokens.device)], dim=-1)
+                if hookReplay.hasHooks():
+                    with hookReplay.suspend():
+                        logits = decoderForward(self.model.decoder, verifyTokens, audio_features, targetCache, targetLength)
+                else:
+                    logits = decoderForward(self.model.decoder, verifyTokens, audio_features, targetCache, targetLength)
+                self.stats['targetPasses'] += 1
+
+                if targetLength == 0 and self.tokenizer.no_speech is not None:  # save no_speech_probs
+                    probs_at_sot = logits[:, self.sot_index].float().softmax(dim=-1)
+                    no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
+
+                firstIdx = n - 1 - targetLength
+                targetLength = n + len(drafts)
+
+                # 3. Greedy decoding with the logits of the target model, as long as it agrees with the draft
+                nAccepted = 0
+                nUpdates = 0
+                for j in range(len(drafts) + 1):
+                    stepLogits = logits[:, firstIdx + j]
+                    for logit_filter in self.logit_filters:
+                        logit_filter.apply(stepLogits, tokens)
+
+                    tokens, completed = self.decoder.update(tokens, stepLogits, sum_logprobs)
+                    nGenerated += 1
+                    nUpdates += 1
+
+                    accepted = j < len(drafts) and int(tokens[0, -1]) == drafts[j]
+                    if accepted:
+                        nAccepted += 1
+
+                    if completed or tokens.shape[-1] > self.n_ctx or nGenerated >= self.sample_len:
+                        done = True
+                        break
+                    if not accepted:
+                        break
+
+                # 4. The hooks of the target model see the passes of plain greedy decoding: one pass for each generated token,
+                #    of which the first one also contains the tokens before it that were not in the KV cache
+                if hookReplay.hasHooks():
+                    hookReplay.replay(0, firstIdx + 1)
+                    for j in range(1, nUpdates):
+                        hookReplay.replay(firstIdx + j, firstIdx + j + 1)
+
+                self.stats['proposed'] += len(drafts)
+                self.stats['accepted'] += nAccepted
+
+                # 5. Roll back the KV caches to the tokens that were accepted
+                validLength = tokens.shape[-1] - 1
+                targetLength = min(targetLength, validLength)
+                draftLength = min(draftLength, validLength)
+                truncateKVCache(targetCache, targetModules, targetLength)
+                truncateKVCache(draftCache, draftModules, draftLength)
+
+        finally:
+            for hook in targetHooks + draftHooks:
+                hook.remove()
+            self.stats['tokens'] += nGenerated
+
+        return tokens, sum_logprobs, no_speech_probs
+
+"""
+Within a with-block, whisper decodes with SpeculativeDecodingTask. Yields a dict with the statistics of all decoded segments.
+The scaled-dot-product attention of newer whisper versions assumes a KV cache of one new token, so it is switched off.
+"""
+@contextmanager
+def speculativeDecoding(draftModel, draftLength = DRAFT_LENGTH, promptBias = 0.0, biasText = None):
+
+    stats = newStats()
+    originalTask = whisperDecoding.DecodingTask
+    originalSdpa = getattr(whisperModel.MultiHeadAttention, 'use_sdpa', None)
+
+    whisperDecoding.DecodingTask = functools.partial(SpeculativeDecodingTask, draftModel=draftModel, draftLength=draftLength,
+                                                     promptBias=promptBias, biasText=biasText, stats=stats)
+    if originalSdpa is not None:
+        whisperModel.MultiHeadAttention.use_sdpa = False
+
+    try:
+        yield stats
+    finally:
+        whisperDecoding.DecodingTask = originalTask
+        if originalSdpa is not None:
+            whisperModel.MultiHeadAttention.use_sdpa = originalSdpa
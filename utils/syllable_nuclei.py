@@ -0,0 +1,70 @@
+"""
+Measures of the syllable nuclei script of de Jong et al. (fluency_scripts/SyllableNucleiv3.praat) with output to the Praat Info window.
+
+For each audio file, the script writes a header and a line with the measures, e.g.:
+name, nsyll, npause, dur(s), phonationtime(s), speechrate(nsyll/dur), articulation_rate(nsyll/phonationtime), ASD(speakingtime/nsyll), nrFP, tFP(s)
+spk01-AVI1_story1-1, 312, 41, 140.21, 98.37, 2.23, 3.17, 0.315, 3, 1.274
+
+Used by 01_de_jong_syllable_nuclei_v3.py (output of one file) and 01_de_jong_syllable_nuclei_postprocess.py (stdout of a run).
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+# FilledPauses.praat appends this warning to the line with the measures, e.g.:
+# spk01-AVI1_story1-1, 312, 41, 140.21, 98.37, 2.23, 3.17, 0.315Warning: replaced 5/200 F0 values by mean (3.125) in spk01-AVI1_story1-1.
+# , 3, 1.274
+FILLED_PAUSES_WARNING = re.compile(r'Warning: replaced [^\n]*\n')
+
+def normalizeMissingValues(v):
+    if v == '--undefined--' or v == '':
+        return np.nan
+    else:
+        return v
+
+"""
+Header and measures (lists of strings) of the Praat output of one audio file: the last two non-empty lines.
+Returns None if there are no measures in the output.
+"""
+def parseSyllableNucleiOutput(output):
+    output = FILLED_PAUSES_WARNING.sub('', output)
+    lines = [line.strip() for line in output.split('\n') if line.strip() != '']
+    if len(lines) < 2:
+        return None
+
+    header = lines[-2].split(', ')
+    measures = lines[-1].split(', ')
+    if header[0] != 'name' or len(measures) != len(header):
+        return None
+
+    return header, measures
+
+"""
+DataFrame of the measures (rows, lists of strings in the order of header) with index audioID (<speaker>-<task>).
+Missing values ('--undefined--' or '') are NaN.
+"""
+def syllableNucleiFrame(header, rows):
+    df = pd.DataFrame([[normalizeMissingValues(item) for item in row] for row in rows], columns = header)
+
+    # Set index to <speaker>-<task>
+    df['audioID'] = df['name'].apply(lambda x: x.split('-')[0] + '-'+ x.split('-')[1])
+    return df.drop('name', axis=1).set_index('audioID')
+
+"""
+Agreement of the measures in df with the measures in referenceDF (DataFrames of syllableNucleiFrame), for the audioIDs in both.
+Returns a DataFrame with for each measure the number of audioIDs, the proportion of equal values and the mean and maximum absolute difference.
+"""
+def compareSyllableNucleiFrames(df, referenceDF):
+    audioIDs = df.index.intersection(referenceDF.index)
+    columns = [column for column in df.columns if column in referenceDF.columns]
+
+    rows = []
+    for column in columns:
+        values = pd.to_numeric(df.loc[audioIDs, column], errors='coerce')
+        referenceValues = pd.to_numeric(referenceDF.loc[audioIDs, column], errors='coerce')
+        equal = (values == referenceValues) | (values.isna() & referenceValues.isna())
+        difference = (values - referenceValues).abs()
+        rows.append([column, len(audioIDs), equal.mean(), difference.mean(), difference.max()])
+
+    return pd.DataFrame(rows, columns = ['measure', 'n', 'equal', 'meanAbsDiff', 'maxAbsDiff']).set_index('measure')
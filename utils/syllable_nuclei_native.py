@@ -0,0 +1,550 @@
+"""
+Syllable nuclei and filled pauses of de Jong et al. computed in Python on parselmouth objects, without running
+fluency_scripts/SyllableNucleiv3.praat and FilledPauses.praat.
+
+The algorithm and the default parameters are those of the Praat scripts as run by 01_de_jong_syllable_nuclei_v3.py:
+no pre-processing, silence threshold -25 dB, minimum dip near peak 2 dB, minimum pause duration 0.3 s, filled pauses for Dutch (threshold 1.00).
+- Syllable nuclei (SyllableNucleiv3.praat): the voiced intensity peaks above the threshold are the candidates. A candidate is a nucleus
+  if it is the highest peak between two intensity dips of more than minimumDip dB (the 'dip-peak-dip' parser) and lies in a sounding
+  interval of the silences TextGrid.
+- Filled pauses (FilledPauses.praat): each nucleus gets a syllable interval (-6 dB around the nucleus, within the intensity minima between
+  the nuclei and the sounding interval). A syllable is a filled pause if the score of its duration, F0 and formants (z-scores within the
+  recording) is above the threshold of the language.
+
+The Intensity, Pitch, Formant and silences TextGrid objects, the global quantiles and the parabolic minima are computed by Praat (parselmouth),
+as in the scripts. The peak picking, the voicing of the peaks, the parser, the per syllable F0 and formant measures (quantiles, standard
+deviations and distances, as Praat's queries compute them) and the filled pause scores are done with NumPy on the frames of these objects.
+The intensity peaks are those of To IntensityTier (peaks): the local maxima of the intensity frames, refined by parabolic interpolation (intensityPeaks).
+Difference with the Praat script: no TextGrid is saved.
+The measures can be compared with the output of the Praat script with 01_de_jong_syllable_nuclei_v3.py --engine native --compareTsv.
+Experimental: the measures equal those of the Praat scripts on synthetic audio (tests/test_syllable_nuclei.py), but are not yet validated on recorded speech.
+
+The input is a parselmouth.Sound, which can be made from an in-memory array (syllableNucleiFromArray).
+"""
+
+import math
+import numpy as np
+import parselmouth
+from parselmouth.praat import call
+
+SILENCE_THRESHOLD = -25
+MINIMUM_DIP = 2
+MINIMUM_PAUSE = 0.3
+PITCH_FLOOR = 30
+VOICING_THRESHOLD = 0.25
+LANGUAGE = 'Dutch'
+FILLED_PAUSE_THRESHOLD = 1.0
+
+# Filled pause score threshold per language (multiplied by filledPauseThreshold)
+FILLED_PAUSE_SCORES = {'English': 3.4942, 'Dutch': 2.7094}
+
+# Columns of the Praat output, see utils/syllable_nuclei.py
+HEADER = ['name', 'nsyll', 'npause', 'dur(s)', 'phonationtime(s)', 'speechrate(nsyll/dur)', 'articulation_rate(nsyll/phonationtime)', 'ASD(speakingtime/nsyll)', 'nrFP', 'tFP(s)']
+
+"""
+round() of Praat (halves are rounded up).
+"""
+def praatRound(x):
+    return math.floor(x + 0.5)
+
+def divide(a, b):
+    return a / b if b != 0 else math.nan
+
+"""
+Intervals of tier 1 of a TextGrid made by To TextGrid (silences): arrays with the start and end times and whether the interval is sounding.
+"""
+def silenceIntervals(textGrid):
+    nrIntervals = call(textGrid, "Get number of intervals", 1)
+    starts = np.array([call(textGrid, "Get start time of interval", 1, interval) for interval in range(1, nrIntervals + 1)])
+    ends = np.array([call(textGrid, "Get end time of interval", 1, interval) for interval in range(1, nrIntervals + 1)])
+    sounding = np.array([call(textGrid, "Get label of interval", 1, interval) != '' for interval in range(1, nrIntervals + 1)], dtype=bool)
+    return starts, ends, sounding
+
+"""
+Index of the interval at time t (Get interval at time): the interval with start <= t < end, or the last interval at its end time.
+"""
+def intervalAtTime(starts, t):
+    return min(max(int(np.searchsorted(starts, t, side='right')) - 1, 0), len(starts) - 1)
+
+"""
+Whether the pitch is voiced at each time of times (Get value at time ... "Linear" is not undefined): the frame nearest to the time is voiced.
+"""
+def voicedAtTimes(pitch, times):
+    frequency = pitch.selected_array['frequency']
+    nearest = np.floor((times - pitch.x1) / pitch.dx + 0.5).astype(np.int64)
+    inRange = (times >= pitch.x1 - 0.5 * pitch.dx) & (times <= pitch.x1 + (pitch.nx - 0.5) * pitch.dx) & (nearest >= 0) & (nearest < pitch.nx)
+    nearestFrequency = frequency[np.clip(nearest, 0, pitch.nx - 1)]
+    return inRange & (nearestFrequency > 0) & (nearestFrequency < pitch.ceiling)
+
+"""
+Times and values of the intensity peaks (To IntensityTier (peaks)): the frames that are higher than the previous frame and not lower than the next frame,
+with the time and value of the parabola through the frame and its neighbours (NUMimproveMaximum with parabolic interpolation).
+"""
+def intensityPeaks(intensity):
+    dbFrames = intensity.values[0]
+    frames = np.flatnonzero((dbFrames[1:-1] > dbFrames[:-2]) & (dbFrames[1:-1] >= dbFrames[2:])) + 1
+    dy = 0.5 * (dbFrames[frames + 1] - dbFrames[frames - 1])
+    d2y = 2 * dbFrames[frames] - dbFrames[frames - 1] - dbFrames[frames + 1]
+    return intensity.x1 + (frames + dy / d2y) * intensity.dx, dbFrames[frames] + 0.5 * dy * dy / d2y
+
+"""
+Syllable nuclei of sound (procedure findSyllableNuclei of SyllableNucleiv3.praat).
+Returns a dict with the times of the nuclei, the intervals of the silences TextGrid and the measures of the Praat output.
+"""
+def findSyllableNuclei(sound, silenceThreshold = SILENCE_THRESHOLD, minimumDip = MINIMUM_DIP, minimumPause = MINIMUM_PAUSE):
+
+    tsSnd = sound.xmin
+    teSnd = sound.xmax
+    dur = teSnd - tsSnd
+
+    # Use intensity to get threshold
+    intensity = call(sound, "To Intensity", 50, 0, "yes")
+    dbMin = call(intensity, "Get minimum", 0, 0, "Parabolic")
+    dbMax = call(intensity, "Get maximum", 0, 0, "Parabolic")
+    # .99 quantile to get maximum (without influence of non-speech sound bursts)
+    dbQ99 = call(intensity, "Get quantile", 0, 0, 0.99)
+
+    # Estimate intensity threshold
+    threshold = dbQ99 + silenceThreshold
+    threshold3 = silenceThreshold - (dbMax - dbQ99)
+    if threshold < dbMin:
+        threshold = dbMin
+
+    # Get pauses (silences) and speaking time
+    textGrid = call(intensity, "To TextGrid (silences)", threshold3, minimumPause, 0.1, "", "sound")
+    starts, ends, sounding = silenceIntervals(textGrid)
+    nsounding = int(sounding.sum())
+    speakingtot = 0
+    for ts, te in zip(starts[sounding].tolist(), ends[sounding].tolist()):
+        speakingtot += te - ts
+
+    # Voiced intensity peaks above the threshold
+    peakTimes, peakDbs = intensityPeaks(intensity)
+
+    pitch = call(sound, "To Pitch (ac)", 0.02, PITCH_FLOOR, 4, "no", 0.03, VOICING_THRESHOLD, 0.01, 0.35, 0.25, 450)
+    selected = (peakDbs > threshold) & voicedAtTimes(pitch, peakTimes)
+    peakTimes = peakTimes[selected].tolist()
+    peakDbs = peakDbs[selected].tolist()
+    peakcount = len(peakTimes)
+
+    # Peaks at even indices, minima between peaks at odd indices
+    t = [0.0] * (2 * peakcount + 3)
+    db = [0.0] * (2 * peakcount + 3)
+    t[2:2 * peakcount + 1:2] = peakTimes
+    db[2:2 * peakcount + 1:2] = peakDbs
+    t[0] = tsSnd
+    t[2 * (peakcount + 1)] = teSnd
+    for valley in range(1, peakcount + 2):
+        t[2 * valley - 1] = call(intensity, "Get time of minimum", t[2 * (valley - 1)], t[2 * valley], "Parabolic")
+        db[2 * valley - 1] = call(intensity, "Get minimum", t[2 * (valley - 1)], t[2 * valley], "Parabolic")
+
+    # The largest peaks surrounded by a dip > minimumDip ('dip-peak-dip' parser), in a sounding interval
+    nuclei = []
+    tRise = tFall = tMax = t[0]
+    dbMaxPoint = dbMinPoint = db[1]
+    for point in range(1, 2 * peakcount + 2):
+
+        if db[point] > dbMaxPoint:
+            tMax = t[point]
+            dbMaxPoint = db[point]
+            if db[point] - dbMinPoint > minimumDip:
+                tRise = t[point]
+                dbMinPoint = db[point]
+
+        elif db[point] < dbMinPoint:
+            dbMinPoint = db[point]
+            if dbMaxPoint - db[point] > minimumDip:
+                tFall = t[point]
+                dbMaxPoint = db[point]
+
+        if tRise != t[0] and tRise < tFall and tFall != t[0]:
+            if sounding[intervalAtTime(starts, tMax)]:
+                nuclei.append(tMax)
+                tMax = t[point]
+                dbMinPoint = db[point]
+                dbMaxPoint = db[point]
+                tRise = t[0]
+                tFall = t[0]
+
+    voicedcount = len(nuclei)
+
+    return {
+        'nuclei': np.array(nuclei),
+        'intervalStarts': starts,
+        'intervalEnds': ends,
+        'nsyll': voicedcount,
+        'npause': nsounding - 1,
+        'dur': dur,
+        'phonationtime': speakingtot,
+        'speechrate': divide(voicedcount, dur),
+        'articulationrate': divide(voicedcount, speakingtot),
+        'asd': divide(speakingtot, voicedcount),
+    }
+
+"""
+Start and end time of the syllable of each nucleus (procedure setSB of FilledPauses.praat): from -6 dB before to -6 dB after the nucleus,
+within the intensity minima between the nuclei and within the interval of the silences TextGrid.
+Returns the arrays ts and te, and the boundaries of the syllable intervals in the TextGrid of the Praat script.
+"""
+def syllableIntervals(sound, nuclei, intervalStarts, intervalEnds):
+
+    nrSyllables = len(nuclei)
+    intensity = call(sound, "To Intensity", 100, 0, "yes")
+    dbFrames = intensity.values[0]
+    nrFrames = len(dbFrames)
+
+    def valueInFrame(frame):
+        return dbFrames[frame - 1] if 1 <= frame <= nrFrames else math.nan
+
+    def timeOfFrame(frame):
+        return intensity.x1 + (frame - 1) * intensity.dx
+
+    tNuc = [sound.xmin] + nuclei.tolist() + [sound.xmax]
+    tSBMin = [math.nan] + [call(intensity, "Get time of minimum", tNuc[syllable - 1], tNuc[syllable], "Parabolic") for syllable in range(1, nrSyllables + 2)]
+
+    ts = np.zeros(nrSyllables)
+    te = np.zeros(nrSyllables)
+    boundaryStarts = np.zeros(nrSyllables)
+    boundaryEnds = np.zeros(nrSyllables)
+    for syllable in range(1, nrSyllables + 1):
+        frNuc = praatRound((tNuc[syllable] - intensity.x1) / intensity.dx + 1)
+        dBNuc = valueInFrame(frNuc)
+
+        frFrom = frNuc
+        while True:
+            frFrom -= 1
+            if valueInFrame(frFrom) < dBNuc - 6 or timeOfFrame(frFrom) < tSBMin[syllable] or frFrom < 2:
+                break
+        tFrom = timeOfFrame(frFrom)
+
+        frTo = frNuc
+        while True:
+            frTo += 1
+            if valueInFrame(frTo) < dBNuc - 6 or timeOfFrame(frTo) > tSBMin[syllable + 1] or frTo > nrFrames - 1:
+                break
+        tTo = timeOfFrame(frTo)
+
+        interval = intervalAtTime(intervalStarts, tNuc[syllable])
+        tFrom = max(intervalStarts[interval], tFrom)
+        tTo = min(intervalEnds[interval], tTo)
+
+        k = syllable - 1
+        if tFrom > tSBMin[syllable]:
+            ts[k] = boundaryStarts[k] = tFrom
+        else:
+            ts[k] = tSBMin[syllable]
+            boundaryStarts[k] = tSBMin[syllable] + 0.00005
+        if tTo < tSBMin[syllable + 1]:
+            te[k] = boundaryEnds[k] = tTo
+        else:
+            te[k] = tSBMin[syllable + 1]
+            boundaryEnds[k] = tSBMin[syllable + 1] - 0.00005
+
+    return ts, te, boundaryStarts, boundaryEnds
+
+"""
+Replace the undefined values of x by the mean of the other values (procedure replaceUndefinedF0 of FilledPauses.praat).
+"""
+def replaceUndefined(x):
+    defined = x[~np.isnan(x)]
+    total = 0
+    for value in defined.tolist():
+        total += value
+    return np.where(np.isnan(x), divide(total, len(defined)), x)
+
+def zScores(x):
+    return (x - np.mean(x)) / np.std(x, ddof=1)
+
+"""
+Frequencies (Hz) in bark (NUMhertzToBark).
+"""
+def hertzToBark(hertz):
+    r = hertz / 650.0
+    return 7.0 * np.log(r + np.sqrt(1.0 + r * r))
+
+"""
+Frequencies (Hz) in semitones re the reference frequency (Hz).
+"""
+def hertzToSemitones(hertz, reference):
+    return (12.0 / math.log(2)) * np.log(hertz / reference)
+
+"""
+First and last frame number of the frames of sampled (a Pitch or Formant) in the time range tmin-tmax, as Praat's queries select them:
+the whole time domain if tmin >= tmax, and only the part of the range in the time domain. There are no frames in the range if first > last.
+"""
+def windowFrames(sampled, tmin, tmax):
+    if tmin >= tmax:
+        tmin, tmax = sampled.xmin, sampled.xmax
+    tmin = max(tmin, sampled.xmin)
+    tmax = min(tmax, sampled.xmax)
+    if tmax <= tmin:
+        return 1, 0
+    first = max(1 + math.ceil((tmin - sampled.x1) / sampled.dx), 1)
+    last = min(1 + math.floor((tmax - sampled.x1) / sampled.dx), sampled.nx)
+    return first, last
+
+"""
+The defined values (not NaN) of the frames of sampled in the time range tmin-tmax. values has one value per frame.
+"""
+def windowValues(values, sampled, tmin, tmax):
+    first, last = windowFrames(sampled, tmin, tmax)
+    window = values[first - 1:last]
+    return window[~np.isnan(window)]
+
+"""
+Quantile of the values of the frames in the time range tmin-tmax (Get quantile of a Pitch or Formant, NUMquantile).
+"""
+def sampledQuantile(values, sampled, tmin, tmax, quantile):
+    window = np.sort(windowValues(values, sampled, tmin, tmax))
+    n = len(window)
+    if n == 0:
+        return math.nan
+    if n == 1:
+        return window[0]
+    place = quantile * n + 0.5
+    left = min(max(math.floor(place), 1), n - 1)
+    if window[left] == window[left - 1]:
+        return window[left - 1]
+    return window[left - 1] + (place - left) * (window[left] - window[left - 1])
+
+"""
+Sum of the values of the frames in the time range tmin-tmax and the number of frames in which they are defined, for the mean of the
+linearly interpolated curve (Sampled_getSumAndDefinitionRange of Praat): the first and last frame count in part, depending on where
+the range starts and ends between the frames.
+"""
+def sampledSum(values, sampled, tmin, tmax):
+
+    def valueInFrame(frame):
+        return values[frame - 1] if 1 <= frame <= sampled.nx else math.nan
+
+    if tmin >= tmax:
+        tmin, tmax = sampled.xmin, sampled.xmax
+    tmin = max(tmin, sampled.xmin)
+    tmax = min(tmax, sampled.xmax)
+    if tmax <= tmin:
+        return 0.0, 0.0
+
+    first, last = windowFrames(sampled, tmin, tmax)
+    total = 0.0
+    definitionRange = 0.0
+    if first <= last:
+        window = windowValues(values, sampled, tmin, tmax)
+        total += np.sum(window)
+        definitionRange += len(window)
+
+        # Corrections within the first and last sampling intervals
+        leftEdge = sampled.x1 - 0.5 * sampled.dx
+        rightEdge = leftEdge + sampled.nx * sampled.dx
+        if tmin > leftEdge:
+            phase = (sampled.x1 + (first - 1) * sampled.dx - tmin) / sampled.dx
+            rightValue = valueInFrame(first)
+            leftValue = valueInFrame(first - 1)
+            if not math.isnan(rightValue):
+                definitionRange -= 0.5
+                total -= 0.5 * rightValue
+                if not math.isnan(leftValue):
+                    definitionRange += phase
+                    total += phase * (rightValue + 0.5 * phase * (leftValue - rightValue))
+                else:
+                    phase = min(phase, 0.5)
+                    definitionRange += phase
+                    total += phase * rightValue
+            elif not math.isnan(leftValue) and phase > 0.5:
+                definitionRange += phase - 0.5
+                total += (phase - 0.5) * leftValue
+        if tmax < rightEdge:
+            phase = (tmax - (sampled.x1 + (last - 1) * sampled.dx)) / sampled.dx
+            leftValue = valueInFrame(last)
+            rightValue = valueInFrame(last + 1)
+            if not math.isnan(leftValue):
+                definitionRange -= 0.5
+                total -= 0.5 * leftValue
+                if not math.isnan(rightValue):
+                    definitionRange += phase
+                    total += phase * (leftValue + 0.5 * phase * (rightValue - leftValue))
+                else:
+                    phase = min(phase, 0.5)
+                    definitionRange += phase
+                    total += phase * leftValue
+            elif not math.isnan(rightValue) and phase > 0.5:
+                definitionRange += phase - 0.5
+                total += (phase - 0.5) * rightValue
+
+    # No frame in the range: the mean of the interpolated values at tmin and tmax
+    elif first == last + 1:
+        leftValue = valueInFrame(last)
+        rightValue = valueInFrame(first)
+        phase1 = (tmin - (sampled.x1 + (last - 1) * sampled.dx)) / sampled.dx
+        phase2 = (tmax - (sampled.x1 + (last - 1) * sampled.dx)) / sampled.dx
+        if not math.isnan(leftValue):
+            if not math.isnan(rightValue):
+                definitionRange += phase2 - phase1
+                total += (phase2 - phase1) * (leftValue + 0.5 * (phase1 + phase2) * (rightValue - leftValue))
+            elif phase1 < 0.5:
+                phase2 = min(phase2, 0.5)
+                definitionRange += phase2 - phase1
+                total += (phase2 - phase1) * leftValue
+        elif not math.isnan(rightValue) and phase2 > 0.5:
+            phase1 = max(phase1, 0.5)
+            definitionRange += phase2 - phase1
+            total += (phase2 - phase1) * rightValue
+
+    return float(total), float(definitionRange)
+
+def sampledMean(values, sampled, tmin, tmax):
+    total, definitionRange = sampledSum(values, sampled, tmin, tmax)
+    return total / definitionRange if definitionRange > 0 else math.nan
+
+"""
+Standard deviation of the linearly interpolated curve in the time range tmin-tmax (Get standard deviation of a Pitch).
+"""
+def sampledStandardDeviation(values, sampled, tmin, tmax):
+    total, definitionRange = sampledSum(values, sampled, tmin, tmax)
+    if definitionRange < 2:
+        return math.nan
+    total2, definitionRange = sampledSum((values - total / definitionRange) ** 2, sampled, tmin, tmax)
+    return math.sqrt(total2 / (definitionRange - 1))
+
+"""
+Standard deviation of the frame values of a formant in the time range tmin-tmax, around the mean of the interpolated curve
+(Get standard deviation of a Formant).
+"""
+def formantStandardDeviation(values, formant, tmin, tmax):
+    window = windowValues(values, formant, tmin, tmax)
+    if len(window) < 2:
+        return math.nan
+    return math.sqrt(np.sum((window - sampledMean(values, formant, tmin, tmax)) ** 2) / (len(window) - 1))
+
+"""
+Values of the linearly interpolated curve of the frames of sampled at times (Get value at time ... "Linear"): the value of the nearest
+frame, interpolated towards the other neighbouring frame if that is defined. NaN outside the time domain or if the nearest frame is undefined.
+"""
+def valuesAtTimes(values, sampled, times):
+    indexReal = (times - sampled.x1) / sampled.dx + 1.0
+    leftFrames = np.floor(indexReal)
+    phase = indexReal - leftFrames
+    nearIsRight = phase >= 0.5
+    nearFrames = np.where(nearIsRight, leftFrames + 1, leftFrames).astype(np.int64)
+    farFrames = np.where(nearIsRight, leftFrames, leftFrames + 1).astype(np.int64)
+    phase = np.where(nearIsRight, 1.0 - phase, phase)
+
+    padded = np.concatenate([[math.nan], values, [math.nan]])
+    nearValues = padded[np.clip(nearFrames, 0, len(values) + 1)]
+    farValues = padded[np.clip(farFrames, 0, len(values) + 1)]
+    result = np.where(np.isnan(farValues), nearValues, nearValues + phase * (farValues - nearValues))
+    return np.where((times < sampled.xmin) | (times > sampled.xmax), math.nan, result)
+
+"""
+Which syllables (ts, te) of sound are filled pauses (FilledPauses.praat).
+The Pitch and Formant objects are made by Praat. The per syllable queries of the script (quantiles, standard deviations and the formant
+values of each frame) are computed with NumPy on the frames of these objects, as Praat computes them.
+"""
+def findFilledPauses(sound, ts, te, language = LANGUAGE, filledPauseThreshold = FILLED_PAUSE_THRESHOLD):
+
+    nrSyllables = len(ts)
+
+    # Global analyses of all syllables
+    parts = [call(sound, "Extract part", ts[k], te[k], "rectangular", 1, "no") for k in range(nrSyllables)]
+    soundTmp = call(parts, "Concatenate with overlap", 0.01)
+    pitchInit = call(soundTmp, "To Pitch (ac)", 0.02, 30, 4, "no", 0.03, 0.25, 0.01, 0.35, 0.25, 450)
+    qGlobF0Init = call(pitchInit, "Get quantile", 0, 0, 0.5, "Hertz")
+    pitchTmp = call(soundTmp, "To Pitch (ac)", 0.02, 30, 4, "no", 0.03, 0.25, 0.01, 0.35, 0.25, 2.5 * qGlobF0Init)
+    qGlobF0 = call(pitchTmp, "Get quantile", 0, 0, 0.5, "semitones re 100 Hz")
+    formantTmp = call(soundTmp, "To Formant (burg)", 0, 4, 4000 + 4 * (qGlobF0Init - 100), 0.025, 50)
+    qGlobF = [call(formantTmp, "Get quantile", formant, 0, 0, "bark", 0.5) for formant in [1, 2, 3]]
+
+    # F0 of each syllable: median and 5-95% range (semitones re 100 Hz) and standard deviation (semitones)
+    pitch = call(sound, "To Pitch (ac)", 0.02, 30, 4, "no", 0.03, 0.25, 0.01, 0.35, 0.25, 2.5 * qGlobF0Init)
+    hertz = pitch.selected_array['frequency']
+    hertz = np.where((hertz > 0) & (hertz < pitch.ceiling), hertz, math.nan)
+    semitones100 = hertzToSemitones(hertz, 100.0)
+    semitones = hertzToSemitones(hertz, 1.0)
+    f0 = np.array([sampledQuantile(semitones100, pitch, ts[k], te[k], 0.50) for k in range(nrSyllables)])
+    dF0 = qGlobF0 - f0
+    dqF0 = np.array([sampledQuantile(semitones100, pitch, ts[k], te[k], 0.95) - sampledQuantile(semitones100, pitch, ts[k], te[k], 0.05) for k in range(nrSyllables)])
+    sdF0 = np.array([sampledStandardDeviation(semitones, pitch, ts[k], te[k]) for k in range(nrSyllables)])
+
+    # Formants of each syllable: median, mean distance to the global median, 5-95% range and standard deviation (bark)
+    # The frequencies of the frames, 0 where a frame has fewer formants
+    formant = call(sound, "To Formant (burg)", 0, 4, 4000 + 4 * (qGlobF0Init - 100), 0.025, 50)
+    barks = []
+    for n in range(3):
+        hertz = call(formant, "To Matrix", n + 1).values[0]
+        barks.append(hertzToBark(np.where(hertz > 0, hertz, math.nan)))
+
+    fF = np.zeros((3, nrSyllables))
+    dF = np.zeros((3, nrSyllables))
+    sdF = np.zeros((3, nrSyllables))
+    for k in range(nrSyllables):
+        fs = max(praatRound((ts[k] - formant.x1) / formant.dx + 1), 1)
+        fe = praatRound((te[k] - formant.x1) / formant.dx + 1)
+        times = formant.x1 + (np.arange(fs, fe + 1) - 1) * formant.dx
+        for n in range(3):
+            fF[n, k] = sampledQuantile(barks[n], formant, ts[k], te[k], 0.5)
+            sdF[n, k] = formantStandardDeviation(barks[n], formant, ts[k], te[k])
+            values = valuesAtTimes(barks[n], formant, times)
+            dF[n, k] = np.sum(np.abs(qGlobF[n] - values[~np.isnan(values)])) / (fe - fs + 1)
+
+    d = te - ts
+    f0z = zScores(replaceUndefined(f0))
+    f1, f2, f3 = fF
+    dF1, dF2, dF3 = dF
+    sdF1, sdF2, sdF3 = sdF
+
+    if language == 'English':
+        score = 4.73 * np.sqrt(d) - 0.29 * f0z - 0.32 * np.sqrt(sdF1) - 0.10 * np.sqrt(dF1) - 1.38 * np.sqrt(sdF2) - 0.80 * np.sqrt(dF2) - 0.20 * (f2 - f1) + 0.31 * f3
+    elif language == 'Dutch':
+        score = 8.62 * np.sqrt(d) - 0.36 * f0z - 0.72 * np.sqrt(dF1) - 1.36 * np.sqrt(sdF2) - 1.62 * np.sqrt(dF2) - 1.02 * np.sqrt(sdF3) - 0.11 * (f2 - f1) + 0.21 * f3
+    else:
+        raise ValueError('Language not supported: ' + str(language))
+
+    return score > FILLED_PAUSE_SCORES[language] * filledPauseThreshold
+
+"""
+Syllable nuclei and filled pauses of sound (a parselmouth.Sound). name is the name in the output (the file name without extension).
+Returns a dict with the measures of the Praat output (see formatMeasures), the times of the nuclei, the syllable intervals and which syllables are filled pauses.
+"""
+def syllableNuclei(sound, name, silenceThreshold = SILENCE_THRESHOLD, minimumDip = MINIMUM_DIP, minimumPause = MINIMUM_PAUSE, detectFilledPauses = True, language = LANGUAGE, filledPauseThreshold = FILLED_PAUSE_THRESHOLD):
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = findSyllableNuclei(sound, silenceThreshold, minimumDip, minimumPause)
+        result['name'] = name
+
+        if detectFilledPauses:
+            ts, te, boundaryStarts, boundaryEnds = syllableIntervals(sound, result['nuclei'], result['intervalStarts'], result['intervalEnds'])
+            filledPauses = findFilledPauses(sound, ts, te, language, filledPauseThreshold) if len(ts) > 0 else np.zeros(0, dtype=bool)
+
+            tFP = 0
+            for boundaryStart, boundaryEnd in zip(boundaryStarts[filledPauses].tolist(), boundaryEnds[filledPauses].tolist()):
+                tFP += boundaryEnd - boundaryStart
+
+            result.update({'syllableStarts': ts, 'syllableEnds': te, 'filledPauses': filledPauses, 'nrFP': int(filledPauses.sum()), 'tFP': tFP})
+
+    return result
+
+"""
+syllableNuclei of an in-memory audio array (samples, or channels x samples).
+"""
+def syllableNucleiFromArray(samples, samplingFrequency, name, **options):
+    return syllableNuclei(parselmouth.Sound(samples, sampling_frequency=samplingFrequency), name, **options)
+
+"""
+syllableNuclei of many audio arrays with the same sampling frequency.
+"""
+def syllableNucleiBatch(arrays, samplingFrequency, names, **options):
+    return [syllableNucleiFromArray(samples, samplingFrequency, name, **options) for samples, name in zip(arrays, names)]
+
+def formatValue(value, decimals = None):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return '--undefined--'
+    if decimals is None:
+        return str(value)
+    return '{:.{}f}'.format(value, decimals)
+
+"""
+The measures of a result of syllableNuclei as strings in the order of HEADER, formatted as in the Praat output.
+"""
+def formatMeasures(result):
+    return [result['name'], formatValue(result['nsyll']), formatValue(result['npause']), formatValue(result['dur'], 2), formatValue(result['phonationtime'], 2),
+            formatValue(result['speechrate'], 2), formatValue(result['articulationrate'], 2), formatValue(result['asd'], 3),
+            formatValue(result.get('nrFP')), formatValue(result.get('tFP'), 3)]
@@ -0,0 +1,107 @@
+"""
+Cached voice activity detection (VAD) segments.
+
+The speech regions of an audio file are computed once (fluency_scripts/00_vad_segments.py) and stored next to the audio file:
+<audioFile>.vad.npz with the arrays start and end (in samples at 16 kHz), the VAD method, and the size and modification time of the audio file.
+A cache file is only used if the audio file has not changed since and the same VAD method was used.
+
+The VAD is the same function as used by whisper_timestamped.transcribe(..., vad=True), so a decoder that reads the cached
+segments (see utils/whisper_decoding.py) gives the same result as a decoder that computes them again.
+The segments are also used by 03_asr-results2features.py and 06_inter-intra-pauses.py to cross-check the ASR pauses.
+"""
+
+import os
+import numpy as np
+
+SAMPLE_RATE = 16000
+VAD_METHOD = 'silero'
+VAD_EXTENSION = '.vad.npz'
+
+def vadSegmentsPath(audioFile):
+    return audioFile + VAD_EXTENSION
+
+"""
+Compute the speech regions of an audio array (output of whisper.load_audio).
+Returns two int arrays with the start and end sample of each speech region.
+
+This is the call of whisper_timestamped.transcribe(..., vad=True), with the same audio tensor and the same
+minimum speech and silence durations and dilatation, so the cached segments are the segments that it would compute.
+"""
+def computeVadSegments(audio, method = VAD_METHOD):
+    from whisper_timestamped.transcribe import get_audio_tensor, remove_non_speech
+
+    _, segments, _ = remove_non_speech(get_audio_tensor(audio), use_sample=True, sample_rate=SAMPLE_RATE, method=method)
+    starts = np.array([start for start, end in segments], dtype=np.int64)
+    ends = np.array([end for start, end in segments], dtype=np.int64)
+    return starts, ends
+
+"""
+Save the speech regions of audioFile. The file is written to a temporary file first and then renamed.
+"""
+def saveVadSegments(audioFile, starts, ends, method = VAD_METHOD):
+    stat = os.stat(audioFile)
+    path = vadSegmentsPath(audioFile)
+    tmpPath = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmpPath, 'wb') as f:
+        np.savez(f, start=starts, end=ends, method=method, audioSize=stat.st_size, audioMtime=stat.st_mtime_ns)
+    os.replace(tmpPath, path)
+
+"""
+Read the cached speech regions of audioFile.
+Returns a list of (start, end) tuples in seconds, or None if there is no (up-to-date) cache file.
+"""
+def loadVadSegments(audioFile, method = VAD_METHOD):
+    path = vadSegmentsPath(audioFile)
+    if not os.path.exists(path):
+        return None
+
+    stat = os.stat(audioFile)
+    with np.load(path) as data:
+        if str(data['method']) != method or int(data['audioSize']) != stat.st_size or int(data['audioMtime']) != stat.st_mtime_ns:
+            return None
+        return [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in zip(data['start'].tolist(), data['end'].tolist())]
+
+"""
+Speech regions that overlap [windowStart, windowEnd], clipped to the window and relative to windowStart.
+Used for chunked decoding, in which each chunk is decoded separately.
+"""
+def clipVadSegments(vadSegments, windowStart, windowEnd):
+    clipped = []
+    for start, end in vadSegments:
+        if end > windowStart and start < windowEnd:
+            clipped.append((max(start, windowStart) - windowStart, min(end, windowEnd) - windowStart))
+    return clipped
+
+"""
+Compare the pauses between the ASR words with the VAD.
+
+pauses          list of (start, end) tuples of the pauses according to the ASR result (s)
+vadSegments     output of loadVadSegments()
+readingStart    start of the first word, readingEnd end of the last word: only VAD pauses within the reading are counted
+minPause        minimum duration of a VAD pause (s), as for the ASR pauses
+
+Returns a dict with:
+vad_nrOfPauses          number of pauses between the VAD speech regions
+vad_pauseTime           total duration of these pauses
+vad_confirmedPauses     proportion of the ASR pauses of which at least half is non-speech according to the VAD
+vad_speechInPauses      total duration of VAD speech within the ASR pauses (e.g. disfluencies that the ASR did not recognize)
+"""
+def vadPauseCrossCheck(pauses, vadSegments, readingStart, readingEnd, minPause = 0.2):
+
+    vadPauses = [(end, nextStart) for (start, end), (nextStart, nextEnd) in zip(vadSegments[:-1], vadSegments[1:])
+                 if nextStart - end >= minPause and end >= readingStart and nextStart <= readingEnd]
+
+    confirmed = 0
+    speechInPauses = 0.0
+    for pauseStart, pauseEnd in pauses:
+        speech = sum(max(0.0, min(end, pauseEnd) - max(start, pauseStart)) for start, end in vadSegments)
+        speechInPauses += speech
+        if speech <= (pauseEnd - pauseStart) / 2:
+            confirmed += 1
+
+    return {
+        'vad_nrOfPauses': len(vadPauses),
+        'vad_pauseTime': round(sum(end - start for start, end in vadPauses), 3),
+        'vad_confirmedPauses': round(confirmed / len(pauses), 3) if len(pauses) > 0 else np.nan,
+        'vad_speechInPauses': round(speechInPauses, 3),
+    }
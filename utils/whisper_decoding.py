@@ -0,0 +1,547 @@
+"""
+Helper functions to decode read speech with whisper-timestamped.
+
+These functions are shared by asr_decoders/whispert.py (decodes a directory of audio files)
+and asr_decoders/whispert_server.py (a long-lived worker that keeps the Whisper model in memory
+and decodes jobs that are sent to it over a Unix socket).
+
+A job is a (audioFile, asrSettings, prompt) tuple, together with the path of the output .json file.
+The asrSettings string is parsed in the same way as in whispert.py:
+- 'dis' in asrSettings      : detect disfluencies
+- 'vad' in asrSettings      : use voice activity detection
+- 'prompt' in asrSettings   : use the story prompt as initial prompt
+
+The model is loaded and run by a decoder backend (see utils/asr_backends.py), e.g. fp32 or int8.
+If the VAD segments of an audio file were computed before (fluency_scripts/00_vad_segments.py), they are used instead of recomputing them.
+
+Decoding can be restricted to the reading region of a recording (job['region'] = [start, end] in seconds, see readReadingRegions()).
+Only this window of the audio is decoded, the timestamps of the result are in the timebase of the complete audio file.
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import socket
+import difflib
+import hashlib
+import multiprocessing
+from datetime import datetime
+import numpy as np
+import torch
+import whisper_timestamped as whisper
+
+from utils.decode_cache import DecodeCache
+from utils.asr_backends import getBackend
+import utils.chunked_decoding as chunked
+import utils.vad_segments as vadseg
+
+MODEL_NAME = "large-v2"
+LANGUAGE = "nl"
+BACKEND = "fp32"
+
+"""
+Parse the asrSettings string (e.g. whispert, whispert_dis, whispert_vad_dis, whispert_prompts) into decoding options.
+"""
+def parseAsrSettings(asrSettings):
+
+    det_dis = False
+    if 'dis' in asrSettings:
+        det_dis = True
+
+    vad_boolean = False
+    if 'vad' in asrSettings:
+        vad_boolean = True
+
+    use_prompt = False
+    if 'prompt' in asrSettings:
+        use_prompt = True
+
+    return {'detect_disfluencies': det_dis, 'vad': vad_boolean, 'use_prompt': use_prompt}
+
+"""
+Read the prompt of the task that is read in audioFile.
+The audio files are named according to the following convention: <spk><spkTaskSep><task>.wav
+"""
+def readTaskPrompt(audioFile, audioExtension, spkTaskSep, promptsDir):
+
+    taskID = os.path.basename(audioFile).split(spkTaskSep)[1].replace(audioExtension, '')
+    taskFile = os.path.join(promptsDir, taskID + '.prompt')
+
+    with open(taskFile, 'r') as f:
+        taskPrompt = f.readlines()[0]
+
+    return taskPrompt
+
+"""
+Read the words of the last sentence of the prompt from <promptsDir>/<task>-wordIDX.csv.
+The prompt_id of a word is <sentence>-<word>-<text>.
+"""
+def readFinalPromptSentence(audioFile, audioExtension, spkTaskSep, promptsDir):
+
+    taskID = os.path.basename(audioFile).split(spkTaskSep)[1].replace(audioExtension, '')
+    wordIdxFile = os.path.join(promptsDir, taskID + '-wordIDX.csv')
+
+    with open(wordIdxFile, 'r') as f:
+        rows = [(int(row['prompt_id'].split('-')[0]), row['prompt']) for row in csv.DictReader(f)]
+
+    lastSentence = max(sentenceNr for sentenceNr, word in rows)
+    return [word for sentenceNr, word in rows if sentenceNr == lastSentence]
+
+"""
+Read the reading region of each audio file from recordingsDF.tsv (03_metadata).
+startTimeFirstSent and endTimeLastSent are in the timebase of the original recording, the audio file starts at cutStart.
+
+Returns a dict audioID -> [start, end] in seconds in the timebase of the audio file, extended with marginSec on both sides.
+Audio files without a start or end time are not in the dict, and are decoded completely.
+"""
+def readReadingRegions(recordingsDFFile, marginSec):
+
+    regions = {}
+    with open(recordingsDFFile, 'r') as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            try:
+                cutStart = float(row['cutStart'])
+                start = float(row['startTimeFirstSent']) - cutStart - marginSec
+                end = float(row['endTimeLastSent']) - cutStart + marginSec
+            except (ValueError, TypeError):
+                continue
+
+            if row.get('duration') not in [None, '']:
+                end = min(end, float(row['duration']))
+
+            regions[row['audioID']] = [round(max(start, 0.0), 3), round(end, 3)]
+
+    return regions
+
+"""
+backendOptions  dict with options of the backend, e.g. {'draftModel': 'base'} for the speculative backend, or None
+"""
+def loadModel(modelName = MODEL_NAME, backend = BACKEND, backendOptions = None):
+    print('Load Whisper model:', modelName, '(backend: ' + backend + ')')
+    if not getBackend(backend).identical:
+        print('The results of backend', backend, 'are not identical to those of fp32 (see utils/asr_backends.py)')
+    model = getBackend(backend).loadModel(modelName, **(backendOptions or {}))
+    model.modelName = modelName
+    model.backend = backend
+    return model
+
+"""
+Decode one audio array with an already loaded model.
+
+model       whisper model:  loaded once with loadModel()
+audio       np.array:       output of whisper.load_audio()
+asrSettings string:         see parseAsrSettings()
+taskPrompt  string:         story prompt, only used if 'prompt' is in asrSettings
+vadSegments list:           cached speech regions [(start, end)] in seconds (see utils/vad_segments.py), or None to compute them
+"""
+def decodeAudio(model, audio, asrSettings, taskPrompt, vadSegments = None):
+
+    settings = parseAsrSettings(asrSettings)
+
+    readingPrompt = taskPrompt
+    if not settings['use_prompt']:
+        taskPrompt = None
+
+    # An empty list means no VAD to whisper_timestamped, so then the VAD is computed again
+    vad = vadseg.VAD_METHOD if settings['vad'] else False
+    if settings['vad'] and vadSegments is not None and len(vadSegments) > 0:
+        vad = vadSegments
+
+    backend = getBackend(getattr(model, 'backend', BACKEND))
+    startTime = datetime.now()
+    result = backend.transcribe(model, audio, language=LANGUAGE, detect_disfluencies=settings['detect_disfluencies'], vad=vad, initial_prompt=taskPrompt, readingPrompt=readingPrompt)
+
+    # Backends that report statistics per decoding (e.g. speculative) add them to model.decodingStatsLog
+    statsLog = getattr(model, 'decodingStatsLog', None)
+    if statsLog is not None and len(statsLog) > 0 and 'asrSettings' not in statsLog[-1]:
+        statsLog[-1].update({'asrSettings': asrSettings, 'duration': len(audio) / chunked.SAMPLE_RATE, 'decodingTime': (datetime.now() - startTime).total_seconds()})
+
+    return result
+
+"""
+Load the audio and the cached VAD segments of audioFile. If region is given, only this window is loaded
+and the VAD segments are relative to the start of the window.
+"""
+def loadAudioAndVadSegments(audioFile, region = None):
+
+    vadSegments = vadseg.loadVadSegments(audioFile)
+    if region is None:
+        return whisper.load_audio(audioFile), vadSegments
+
+    audio = chunked.loadAudioWindow(audioFile, region[0], region[1] - region[0])
+    if vadSegments is not None:
+        vadSegments = vadseg.clipVadSegments(vadSegments, region[0], region[1])
+    return audio, vadSegments
+
+def decodeAudioFile(model, audioFile, asrSettings, taskPrompt, region = None):
+    audio, vadSegments = loadAudioAndVadSegments(audioFile, region)
+    result = decodeAudio(model, audio, asrSettings, taskPrompt, vadSegments)
+    return chunked.shiftResultTimestamps(result, region[0]) if region is not None else result
+
+"""
+Within a with-block, the Whisper encoder output, the log-mel spectrogram and the VAD segments are memoized,
+keyed on the content of their input. Decoding the same audio with several asrSettings then computes these only once:
+only the settings-specific decoding is repeated.
+The output is identical to decoding without the cache, since the memoized functions are deterministic.
+"""
+class SharedAudioFeatures:
+
+    def __init__(self, model):
+        self.model = model
+        self.cache = {}
+        self.patches = []
+
+    def __enter__(self):
+
+        # Encoder: whisper calls model.encoder(mel) for each 30s window
+        encoder = self.model.encoder
+        encoderForward = encoder.forward
+        encoder.forward = self.memoize('encoder', encoderForward)
+        self.patches.append((encoder, 'forward', None))
+
+        # Log-mel spectrogram: computed by whisper.transcribe for the complete audio
+        whisperTranscribeModule = sys.modules.get('whisper.transcribe')
+        if whisperTranscribeModule is not None and hasattr(whisperTranscribeModule, 'log_mel_spectrogram'):
+            self.patch(whisperTranscribeModule, 'log_mel_spectrogram')
+
+        # VAD: computed by whisper_timestamped when vad=True
+        timestampedModule = sys.modules.get('whisper_timestamped.transcribe')
+        if timestampedModule is not None and hasattr(timestampedModule, 'get_vad_segments'):
+            self.patch(timestampedModule, 'get_vad_segments')
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for obj, name, orig in reversed(self.patches):
+            if orig is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, orig)
+        self.patches = []
+        self.cache = {}
+
+    def patch(self, module, name):
+        orig = getattr(module, name)
+        setattr(module, name, self.memoize(name, orig))
+        self.patches.append((module, name, orig))
+
+    def memoize(self, name, func):
+        def memoized(*args, **kwargs):
+            key = (name, tuple(contentKey(arg) for arg in args), tuple((k, contentKey(v)) for k, v in sorted(kwargs.items())))
+            if key not in self.cache:
+                self.cache[key] = func(*args, **kwargs)
+            return self.cache[key]
+        return memoized
+
+"""
+Hashable key of a function argument. Arrays and tensors are keyed on their content.
+"""
+def contentKey(value):
+    if isinstance(value, torch.Tensor):
+        value = value.detach().cpu()
+        return ('tensor', str(value.dtype), tuple(value.shape), hashlib.sha1(value.contiguous().reshape(-1).view(torch.uint8).numpy().tobytes()).hexdigest())
+    if isinstance(value, np.ndarray):
+        return ('array', str(value.dtype), value.shape, hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+    return repr(value)
+
+"""
+Decode one audio array with several asrSettings. The audio is loaded once by the caller,
+and the log-mel spectrogram, encoder output and VAD segments are shared between the settings.
+
+Returns a dict asrSettings -> ASR result
+"""
+def decodeAudioMultiSettings(model, audio, asrSettingsList, taskPrompt, vadSegments = None):
+
+    results = {}
+    with SharedAudioFeatures(model):
+        for asrSettings in asrSettingsList:
+            results[asrSettings] = decodeAudio(model, audio, asrSettings, taskPrompt, vadSegments)
+
+    return results
+
+def decodeAudioFileMultiSettings(model, audioFile, asrSettingsList, taskPrompt, region = None):
+    audio, vadSegments = loadAudioAndVadSegments(audioFile, region)
+    results = decodeAudioMultiSettings(model, audio, asrSettingsList, taskPrompt, vadSegments)
+    if region is not None:
+        results = {asrSettings: chunked.shiftResultTimestamps(result, region[0]) for asrSettings, result in results.items()}
+    return results
+
+"""
+Decode one job and write its .json result(s).
+If a DecodeCache is given, settings that are found in the cache are not decoded again,
+and newly decoded results are added to the cache.
+
+job     dict:   {'audioFile': str, 'asrSettings': str or list, 'prompt': str, 'outputFile': str or list}
+                optional: 'region': [start, end], 'chunkSec', 'chunkOverlapSec', 'finalSentence' (list of words, stop after this sentence)
+cache   DecodeCache or None
+"""
+def runJob(model, job, cache = None):
+
+    asrSettingsList = job['asrSettings'] if isinstance(job['asrSettings'], list) else [job['asrSettings']]
+    outputFiles = job['outputFile'] if isinstance(job['outputFile'], list) else [job['outputFile']]
+
+    statsLog = getattr(model, 'decodingStatsLog', None)
+    statsStart = len(statsLog) if statsLog is not None else 0
+
+    # Look up the results in the cache
+    results = {}
+    cacheKeys = {}
+    if cache is not None:
+        for asrSettings in asrSettingsList:
+            cacheKeys[asrSettings] = decodeCacheKey(cache, model, job['audioFile'], asrSettings, job.get('prompt'), decodingExtras(job))
+            result = cache.get(cacheKeys[asrSettings])
+            if result is not None:
+                print('Found in decode cache:', job['audioFile'], asrSettings)
+                results[asrSettings] = result
+
+    # Decode the remaining settings
+    todo = [asrSettings for asrSettings in asrSettingsList if asrSettings not in results]
+    checkpoints = {}
+    if len(todo) > 0 and job.get('chunkSec'):
+        # Decode in overlapping chunks, with a checkpoint after each chunk
+        todoOutputFiles = [outputFiles[asrSettingsList.index(asrSettings)] for asrSettings in todo]
+        decoded, checkpoints = decodeAudioFileChunked(model, job['audioFile'], todo, job.get('prompt'), todoOutputFiles, job['chunkSec'], job.get('chunkOverlapSec', 0),
+                                                      job.get('region'), job.get('finalSentence'))
+    elif len(todo) > 1:
+        # Decode several asrSettings in one pass over the audio
+        decoded = decodeAudioFileMultiSettings(model, job['audioFile'], todo, job.get('prompt'), job.get('region'))
+    elif len(todo) == 1:
+        decoded = {todo[0]: decodeAudioFile(model, job['audioFile'], todo[0], job.get('prompt'), job.get('region'))}
+    else:
+        decoded = {}
+
+    for asrSettings, result in decoded.items():
+        if cache is not None:
+            cache.put(cacheKeys[asrSettings], result)
+        results[asrSettings] = result
+
+    for asrSettings, outputFile in zip(asrSettingsList, outputFiles):
+        writeAsrResult(results[asrSettings], outputFile)
+
+    for checkpoint in checkpoints.values():
+        checkpoint.remove()
+
+    if statsLog is not None:
+        writeDecodingStats(job['audioFile'], statsLog[statsStart:], dict(zip(asrSettingsList, outputFiles)))
+        del statsLog[statsStart:]
+
+"""
+Cache key of decoding audioFile with asrSettings. The prompt only counts if it is used by asrSettings.
+extras contains the job options that change the result, e.g. the chunk size.
+"""
+def decodeCacheKey(cache, model, audioFile, asrSettings, taskPrompt, extras = None):
+
+    settings = parseAsrSettings(asrSettings)
+    if not settings['use_prompt']:
+        taskPrompt = None
+
+    # Results of other backends than fp32 differ slightly, so they get their own key
+    modelName = getattr(model, 'modelName', MODEL_NAME)
+    backend = getattr(model, 'backend', BACKEND)
+    if backend != BACKEND:
+        modelName = modelName + ':' + backend
+
+    return cache.key(audioFile, modelName, LANGUAGE, settings['detect_disfluencies'], settings['vad'], taskPrompt, extras)
+
+def decodingExtras(job):
+    extras = {}
+    if job.get('region') is not None:
+        extras['region'] = job['region']
+    if job.get('chunkSec'):
+        extras['chunkSec'] = job['chunkSec']
+        extras['chunkOverlapSec'] = job.get('chunkOverlapSec', 0)
+        if job.get('finalSentence') is not None:
+            extras['finalSentence'] = job['finalSentence']
+    return extras if len(extras) > 0 else None
+
+"""
+Decode an audio file in overlapping chunks of chunkSec seconds (see utils/chunked_decoding.py).
+Only one chunk of audio is in memory at a time. The settings of asrSettingsList share the audio and encoder features of each chunk.
+Finished chunks are saved in a checkpoint per output file, chunks that are already in the checkpoint are not decoded again.
+
+region          [start, end]: only decode this window of the audio file, or None
+finalSentence   list of words of the last prompt sentence: stop after the chunk in which this sentence is recognized (for all settings), or None
+
+Returns a dict asrSettings -> ASR result and a dict asrSettings -> ChunkCheckpoint
+"""
+def decodeAudioFileChunked(model, audioFile, asrSettingsList, taskPrompt, outputFiles, chunkSec, overlapSec, region = None, finalSentence = None):
+
+    if region is None:
+        chunks = chunked.planChunks(chunked.getAudioDuration(audioFile), chunkSec, overlapSec)
+    else:
+        chunks = chunked.planChunks(region[1] - region[0], chunkSec, overlapSec, offset = region[0])
+
+    vadSegments = vadseg.loadVadSegments(audioFile)
+
+    stat = os.stat(audioFile)
+    checkpoints = {}
+    for asrSettings, outputFile in zip(asrSettingsList, outputFiles):
+        params = {'audioFile': os.path.abspath(audioFile), 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'asrSettings': asrSettings, 'chunkSec': chunkSec, 'overlapSec': overlapSec, 'region': region}
+        checkpoints[asrSettings] = chunked.ChunkCheckpoint(outputFile, params)
+
+    for chunk in chunks:
+
+        # Stop when the last sentence of the prompt has been read
+        if finalSentence is not None and all(finalSentenceRecognized(checkpoints[asrSettings].results(), finalSentence) for asrSettings in asrSettingsList):
+            print(datetime.now(), 'Last prompt sentence recognized, skip chunks', chunk['index']+1, 'to', len(chunks), 'of', audioFile)
+            break
+
+        todo = [asrSettings for asrSettings in asrSettingsList if not checkpoints[asrSettings].isDone(chunk['index'])]
+        if len(todo) == 0:
+            continue
+
+        audio = chunked.loadAudioWindow(audioFile, chunk['start'], chunk['end'] - chunk['start'])
+        chunkVadSegments = vadseg.clipVadSegments(vadSegments, chunk['start'], chunk['end']) if vadSegments is not None else None
+        chunkResults = decodeAudioMultiSettings(model, audio, todo, taskPrompt, chunkVadSegments)
+
+        for asrSettings, result in chunkResults.items():
+            result = chunked.shiftResultTimestamps(result, chunk['start'])
+            ownedSegments = chunked.keepOwnedWords(result['segments'], chunk['ownStart'], chunk['ownEnd'])
+            checkpoints[asrSettings].add(chunk['index'], {'segments': ownedSegments, 'language': result['language']})
+
+        print(datetime.now(), 'Chunk', chunk['index']+1, 'of', len(chunks), 'decoded:', audioFile)
+
+    results = {asrSettings: chunked.stitchChunks(checkpoints[asrSettings].results()) for asrSettings in asrSettingsList}
+
+    return results, checkpoints
+
+def normalizeWord(word):
+    return re.sub(r"[^\w']", '', word.lower())
+
+"""
+Check whether the last sentence of the prompt is recognized at the end of the decoded chunks:
+at least minMatch of its words, including the last word, are found (in order) in the last words of the hypothesis.
+"""
+def finalSentenceRecognized(chunkResults, finalSentence, minMatch = 0.8):
+
+    hypWords = [normalizeWord(word['text']) for chunkResult in chunkResults for segment in chunkResult['segments'] for word in segment.get('words', [])]
+    refWords = [normalizeWord(word) for word in finalSentence]
+    if len(refWords) == 0 or len(hypWords) == 0:
+        return False
+
+    hypTail = [word for word in hypWords[-(len(refWords) + 5):] if word != '']
+    matcher = difflib.SequenceMatcher(None, refWords, hypTail, autojunk=False)
+    matchedIdxs = [block.a + i for block in matcher.get_matching_blocks() for i in range(block.size)]
+
+    return len(refWords) - 1 in matchedIdxs and len(matchedIdxs) >= minMatch * len(refWords)
+
+"""
+Write the ASR result atomically: first to a temporary file in the output dir, which is then renamed.
+A .json file that exists is therefore always complete, also when several decoders write to the same dir.
+"""
+def writeAsrResult(result, output_json_file):
+    tmp_json_file = output_json_file + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_json_file, 'w') as f:
+        f.write(json.dumps(result, indent = 2, ensure_ascii = False))
+    os.replace(tmp_json_file, output_json_file)
+
+"""
+Append the decoding statistics of one audio file (e.g. of speculative decoding) to <asrDir>/<asrSettings>/decoding-stats.tsv,
+the dir above the json-asr-results dir. The statistics of all chunks of a setting are summed.
+"""
+def writeDecodingStats(audioFile, stats, outputFiles):
+
+    summed = {}
+    for entry in stats:
+        row = summed.setdefault(entry['asrSettings'], {'file': os.path.basename(audioFile)})
+        for key, value in entry.items():
+            if isinstance(value, (int, float)):
+                row[key] = row.get(key, 0) + value
+            else:
+                row[key] = value
+
+    for asrSettings, row in summed.items():
+        if row.get('proposed', 0) > 0:
+            row['acceptanceRate'] = round(row['accepted'] / row['proposed'], 3)
+        if row.get('targetPasses', 0) > 0:
+            # Tokens per sequential forward pass of the large model: the speedup of the decoder passes
+            row['tokensPerTargetPass'] = round(row['tokens'] / row['targetPasses'], 3)
+        if row.get('duration', 0) > 0:
+            row['rtf'] = round(row['decodingTime'] / row['duration'], 3)
+
+        statsFile = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(outputFiles[asrSettings]))), 'decoding-stats.tsv')
+        writeHeader = not os.path.exists(statsFile)
+        lines = ('\t'.join(row.keys()) + '\n' if writeHeader else '') + '\t'.join([str(value) for value in row.values()]) + '\n'
+        with open(statsFile, 'a') as f:
+            f.write(lines)
+
+"""
+Multi-process decoding. Each worker process loads its own model and uses threadsPerWorker PyTorch threads.
+"""
+workerModel = None
+workerCache = None
+
+def initWorker(modelName, threadsPerWorker, cacheDir = None, cacheMaxBytes = None, backend = BACKEND, backendOptions = None):
+    global workerModel, workerCache
+    torch.set_num_threads(threadsPerWorker)
+    workerModel = loadModel(modelName, backend, backendOptions)
+    if cacheDir is not None:
+        workerCache = DecodeCache(cacheDir, cacheMaxBytes)
+
+"""
+Run one job in a worker process. Settings of which the output was created in the meantime
+(e.g. by another decoder that writes to the same dir) are skipped, unless job['skipExisting'] is False.
+Returns (audioFile, error message or None)
+"""
+def runJobInWorker(job):
+
+    if job.get('skipExisting', True):
+
+        if isinstance(job['asrSettings'], list):
+            todo = [(asrSettings, outputFile) for asrSettings, outputFile in zip(job['asrSettings'], job['outputFile']) if not os.path.exists(outputFile)]
+            if len(todo) == 0:
+                return job['audioFile'], None
+            job = {**job, 'asrSettings': [x[0] for x in todo], 'outputFile': [x[1] for x in todo]}
+
+        elif os.path.exists(job['outputFile']):
+            return job['audioFile'], None
+
+    try:
+        runJob(workerModel, job, workerCache)
+        print(datetime.now(), 'Created:', job['outputFile'])
+        return job['audioFile'], None
+    except Exception as error:
+        return job['audioFile'], str(error)
+
+"""
+Sort jobs longest-first, so that a long story is not the last file that is decoded.
+The size of the audio file is used as a proxy for its duration.
+"""
+def sortJobsLongestFirst(jobs):
+    return sorted(jobs, key=lambda job: os.path.getsize(job['audioFile']), reverse=True)
+
+def runJobsInPool(jobs, workers, threadsPerWorker, modelName = MODEL_NAME, cacheDir = None, cacheMaxBytes = None, backend = BACKEND, backendOptions = None):
+
+    errors = []
+    # Not fork: torch is already imported (and may have started threads) in this process
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=workers, initializer=initWorker, initargs=(modelName, threadsPerWorker, cacheDir, cacheMaxBytes, backend, backendOptions)) as pool:
+        for audioFile, error in pool.imap_unordered(runJobInWorker, sortJobsLongestFirst(jobs), chunksize=1):
+            if error is not None:
+                print('Decoding not possible:', audioFile, error)
+                errors.append((audioFile, error))
+
+    return errors
+
+"""
+Send one job to a running whispert_server.py and wait until the server has written the .json result.
+The protocol is one JSON object per line, the server answers with one JSON object per line.
+
+job     dict:   {'audioFile': str, 'asrSettings': str, 'prompt': str, 'outputFile': str} or {'command': 'shutdown'}
+                asrSettings and outputFile can also be lists of equal length, to decode several settings in one pass.
+"""
+def submitJob(socketPath, job):
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socketPath)
+        client.sendall((json.dumps(job, ensure_ascii = False) + '\n').encode('utf-8'))
+
+        with client.makefile('r', encoding = 'utf-8') as f:
+            response = json.loads(f.readline())
+
+    if response['status'] != 'ok':
+        raise RuntimeError('Decoder server failed on ' + str(job.get('audioFile')) + ': ' + response['message'])
+
+    return response